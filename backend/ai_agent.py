@@ -1,11 +1,22 @@
-import openai # type: ignore
 from config import Config
 import json
+import os
 import re
 
+from llm_client import LLMClient
+
 class AIAgent:
-    def __init__(self):
-        openai.api_key = Config.OPENAI_API_KEY
+    MODELO = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+    SISTEMA_CHAT = "Eres un asistente de soporte técnico amigable."
+
+    def __init__(self, cache=None):
+        # Cliente openai>=1.0 (ChatCompletion ya no existe); sin API key no hay IA.
+        # Timeouts, cuota, reintentos y circuito en llm_client.py; aclient es el
+        # mismo cliente en versión asyncio (modo ASGI, ver asgi.py)
+        self.llm = LLMClient.from_env(Config.OPENAI_API_KEY)
+        self.client = self.llm.client
+        self.aclient = self.llm.aclient
+        self.cache = cache  # AICache opcional (ver ai_cache.py)
         self.system_prompt = """
         Eres un asistente especializado en soporte técnico de hardware y software.
         Tu función es:
@@ -26,10 +37,17 @@ class AIAgent:
         Si el problema es complejo o requiere intervención física, marca requiere_admin como true.
         """
     
-    def analizar_problema(self, descripcion, categoria):
+    def analizar_problema(self, descripcion, categoria, fallback=True):
+        """Con fallback=False los errores de la API se propagan (el triage los reintenta)."""
+        clave = (self.cache.clave("analisis", descripcion, categoria, modelo=self.MODELO,
+                                 sistema=self.system_prompt) if self.cache else None)
+        if clave:
+            guardado = self.cache.get(clave)
+            if guardado is not None:
+                return guardado
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
+            response = self._completar(
+                "analisis",
                 messages=[
                     {"role": "system", "content": self.system_prompt},
                     {"role": "user", "content": f"Problema de {categoria}: {descripcion}"}
@@ -52,10 +70,14 @@ class AIAgent:
                     "requiere_admin": True
                 }
             
+            if clave:
+                self.cache.set(clave, "analisis", resultado)
             return resultado
             
         except Exception as e:
             print(f"Error en IA: {e}")
+            if not fallback:
+                raise
             return {
                 "solucion": "Error al procesar. Se asignará a un técnico.",
                 "es_complejo": True,
@@ -64,25 +86,137 @@ class AIAgent:
                 "requiere_admin": True
             }
     
-    def generar_respuesta_chat(self, mensaje, historial=[]):
+    def _completar(self, operacion, **kwargs):
+        """
+        Llamada al modelo a través de LLMClient (latencia y tokens en metrics.py
+        por operación). Con el circuito abierto o sin cupo lanza IANoDisponible
+        al instante: los llamadores devuelven su respuesta de respaldo.
+        """
+        return self.llm.completar(operacion, model=self.MODELO, **kwargs)
+
+    def _mensajes_chat(self, mensaje, historial, resumen=None):
+        messages = [{"role": "system", "content": self.SISTEMA_CHAT}]
+        if resumen:
+            messages.append({"role": "system",
+                             "content": "Resumen de la conversación anterior:\n" + resumen})
+        for h in historial or []:
+            messages.append({"role": "user", "content": h["usuario"]})
+            messages.append({"role": "assistant", "content": h["ia"]})
+        messages.append({"role": "user", "content": mensaje})
+        return messages
+
+    def _clave_chat(self, mensaje, historial, resumen):
+        # El contexto forma parte de la clave: sólo se reutiliza en la misma conversación
+        if not self.cache:
+            return None
+        contexto = {"historial": historial, "resumen": resumen} if (historial or resumen) else None
+        return self.cache.clave("chat", mensaje, contexto=contexto,
+                               modelo=self.MODELO, sistema=self.SISTEMA_CHAT)
+
+    def generar_respuesta_chat(self, mensaje, historial=None, resumen=None, fallback=True):
+        """historial/resumen vienen de ChatSessionStore.contexto(); con fallback=False los errores se propagan."""
+        clave = self._clave_chat(mensaje, historial, resumen)
+        if clave:
+            guardado = self.cache.get(clave)
+            if guardado is not None:
+                return guardado
         try:
-            messages = [{"role": "system", "content": "Eres un asistente de soporte técnico amigable."}]
-            
-            # Añadir historial
-            for h in historial:
-                messages.append({"role": "user", "content": h["usuario"]})
-                messages.append({"role": "assistant", "content": h["ia"]})
-            
-            messages.append({"role": "user", "content": mensaje})
-            
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
+            response = self._completar(
+                "chat",
+                messages=self._mensajes_chat(mensaje, historial, resumen),
                 temperature=0.7,
                 max_tokens=500
             )
             
-            return response.choices[0].message.content
+            respuesta = response.choices[0].message.content
+            if clave and respuesta:
+                self.cache.set(clave, "chat", respuesta)
+            return respuesta
             
         except Exception as e:
-            return f"Lo siento, hay un problema temporal. Error: {str(e)}"
\ No newline at end of file
+            if not fallback:
+                raise
+            return f"Lo siento, hay un problema temporal. Error: {str(e)}"
+
+    def generar_respuesta_chat_stream(self, mensaje, historial=None, resumen=None):
+        """
+        Igual que generar_respuesta_chat pero va devolviendo los fragmentos de
+        texto según llegan del modelo. Si la IA no está disponible lanza la
+        excepción (antes del primer fragmento) para que quien llama use su
+        respuesta de respaldo.
+        """
+        clave = self._clave_chat(mensaje, historial, resumen)
+        if clave:
+            guardado = self.cache.get(clave)
+            if guardado is not None:
+                yield guardado
+                return
+        stream = self._completar(
+            "chat_stream",
+            messages=self._mensajes_chat(mensaje, historial, resumen),
+            temperature=0.7,
+            max_tokens=500,
+            stream=True,
+            stream_options={"include_usage": True}   # último fragmento con los tokens
+        )
+        partes = []
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                partes.append(delta)
+                yield delta
+        # Sólo se guarda la respuesta completa
+        if clave and partes:
+            self.cache.set(clave, "chat", "".join(partes))
+
+    # ---------- asyncio (asgi.py) ----------
+    async def _acompletar(self, operacion, **kwargs):
+        return await self.llm.acompletar(operacion, model=self.MODELO, **kwargs)
+
+    async def agenerar_respuesta_chat(self, mensaje, historial=None, resumen=None, fallback=True):
+        """generar_respuesta_chat sin bloquear el bucle de eventos."""
+        clave = self._clave_chat(mensaje, historial, resumen)
+        if clave:
+            guardado = await self.cache.aget(clave)
+            if guardado is not None:
+                return guardado
+        try:
+            response = await self._acompletar(
+                "chat",
+                messages=self._mensajes_chat(mensaje, historial, resumen),
+                temperature=0.7,
+                max_tokens=500
+            )
+            respuesta = response.choices[0].message.content
+            if clave and respuesta:
+                await self.cache.aset(clave, "chat", respuesta)
+            return respuesta
+        except Exception as e:
+            if not fallback:
+                raise
+            return f"Lo siento, hay un problema temporal. Error: {str(e)}"
+
+    async def agenerar_respuesta_chat_stream(self, mensaje, historial=None, resumen=None):
+        """generar_respuesta_chat_stream como generador asíncrono."""
+        clave = self._clave_chat(mensaje, historial, resumen)
+        if clave:
+            guardado = await self.cache.aget(clave)
+            if guardado is not None:
+                yield guardado
+                return
+        stream = await self._acompletar(
+            "chat_stream",
+            messages=self._mensajes_chat(mensaje, historial, resumen),
+            temperature=0.7,
+            max_tokens=500,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        partes = []
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                partes.append(delta)
+                yield delta
+        if clave and partes:
+            await self.cache.aset(clave, "chat", "".join(partes))
@@ -0,0 +1,193 @@
+# backend/ai_cache.py
+"""
+Caché de respuestas de AIAgent.
+
+La clave es el texto normalizado (minúsculas, sin acentos ni signos, espacios
+colapsados) + categoría/contexto + modelo y prompt de sistema, así "Pantalla  AZUL!" y "pantalla azul"
+comparten respuesta. Dos niveles:
+- memoria: LRU con TTL (cache.QueryCache)
+- MySQL: tabla ai_respuestas (migración 5), sobrevive a reinicios y la
+  comparten todos los procesos.
+Sólo se guardan respuestas reales del modelo, nunca los mensajes de error.
+
+aget()/aset() son las versiones asyncio (asgi.py): con `adb`
+(db_async.AsyncDatabase) la tabla se usa sin bloquear el bucle de eventos.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, Optional
+
+from cache import QueryCache
+
+_NO_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalizar(texto: str) -> str:
+    texto = unicodedata.normalize("NFKD", (texto or "").lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return _NO_ALNUM.sub(" ", texto).strip()
+
+
+class AICache:
+    def __init__(self, db=None, max_items: int = 1000, ttl: float = 7 * 86400,
+                 max_filas: int = 50000, adb=None):
+        self.db = db
+        self.adb = adb
+        self.ttl = ttl
+        self.max_filas = max_filas
+        self._mem = QueryCache(max_items=max_items, ttl=ttl)
+        self._lock = threading.Lock()
+        self._sets = 0
+        self._stats = {"hits_mem": 0, "hits_db": 0, "misses": 0, "guardadas": 0, "errores_db": 0}
+
+    @classmethod
+    def from_env(cls, db=None) -> "AICache":
+        """AI_CACHE_TTL (seg., 0 = desactivada), AI_CACHE_MAX_ITEMS (memoria), AI_CACHE_MAX_FILAS (tabla)."""
+        return cls(db,
+                   max_items=int(os.getenv("AI_CACHE_MAX_ITEMS", "1000")),
+                   ttl=float(os.getenv("AI_CACHE_TTL", str(7 * 86400))),
+                   max_filas=int(os.getenv("AI_CACHE_MAX_FILAS", "50000")))
+
+    @staticmethod
+    def clave(tipo: str, texto: str, categoria: str = "", contexto: Any = None,
+              modelo: str = "", sistema: str = "") -> str:
+        """
+        modelo y el hash del prompt de sistema entran en la clave: al cambiar
+        OPENAI_MODEL o el prompt no se sirven respuestas del anterior.
+        """
+        partes = [tipo, modelo, hashlib.sha256(sistema.encode()).hexdigest(),
+                  normalizar(texto), normalizar(categoria)]
+        if contexto:
+            partes.append(json.dumps(contexto, sort_keys=True, ensure_ascii=False))
+        return hashlib.sha256("\x1f".join(partes).encode()).hexdigest()
+
+    def _contar(self, k: str):
+        with self._lock:
+            self._stats[k] += 1
+
+    def get(self, clave: str) -> Optional[Any]:
+        if self.ttl <= 0:
+            return None
+        ok, valor = self._mem.get(clave)
+        if ok:
+            self._contar("hits_mem")
+            return valor
+        if self.db is not None:
+            try:
+                with self.db.connection():
+                    cur = self.db.cursor()
+                    cur.execute("SELECT respuesta FROM ai_respuestas WHERE clave=%s AND expira > NOW()",
+                                (clave,))
+                    row = cur.fetchone()
+                    cur.close()
+                if row:
+                    valor = json.loads(row["respuesta"])
+                    self._mem.set(clave, valor)
+                    self._contar("hits_db")
+                    return valor
+            except Exception as e:
+                # La caché nunca debe tumbar una respuesta: se sigue sin ella
+                print("AICache: error leyendo ai_respuestas:", e)
+                self._contar("errores_db")
+        self._contar("misses")
+        return None
+
+    def set(self, clave: str, tipo: str, valor: Any):
+        if self.ttl <= 0:
+            return
+        self._mem.set(clave, valor)
+        self._contar("guardadas")
+        if self.db is None:
+            return
+        try:
+            with self.db.connection():
+                cur = self.db.cursor()
+                cur.execute("""
+                    INSERT INTO ai_respuestas (clave, tipo, respuesta, expira)
+                    VALUES (%s, %s, %s, NOW() + INTERVAL %s SECOND)
+                    ON DUPLICATE KEY UPDATE respuesta=VALUES(respuesta), expira=VALUES(expira)
+                """, (clave, tipo, json.dumps(valor, ensure_ascii=False), int(self.ttl)))
+                self.db.commit()
+                cur.close()
+                with self._lock:
+                    self._sets += 1
+                    podar = self._sets % 100 == 0
+                if podar:
+                    self._podar()
+        except Exception as e:
+            print("AICache: error guardando en ai_respuestas:", e)
+            self._contar("errores_db")
+
+    async def aget(self, clave: str) -> Optional[Any]:
+        if self.ttl <= 0:
+            return None
+        ok, valor = self._mem.get(clave)
+        if ok:
+            self._contar("hits_mem")
+            return valor
+        if self.adb is None:
+            # Sin pool asíncrono: la consulta va a un hilo para no frenar el bucle
+            return await asyncio.to_thread(self.get, clave)
+        try:
+            row = await self.adb.fetchone(
+                "SELECT respuesta FROM ai_respuestas WHERE clave=%s AND expira > NOW()", (clave,))
+            if row:
+                valor = json.loads(row["respuesta"])
+                self._mem.set(clave, valor)
+                self._contar("hits_db")
+                return valor
+        except Exception as e:
+            print("AICache: error leyendo ai_respuestas:", e)
+            self._contar("errores_db")
+        self._contar("misses")
+        return None
+
+    async def aset(self, clave: str, tipo: str, valor: Any):
+        if self.ttl <= 0:
+            return
+        if self.adb is None:
+            return await asyncio.to_thread(self.set, clave, tipo, valor)
+        self._mem.set(clave, valor)
+        self._contar("guardadas")
+        try:
+            await self.adb.execute("""
+                INSERT INTO ai_respuestas (clave, tipo, respuesta, expira)
+                VALUES (%s, %s, %s, NOW() + INTERVAL %s SECOND)
+                ON DUPLICATE KEY UPDATE respuesta=VALUES(respuesta), expira=VALUES(expira)
+            """, (clave, tipo, json.dumps(valor, ensure_ascii=False), int(self.ttl)))
+            with self._lock:
+                self._sets += 1
+                podar = self._sets % 100 == 0
+            if podar and self.db is not None:
+                await asyncio.to_thread(self._podar_con_conexion)
+        except Exception as e:
+            print("AICache: error guardando en ai_respuestas:", e)
+            self._contar("errores_db")
+
+    def _podar_con_conexion(self):
+        with self.db.connection():
+            self._podar()
+
+    def _podar(self):
+        """Borra vencidas y, si la tabla supera max_filas, las que antes vencen."""
+        cur = self.db.cursor()
+        cur.execute("DELETE FROM ai_respuestas WHERE expira <= NOW() LIMIT 5000")
+        cur.execute("SELECT COUNT(*) AS n FROM ai_respuestas")
+        sobran = (cur.fetchone() or {}).get("n", 0) - self.max_filas
+        if sobran > 0:
+            cur.execute("DELETE FROM ai_respuestas ORDER BY expira LIMIT %s", (sobran,))
+        self.db.commit()
+        cur.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            st = dict(self._stats)
+        total = st["hits_mem"] + st["hits_db"] + st["misses"]
+        st["hit_rate"] = round((st["hits_mem"] + st["hits_db"]) / total, 4) if total else 0.0
+        st["items_mem"] = self._mem.stats()["items"]
+        return st
@@ -3,6 +3,8 @@ from flask import Flask, request, jsonify, render_template
 from flask_cors import CORS
 import mysql.connector
 import os
+from models import Database, TicketModel
+import migrations
 
 # ---------- Flask básico ----------
 app = Flask(
@@ -13,37 +15,19 @@ app = Flask(
 CORS(app)  # permite llamadas desde el front en el mismo host/puerto u otros
 
 # ---------- Config DB ----------
-db_config = {
-    'user': os.getenv('DB_USER', 'root'),
-    'password': os.getenv('DB_PASSWORD', ''),
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'port': int(os.getenv('DB_PORT', '3307')),
-    'database': os.getenv('DB_NAME', 'soporte_ia')
-}
+# Mismo pool que routers.py (DB_HOST, DB_USER, DB_POOL_SIZE, ... en .env)
+db = Database.from_env()
+ticket_model = TicketModel(db)
+if os.getenv("DB_AUTO_MIGRATE", "1") == "1":
+    migrations.migrate(db)   # el DDL ya no corre dentro de las peticiones
 
 def get_db_connection():
-    return mysql.connector.connect(**db_config)
+    # Conexión del pool ligada a la petición; se devuelve en el teardown
+    return db.connect()
 
-def ensure_schema(conn):
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS tickets (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            usuario_id INT DEFAULT 0,
-            nombre VARCHAR(100),
-            telefono VARCHAR(50),
-            domicilio VARCHAR(255),
-            titulo VARCHAR(200) NOT NULL,
-            descripcion TEXT NOT NULL,
-            categoria VARCHAR(50) NOT NULL,
-            tipo VARCHAR(50) DEFAULT 'correctivo',
-            estado VARCHAR(50) DEFAULT 'abierto',
-            prioridad VARCHAR(50) DEFAULT 'media',
-            fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    conn.commit()
-    cur.close()
+@app.teardown_appcontext
+def release_db(exc):
+    db.end_request(exc)
 
 # ---------- Vistas ----------
 @app.route('/')
@@ -52,7 +36,8 @@ def index():
 
 @app.route('/admin')
 def admin():
-    return render_template('admin.html')     # ../frontend/admin.html
+    return render_template('admin.html', tickets=[], stats={},
+                           filtros={}, next_cursor=None)  # ../frontend/admin.html
 
 # ---------- API: crear ticket (SIN login) ----------
 @app.route('/api/crear-ticket', methods=['POST'])
@@ -71,29 +56,18 @@ def crear_ticket():
             if not data.get(f):
                 return jsonify({'success': False, 'error': f'Falta el campo {f}'}), 400
 
-        conn = get_db_connection()
-        ensure_schema(conn)
-        cur = conn.cursor()
-
-        usuario_id = 0  # invitado (sin login)
-        nombre     = data.get('nombre')
-        telefono   = data.get('telefono')
-        domicilio  = data.get('domicilio')
-        titulo     = data['titulo']
-        descripcion= data['descripcion']
-        categoria  = data['categoria']
-        tipo       = data.get('tipo', 'correctivo')
-        estado     = data.get('estado', 'abierto')
-        prioridad  = data.get('prioridad', 'media')
-
-        cur.execute("""
-            INSERT INTO tickets (usuario_id, nombre, telefono, domicilio, titulo, descripcion, categoria, tipo, estado, prioridad)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-        """, (usuario_id, nombre, telefono, domicilio, titulo, descripcion, categoria, tipo, estado, prioridad))
-        conn.commit()
-        ticket_id = cur.lastrowid
-        cur.close()
-        conn.close()
+        ticket_id = ticket_model.crear_ticket(
+            usuario_id=None,  # invitado (sin login)
+            titulo=data['titulo'],
+            descripcion=data['descripcion'],
+            categoria=data['categoria'],
+            tipo=data.get('tipo', 'correctivo'),
+            nombre=data.get('nombre'),
+            telefono=data.get('telefono'),
+            domicilio=data.get('domicilio'),
+            prioridad=data.get('prioridad', 'media'),
+            estado=data.get('estado', 'abierto'),
+        )
 
         return jsonify({'success': True, 'ticket_id': ticket_id}), 201
     except Exception as e:
@@ -104,14 +78,13 @@ def crear_ticket():
 @app.route('/api/tickets', methods=['GET'])
 def obtener_tickets():
     try:
-        conn = get_db_connection()
-        ensure_schema(conn)
-        cur = conn.cursor(dictionary=True)
-        cur.execute("SELECT id, titulo, categoria, estado, prioridad, fecha, nombre, telefono, domicilio FROM tickets ORDER BY id DESC LIMIT 100")
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
-        return jsonify({'success': True, 'tickets': rows})
+        pagina = ticket_model.obtener_tickets(admin=True, filtros=request.args,
+                                              cursor=request.args.get('cursor'),
+                                              limit=request.args.get('limit', 100, type=int))
+        return jsonify({'success': True, 'tickets': pagina['tickets'],
+                        'next_cursor': pagina['next_cursor']})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         print("Error /api/tickets:", e)
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -125,7 +98,6 @@ def test_db():
         cur.execute("SELECT DATABASE();")
         db_name = cur.fetchone()[0]
         cur.close()
-        conn.close()
         return f"Conexión exitosa a la base de datos: {db_name}"
     except mysql.connector.Error as err:
         return f"Error de conexión: {err}"
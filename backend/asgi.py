@@ -0,0 +1,227 @@
+# backend/asgi.py
+"""
+Modo asíncrono (ASGI) de la misma aplicación:
+
+    cd backend
+    python bootstrap.py          # una vez por despliegue (migraciones + admin)
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 2
+
+Las rutas del chat (/chat, /chat/stream, /chat/reset) son nativas asyncio: el
+modelo se llama con AsyncOpenAI a través de llm_client.py (timeouts, cuota,
+reintentos y circuito compartidos con el modo síncrono) y la caché de respuestas
+(ai_respuestas) se lee con un pool aiomysql (db_async.py). Mientras esperan al
+modelo no ocupan ningún hilo, así un proceso sostiene cientos de chats en
+vuelo; lo que sigue siendo síncrono (índice de respuestas, historial de
+chat_sessions) va a hilos con asyncio.to_thread. Llevan las mismas métricas
+HTTP que las rutas Flask (http_peticion_segundos, hasta devolver la
+respuesta: en /chat/stream, hasta las cabeceras) y CORS abierto como
+Flask-CORS. El resto de rutas son las de routers.py tal cual, servidas por a2wsgi
+en un pool de ASGI_WSGI_HILOS hilos; la cookie de sesión es la de Flask, así
+que login, panel y chat conviven igual que en el modo síncrono.
+
+Comparativa con el modo síncrono: python bench_async.py (ver su ayuda).
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadSignature
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+import metrics
+import routers
+from db_async import AsyncDatabase
+
+flask_app = routers.create_app()
+# La caché de IA usa el pool asíncrono en las rutas nativas (aget/aset). Con
+# DB_BACKEND=sqlite no hay pool asíncrono: aget/aset consultan en un hilo
+adb = AsyncDatabase() if routers.db.dialecto == "mysql" else None
+routers.ai_cache.adb = adb
+
+_en_vuelo = {"chat": 0, "max": 0}
+
+
+class SesionFlask:
+    """La cookie de sesión de Flask (misma clave y formato), leída y escrita desde ASGI."""
+
+    def __init__(self, request: Request):
+        self._firma = flask_app.session_interface.get_signing_serializer(flask_app)
+        self.nombre = flask_app.config["SESSION_COOKIE_NAME"]
+        vida = int(flask_app.permanent_session_lifetime.total_seconds())
+        try:
+            self.datos = self._firma.loads(request.cookies.get(self.nombre, ""), max_age=vida)
+        except BadSignature:
+            self.datos = {}
+        self.modificada = False
+
+    def chat_id(self) -> str:
+        if 'chat_id' not in self.datos:
+            self.datos['chat_id'] = routers.uuid.uuid4().hex
+            self.modificada = True
+        return self.datos['chat_id']
+
+    def guardar(self, resp):
+        if self.modificada:
+            resp.set_cookie(self.nombre, self._firma.dumps(self.datos), path="/", httponly=True,
+                            secure=bool(flask_app.config["SESSION_COOKIE_SECURE"]),
+                            samesite=flask_app.config["SESSION_COOKIE_SAMESITE"] or "lax")
+        return resp
+
+
+async def _mensaje(request: Request) -> str:
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    return ((data or {}).get('message') or '').strip() if isinstance(data, dict) else ''
+
+
+async def _recuperada(user_message):
+    # El índice está en memoria pero confirma el ticket en la BD (sync): va a un hilo
+    if not routers.retrieval:
+        return None
+    return await asyncio.to_thread(routers.respuesta_recuperada, user_message)
+
+
+def _medida(ruta, endpoint):
+    """Latencia y en curso como metrics.instrumentar en Flask (éstas no pasan por Flask)."""
+    async def medido(request: Request):
+        t0 = time.perf_counter()
+        metrics.http_en_curso.inc(ruta)
+        estado = 500
+        try:
+            resp = await endpoint(request)
+            estado = resp.status_code
+            return resp
+        finally:
+            metrics.http_segundos.observar(time.perf_counter() - t0, ruta, request.method, estado)
+            metrics.http_en_curso.dec(ruta)
+    return medido
+
+
+class _Contar:
+    def __enter__(self):
+        _en_vuelo["chat"] += 1
+        _en_vuelo["max"] = max(_en_vuelo["max"], _en_vuelo["chat"])
+
+    def __exit__(self, *exc):
+        _en_vuelo["chat"] -= 1
+
+
+async def chat(request: Request):
+    """POST /chat, igual que routers.chat."""
+    user_message = await _mensaje(request)
+    if not user_message:
+        return JSONResponse({"answer": "¿Podrías escribir tu consulta técnica?", "ticket_required": False})
+    sesion = SesionFlask(request)
+    with _Contar():
+        answer, ticket_required = routers.respuesta_predefinida(user_message)
+        previa = await _recuperada(user_message)
+        if previa:
+            answer = previa
+            await asyncio.to_thread(routers.chat_sessions.registrar, sesion.chat_id(), user_message, answer)
+        elif routers.CHAT_IA_SINCRONO and routers.ai_agent.aclient:
+            chat_id = sesion.chat_id()
+            # Con CHAT_SHARED_PATH chat_sessions lee y escribe SQLite: fuera del bucle
+            resumen, historial = await asyncio.to_thread(routers.chat_sessions.contexto, chat_id, user_message)
+            try:
+                answer = await routers.ai_agent.agenerar_respuesta_chat(
+                    user_message, historial, resumen, fallback=False)
+                await asyncio.to_thread(routers.chat_sessions.registrar, chat_id, user_message, answer)
+            except Exception as e:
+                print("Chat: IA no disponible:", e)
+    return sesion.guardar(JSONResponse({"answer": answer, "ticket_required": ticket_required}))
+
+
+async def chat_stream(request: Request):
+    """POST /chat/stream, igual que routers.chat_stream (SSE)."""
+    user_message = await _mensaje(request)
+    if user_message:
+        respaldo, ticket_required = routers.respuesta_predefinida(user_message)
+    else:
+        respaldo, ticket_required = "¿Podrías escribir tu consulta técnica?", False
+    sesion = SesionFlask(request)
+    chat_id = sesion.chat_id() if user_message else None
+    _sse = routers._sse
+
+    async def eventos():
+        yield ": ok\n\n"
+        enviado = False
+        with _Contar():
+            previa = await _recuperada(user_message) if user_message else None
+            if previa:
+                enviado = True
+                yield _sse({"token": previa})
+                await asyncio.to_thread(routers.chat_sessions.registrar, chat_id, user_message, previa)
+            elif user_message:
+                resumen, historial = await asyncio.to_thread(routers.chat_sessions.contexto,
+                                                             chat_id, user_message)
+                partes = []
+                try:
+                    async for trozo in routers.ai_agent.agenerar_respuesta_chat_stream(
+                            user_message, historial, resumen):
+                        enviado = True
+                        partes.append(trozo)
+                        yield _sse({"token": trozo})
+                    if partes:
+                        await asyncio.to_thread(routers.chat_sessions.registrar,
+                                                chat_id, user_message, "".join(partes))
+                except Exception as e:
+                    print("Chat stream: IA no disponible:", e)
+                    if enviado:
+                        yield _sse({"token": "\n\n(Respuesta interrumpida, inténtalo de nuevo.)"})
+        if not enviado:
+            yield _sse({"token": respaldo})
+        yield _sse({"ticket_required": ticket_required}, evento="done")
+
+    resp = StreamingResponse(eventos(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    return sesion.guardar(resp)
+
+
+async def chat_reset(request: Request):
+    sesion = SesionFlask(request)
+    if 'chat_id' in sesion.datos:
+        await asyncio.to_thread(routers.chat_sessions.borrar, sesion.datos['chat_id'])
+    return JSONResponse({"success": True})
+
+
+async def health_async(request: Request):
+    return JSONResponse({"chats_en_vuelo": _en_vuelo["chat"], "max_en_vuelo": _en_vuelo["max"],
+                         "pool_async": adb.pool_stats() if adb else None, "pool_sync": routers.db.pool_stats()})
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Los hilos de fondo (triage, índices) se arrancan aquí: las rutas
+    # nativas no pasan por el before_request de Flask
+    routers.iniciar_servicios()
+    t0 = time.time()
+    yield
+    metrics.guardar()
+    if adb is not None:
+        await adb.close()
+    print(f"ASGI: detenido tras {time.time() - t0:.0f}s")
+
+
+app = Starlette(
+    routes=[
+        Route('/chat', _medida('/chat', chat), methods=['POST']),
+        Route('/chat/stream', _medida('/chat/stream', chat_stream), methods=['POST']),
+        Route('/chat/reset', _medida('/chat/reset', chat_reset), methods=['POST']),
+        Route('/health/async', _medida('/health/async', health_async)),
+        # Todo lo demás: la app Flask en un pool de hilos
+        Mount('/', app=WSGIMiddleware(flask_app, workers=int(os.getenv("ASGI_WSGI_HILOS", "10")))),
+    ],
+    # CORS(app) de routers.py sólo cubre lo que pasa por Flask; éste, con la
+    # misma política abierta, también las rutas nativas (sustituye sus cabeceras)
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
@@ -0,0 +1,389 @@
+# backend/bench.py
+"""
+Benchmark reproducible de la API de tickets y del chat.
+
+    python bench.py seed --tickets 100000              # alta masiva con TicketModel (semilla fija)
+    python bench.py run -o bench-1.4.json              # gunicorn + falso OpenAI, todos los escenarios
+    python bench.py run --url http://10.0.0.5:5000     # contra un servidor ya levantado
+    python bench.py stub --puerto 8099                 # sólo el falso OpenAI (OPENAI_BASE_URL=.../v1)
+    python bench.py diff bench-1.3.json bench-1.4.json # compara; --tolerancia 0.1 sale con 1 si empeora
+
+Escenarios (--escenarios, en este orden):
+- crear:  POST /api/crear-ticket (textos distintos; pasa por dedup y triage si están activos)
+- listar: GET /api/tickets con filtros al azar y, la mitad de las veces, la página siguiente
+- editar: PATCH /api/tickets/<id> sobre ids al azar de los existentes
+- admin:  GET /admin (render completo; sin If-None-Match)
+- chat:   POST /chat con mensajes únicos (sin caché) contra el falso OpenAI
+
+Cada escenario lanza --calentamiento peticiones que no cuentan y luego
+--peticiones con --concurrencia clientes. El resultado es un JSON con req/s,
+p50/p95/p99/máx. en ms y errores por código de cada escenario, más el commit,
+los tickets de la BD y los parámetros, para guardarlo junto a cada versión.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+ESCENARIOS = ("crear", "listar", "editar", "admin", "chat")
+AQUI = os.path.dirname(os.path.abspath(__file__))
+
+_PROBLEMAS = [
+    "la impresora {m} no imprime y marca error de papel atascado",
+    "la computadora {m} se reinicia sola al abrir el navegador",
+    "no hay conexión a internet en la oficina {m} desde la mañana",
+    "el correo de outlook pide la contraseña cada {m} minutos",
+    "la pantalla del equipo {m} parpadea y se apaga",
+    "no enciende el ventilador del servidor {m} y hace ruido",
+    "el sistema de facturación {m} se queda congelado al guardar",
+    "el wifi del piso {m} se desconecta cada rato",
+    "solicito mantenimiento preventivo de los equipos del área {m}",
+    "el teclado de la laptop {m} escribe letras repetidas",
+]
+_CATEGORIAS = ("hardware", "software", "redes", "otros")
+_ESTADOS = ("abierto", "en_proceso", "resuelto", "cerrado")
+_PRIORIDADES = ("baja", "media", "alta", "critica")
+
+
+def ticket_aleatorio(rnd: random.Random, n: int) -> Dict[str, Any]:
+    return {
+        "nombre": f"Usuario {n}",
+        "telefono": f"55{rnd.randrange(10**8):08d}",
+        "domicilio": f"Calle {rnd.randrange(1, 500)} #{rnd.randrange(1, 99)}",
+        "titulo": "Ticket de prueba",
+        "descripcion": rnd.choice(_PROBLEMAS).format(m=rnd.randrange(1, 10000)) + f" (ref {n})",
+        "categoria": rnd.choice(_CATEGORIAS),
+        "tipo": rnd.choice(("preventivo", "correctivo")),
+        "prioridad": rnd.choice(_PRIORIDADES),
+        "estado": rnd.choices(_ESTADOS, weights=(3, 2, 3, 2))[0],
+    }
+
+
+# ---------- falso OpenAI ----------
+def app_stub(latencia: float):
+    """Starlette que contesta /v1/chat/completions tras `latencia` seg."""
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+
+    async def completions(request):
+        cuerpo = await request.json()
+        await asyncio.sleep(latencia)
+        texto = "Respuesta de prueba: reinicia el equipo y comprueba el cable de red."
+        return JSONResponse({
+            "id": "chatcmpl-" + uuid.uuid4().hex, "object": "chat.completion",
+            "created": int(time.time()), "model": cuerpo.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": texto}}],
+            "usage": {"prompt_tokens": 50, "completion_tokens": 15, "total_tokens": 65},
+        })
+    return Starlette(routes=[Route("/v1/chat/completions", completions, methods=["POST"])])
+
+
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def arrancar_stub(latencia: float, puerto: Optional[int] = None) -> str:
+    """Falso OpenAI en un hilo; devuelve la URL para OPENAI_BASE_URL."""
+    import uvicorn
+    puerto = puerto or puerto_libre()
+    servidor = uvicorn.Server(uvicorn.Config(app_stub(latencia), host="127.0.0.1", port=puerto,
+                                             log_level="warning", backlog=4096))
+    threading.Thread(target=servidor.run, daemon=True).start()
+    while not servidor.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{puerto}/v1"
+
+
+def hilos(pid: int) -> int:
+    """Hilos del proceso (Linux, /proc); 0 si no se puede leer."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for linea in f:
+                if linea.startswith("Threads:"):
+                    return int(linea.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def percentiles(tiempos: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/p99/máx. en ms (rango más cercano)."""
+    if not tiempos:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    orden = sorted(tiempos)
+
+    def p(q):
+        return round(orden[min(len(orden) - 1, max(0, int(round(q * len(orden))) - 1))] * 1000, 2)
+    return {"p50_ms": p(0.50), "p95_ms": p(0.95), "p99_ms": p(0.99), "max_ms": round(orden[-1] * 1000, 2)}
+
+
+async def esperar_listo(url: str, proc=None, limite: float = 60):
+    fin = time.monotonic() + limite
+    async with httpx.AsyncClient() as c:
+        while time.monotonic() < fin:
+            if proc is not None and proc.poll() is not None:
+                raise RuntimeError(f"el servidor terminó al arrancar (código {proc.returncode})")
+            try:
+                await c.get(url + "/health/pool", timeout=2)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.3)
+    raise RuntimeError("el servidor no respondió a tiempo")
+
+
+# ---------- seed ----------
+def sembrar(n: int, semilla: int = 42, lote: int = 5000):
+    """Crea n tickets con crear_tickets_bulk (INSERT multi-fila + stats en la misma transacción)."""
+    from models import Database, TicketModel
+
+    db = Database.from_env()
+    m = TicketModel(db)
+    rnd = random.Random(semilla)
+    t0 = time.time()
+    creados = 0
+    with db.connection():
+        while creados < n:
+            filas = [ticket_aleatorio(rnd, creados + i) for i in range(min(lote, n - creados))]
+            res = m.crear_tickets_bulk(filas, chunk_size=1000)
+            errores = [r for r in res if "error" in r]
+            if errores:
+                raise RuntimeError(f"alta rechazada: {errores[0]['error']}")
+            creados += len(filas)
+            print(f"  {creados}/{n} ({creados / (time.time() - t0):.0f} tickets/s)", file=sys.stderr)
+    db.close()
+    print(f"== {n} tickets creados en {time.time() - t0:.1f}s", file=sys.stderr)
+
+
+# ---------- carga ----------
+class Escenario:
+    def __init__(self, http: httpx.AsyncClient, rnd: random.Random, max_id: int):
+        self.http, self.rnd, self.max_id = http, rnd, max_id
+        self.cursores: List[str] = []
+        self.n = 0
+
+    async def crear(self):
+        self.n += 1
+        return await self.http.post("/api/crear-ticket", json=ticket_aleatorio(self.rnd, 10**7 + self.n))
+
+    async def listar(self):
+        params = {}
+        if self.cursores and self.rnd.random() < 0.5:
+            params["cursor"] = self.cursores.pop()
+        if self.rnd.random() < 0.7:
+            params["estado"] = self.rnd.choice(_ESTADOS)
+        if self.rnd.random() < 0.3:
+            params["prioridad"] = self.rnd.choice(_PRIORIDADES)
+        r = await self.http.get("/api/tickets", params=params)
+        if r.status_code == 200:
+            siguiente = r.json().get("next_cursor")
+            if siguiente and len(self.cursores) < 1000:
+                self.cursores.append(siguiente)
+        return r
+
+    async def editar(self):
+        tid = self.rnd.randint(1, max(self.max_id, 1))
+        cambios = self.rnd.choice(({"estado": self.rnd.choice(_ESTADOS)},
+                                   {"prioridad": self.rnd.choice(_PRIORIDADES)}))
+        return await self.http.patch(f"/api/tickets/{tid}", json=cambios)
+
+    async def admin(self):
+        return await self.http.get("/admin")
+
+    async def chat(self):
+        self.n += 1
+        return await self.http.post("/chat", json={
+            "message": f"consulta {uuid.uuid4().hex[:8]} sobre el equipo {self.n} que no responde"})
+
+
+async def medir(esc: Escenario, nombre: str, peticiones: int, concurrencia: int,
+                calentamiento: int) -> Dict[str, Any]:
+    accion = getattr(esc, nombre)
+
+    async def correr(total: int, tiempos: List[float], codigos: Dict[str, int]):
+        pendientes = [total]
+
+        async def cliente():
+            while pendientes[0] > 0:
+                pendientes[0] -= 1
+                t0 = time.perf_counter()
+                try:
+                    r = await accion()
+                    codigo = str(r.status_code)
+                except httpx.HTTPError as e:
+                    codigo = type(e).__name__
+                dt = time.perf_counter() - t0
+                codigos[codigo] = codigos.get(codigo, 0) + 1
+                if codigo.startswith("2"):
+                    tiempos.append(dt)
+        await asyncio.gather(*(cliente() for _ in range(concurrencia)))
+
+    await correr(calentamiento, [], {})
+    tiempos: List[float] = []
+    codigos: Dict[str, int] = {}
+    t0 = time.perf_counter()
+    await correr(peticiones, tiempos, codigos)
+    total = time.perf_counter() - t0
+    return {"peticiones": peticiones, "ok": len(tiempos), "errores": peticiones - len(tiempos),
+            "codigos": codigos, "seg": round(total, 3),
+            "req_s": round(len(tiempos) / total, 1) if total else 0.0, **percentiles(tiempos)}
+
+
+async def ejecutar(url: str, args) -> Dict[str, Any]:
+    limites = httpx.Limits(max_connections=args.concurrencia, max_keepalive_connections=args.concurrencia)
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=120) as http:
+        r = await http.post("/login", data={"username": args.usuario, "password": args.clave})
+        if r.status_code != 302 or "/login" in r.headers.get("location", ""):
+            raise RuntimeError(f"no se pudo iniciar sesión como {args.usuario} (HTTP {r.status_code})")
+        primera = (await http.get("/api/tickets", params={"limit": 1})).json().get("tickets") or []
+        max_id = primera[0]["id"] if primera else 1
+        esc = Escenario(http, random.Random(args.semilla), max_id)
+        resultados = {}
+        for nombre in args.escenarios:
+            print(f"== {nombre}: {args.peticiones} peticiones, concurrencia {args.concurrencia}",
+                  file=sys.stderr)
+            resultados[nombre] = await medir(esc, nombre, args.peticiones, args.concurrencia,
+                                             args.calentamiento)
+            res = resultados[nombre]
+            print(f"   {res['req_s']} req/s  p50 {res['p50_ms']} ms  p95 {res['p95_ms']} ms  "
+                  f"p99 {res['p99_ms']} ms  errores {res['errores']}", file=sys.stderr)
+        return {"max_id": max_id, "escenarios": resultados}
+
+
+def commit_actual() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=AQUI,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def correr(args) -> Dict[str, Any]:
+    proc = None
+    url = args.url
+    if not url:
+        base = arrancar_stub(args.latencia_ia)
+        puerto = puerto_libre()
+        entorno = dict(os.environ, OPENAI_API_KEY="stub", OPENAI_BASE_URL=base)
+        proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+                                 "-b", f"127.0.0.1:{puerto}", "-w", str(args.workers),
+                                 "--threads", str(args.hilos)], env=entorno, cwd=AQUI)
+        url = f"http://127.0.0.1:{puerto}"
+    try:
+        asyncio.run(esperar_listo(url, proc))
+        res = asyncio.run(ejecutar(url, args))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    return {
+        "meta": {"fecha": datetime.now().isoformat(timespec="seconds"), "commit": commit_actual(),
+                 "url": args.url or "gunicorn local", "max_ticket_id": res["max_id"],
+                 "peticiones": args.peticiones, "concurrencia": args.concurrencia,
+                 "calentamiento": args.calentamiento, "semilla": args.semilla,
+                 "workers": None if args.url else args.workers, "hilos": None if args.url else args.hilos,
+                 "latencia_ia": None if args.url else args.latencia_ia},
+        "escenarios": res["escenarios"],
+    }
+
+
+# ---------- diff ----------
+def comparar(a: Dict[str, Any], b: Dict[str, Any], tolerancia: Optional[float]) -> bool:
+    """Imprime la variación de b respecto de a; False si algo empeora más que `tolerancia`."""
+    ok = True
+    print(f"{'escenario':<10} {'req/s':>18} {'p50 ms':>18} {'p95 ms':>18} {'p99 ms':>18}")
+    for nombre in b["escenarios"]:
+        ra, rb = a["escenarios"].get(nombre), b["escenarios"][nombre]
+        if not ra:
+            print(f"{nombre:<10} (nuevo)")
+            continue
+        celdas = []
+        for campo, mas_es_mejor in (("req_s", True), ("p50_ms", False), ("p95_ms", False), ("p99_ms", False)):
+            va, vb = ra.get(campo), rb.get(campo)
+            if not va or vb is None:
+                celdas.append(f"{'-':>18}")
+                continue
+            cambio = (vb - va) / va
+            peor = -cambio if mas_es_mejor else cambio
+            marca = ""
+            if tolerancia is not None and campo in ("req_s", "p95_ms") and peor > tolerancia:
+                ok, marca = False, " !"
+            celdas.append(f"{vb:>9} ({cambio:+6.1%}){marca:2}")
+        print(f"{nombre:<10} " + " ".join(celdas))
+    return ok
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Benchmark de la API de tickets y del chat.")
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    s = sub.add_parser("seed", help="crea tickets de prueba en la BD del .env")
+    s.add_argument("--tickets", type=int, default=10000)
+    s.add_argument("--semilla", type=int, default=42)
+
+    r = sub.add_parser("run", help="mide los escenarios y escribe el JSON de resultados")
+    r.add_argument("--url", help="servidor ya levantado (si no, se arranca gunicorn local)")
+    r.add_argument("--escenarios", default=",".join(ESCENARIOS),
+                   type=lambda v: [e for e in v.split(",") if e])
+    r.add_argument("--peticiones", type=int, default=1000, help="por escenario")
+    r.add_argument("--concurrencia", type=int, default=32)
+    r.add_argument("--calentamiento", type=int, default=50)
+    r.add_argument("--workers", type=int, default=2)
+    r.add_argument("--hilos", type=int, default=8)
+    r.add_argument("--latencia-ia", type=float, default=0.3, help="seg. que tarda el falso OpenAI")
+    r.add_argument("--usuario", default=os.getenv("BENCH_USUARIO", "admin"))
+    r.add_argument("--clave", default=os.getenv("BENCH_CLAVE", "admin123"))
+    r.add_argument("--semilla", type=int, default=42)
+    r.add_argument("-o", "--salida", help="archivo JSON (por defecto, la salida estándar)")
+
+    st = sub.add_parser("stub", help="sólo el falso OpenAI, para un servidor arrancado a mano")
+    st.add_argument("--puerto", type=int, default=8099)
+    st.add_argument("--latencia-ia", type=float, default=0.3)
+
+    d = sub.add_parser("diff", help="compara dos resultados de run")
+    d.add_argument("antes")
+    d.add_argument("despues")
+    d.add_argument("--tolerancia", type=float, help="p. ej. 0.1: sale con 1 si req/s o p95 empeoran >10%%")
+
+    args = p.parse_args()
+    if args.cmd == "seed":
+        import config  # noqa: F401  (carga .env)
+        sembrar(args.tickets, args.semilla)
+    elif args.cmd == "run":
+        desconocidos = set(args.escenarios) - set(ESCENARIOS)
+        if desconocidos:
+            p.error(f"escenarios desconocidos: {', '.join(sorted(desconocidos))}")
+        resultado = json.dumps(correr(args), indent=2, ensure_ascii=False)
+        if args.salida:
+            with open(args.salida, "w", encoding="utf-8") as f:
+                f.write(resultado + "\n")
+            print(f"== resultados en {args.salida}", file=sys.stderr)
+        else:
+            print(resultado)
+    elif args.cmd == "stub":
+        print(f"OPENAI_BASE_URL={arrancar_stub(args.latencia_ia, args.puerto)}  (Ctrl+C para salir)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+    else:
+        with open(args.antes, encoding="utf-8") as fa, open(args.despues, encoding="utf-8") as fb:
+            sys.exit(0 if comparar(json.load(fa), json.load(fb), args.tolerancia) else 1)
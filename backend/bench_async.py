@@ -0,0 +1,125 @@
+# backend/bench_async.py
+"""
+Comparativa del chat en modo síncrono (gunicorn gthread) y asíncrono (uvicorn + asgi.py).
+
+Levanta un falso OpenAI local que tarda --latencia seg. en contestar (el
+cuello de botella real del chat), arranca cada servidor apuntando a él con
+OPENAI_BASE_URL y lanza --concurrencia POST /chat simultáneos con mensajes
+distintos (sin aciertos de caché). Imprime req/s, p50/p95/p99, errores y los
+hilos máximos del proceso servidor:
+
+    python bench_async.py --peticiones 2000 --concurrencia 200 --latencia 1.5
+
+Necesita la BD configurada en .env como la app (sesiones de chat y caché).
+Para el resto de endpoints, ver bench.py.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+
+from bench import arrancar_stub, esperar_listo, hilos, percentiles, puerto_libre
+
+
+# ---------- servidores a comparar ----------
+def comando(modo: str, puerto: int, args) -> list:
+    if modo == "sync":
+        return [sys.executable, "-m", "gunicorn", "-k", "gthread", "-w", "1",
+                "--threads", str(args.hilos), "-b", f"127.0.0.1:{puerto}", "wsgi:app"]
+    return [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1",
+            "--port", str(puerto), "--log-level", "warning", "--backlog", "4096"]
+
+
+async def cargar(url: str, peticiones: int, concurrencia: int, pid: int):
+    tiempos, errores = [], 0
+    pico = [0]
+    cola = asyncio.Queue()
+    for i in range(peticiones):
+        cola.put_nowait(i)
+    marca = uuid.uuid4().hex[:6]
+
+    async def cliente(http):
+        nonlocal errores
+        while True:
+            try:
+                i = cola.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            t0 = time.perf_counter()
+            try:
+                # Mensaje único: ni la caché de IA ni las intenciones lo contestan
+                r = await http.post(url + "/chat", json={"message": f"consulta {marca}-{i} zqx{i * 7919}"})
+                if r.status_code != 200:
+                    errores += 1
+                    continue
+            except httpx.HTTPError:
+                errores += 1
+                continue
+            tiempos.append(time.perf_counter() - t0)
+
+    async def muestrear():
+        while True:
+            pico[0] = max(pico[0], hilos(pid))
+            await asyncio.sleep(0.2)
+
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+    async with httpx.AsyncClient(limits=limites, timeout=120) as http:
+        muestreo = asyncio.create_task(muestrear())
+        t0 = time.perf_counter()
+        await asyncio.gather(*(cliente(http) for _ in range(concurrencia)))
+        total = time.perf_counter() - t0
+        muestreo.cancel()
+
+    return {"ok": len(tiempos), "errores": errores, "seg": round(total, 2),
+            "req_s": round(len(tiempos) / total, 1) if total else 0,
+            **percentiles(tiempos), "hilos_max": pico[0]}
+
+
+def medir(modo: str, base_stub: str, args):
+    puerto = puerto_libre()
+    entorno = dict(os.environ, OPENAI_API_KEY="stub", OPENAI_BASE_URL=base_stub,
+                   RETRIEVAL_ENABLED="0", DEDUP_ENABLED="0", TRIAGE_ENABLED="0")
+    proc = subprocess.Popen(comando(modo, puerto, args), env=entorno,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    url = f"http://127.0.0.1:{puerto}"
+    try:
+        asyncio.run(esperar_listo(url, proc))
+        # gunicorn: el worker es el hijo del master
+        pid = proc.pid
+        if modo == "sync":
+            try:
+                with open(f"/proc/{proc.pid}/task/{proc.pid}/children") as f:
+                    pid = int(f.read().split()[0])
+            except (OSError, IndexError, ValueError):
+                pass
+        return asyncio.run(cargar(url, args.peticiones, args.concurrencia, pid))
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Chat síncrono vs asíncrono contra un OpenAI simulado.")
+    p.add_argument("--peticiones", type=int, default=1000)
+    p.add_argument("--concurrencia", type=int, default=100)
+    p.add_argument("--latencia", type=float, default=1.0, help="seg. que tarda el falso OpenAI")
+    p.add_argument("--hilos", type=int, default=int(os.getenv("GUNICORN_THREADS", "8")),
+                   help="hilos del worker gthread (modo sync)")
+    p.add_argument("--modos", default="sync,async")
+    args = p.parse_args()
+
+    base = arrancar_stub(args.latencia)
+    resultados = {}
+    for modo in args.modos.split(","):
+        print(f"== {modo}: {args.peticiones} peticiones, concurrencia {args.concurrencia} ...", file=sys.stderr)
+        resultados[modo] = medir(modo, base, args)
+    print(json.dumps(resultados, indent=2))
@@ -0,0 +1,58 @@
+# backend/bootstrap.py
+"""
+Preparación de la BD, una vez por despliegue (no por worker):
+
+    python bootstrap.py
+
+- Aplica las migraciones pendientes (migrations.migrate; un GET_LOCK evita
+  que dos máquinas migren a la vez).
+- Crea el admin por defecto si no existe. Si ya está no se toca: no se
+  calcula el hash PBKDF2 ni se pisa una contraseña cambiada (para volver a
+  admin123 está reset_admin.py).
+
+gunicorn.conf.py lo llama en el proceso maestro antes de crear los workers
+(on_starting) y `python routers.py` al arrancar en desarrollo; con
+DB_AUTO_MIGRATE=0 se omite y hay que ejecutarlo en el paso de despliegue.
+"""
+import time
+
+import config  # noqa: F401  (carga .env)
+from werkzeug.security import generate_password_hash
+
+import migrations
+from models import Database, TicketModel
+
+
+def ensure_admin(ticket_model: TicketModel) -> bool:
+    """Crea el admin por defecto si falta. Devuelve True si lo creó o reparó."""
+    u = ticket_model.obtener_usuario_por_username("admin")
+    if u and u.get("role") == "admin" and u.get("password_hash"):
+        return False
+    h = generate_password_hash("admin123", method="pbkdf2:sha256")
+    ticket_model.force_admin_password(
+        username="admin",
+        password_hash=h,
+        nombre="Administrador",
+        email="admin@soporte.com",  # si ya está usado por otro, se respeta el email actual del admin
+    )
+    print("== Admin listo: admin / admin123")
+    return True
+
+
+def bootstrap(verbose: bool = True):
+    """Migraciones + admin con un pool propio, que se cierra al terminar (antes del fork)."""
+    t0 = time.time()
+    db = Database.from_env()
+    try:
+        aplicadas = migrations.migrate(db, verbose=verbose)
+        with db.connection():
+            ensure_admin(TicketModel(db))
+    finally:
+        db.close()
+    if verbose:
+        print(f"== Bootstrap: esquema al día ({len(aplicadas)} migraciones aplicadas), "
+              f"{time.time() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    bootstrap()
@@ -0,0 +1,204 @@
+# backend/cache.py
+"""
+Caché de lectura para consultas del panel.
+
+- L1: LRU en memoria con TTL, por proceso.
+- L2 (opcional, CACHE_SHARED_PATH): archivo SQLite local compartido por todos
+  los workers de la máquina. Guarda los valores y un contador de generación;
+  cuando un worker invalida, sube la generación y los demás vacían su L1 en la
+  siguiente lectura, así todos ven los mismos datos.
+
+Las entradas llevan un `meta` (dict) y la invalidación es por predicado sobre
+ese meta: quien escribe decide exactamente qué claves caen.
+Los valores devueltos se comparten entre hilos: no mutarlos.
+"""
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class SharedStore:
+    """Valores + generación en un SQLite local (WAL) accesible por varios procesos."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._cnx = None
+        self._pid = None
+
+    def _conn(self):
+        # Una conexión por proceso: si venimos de un fork se abre otra
+        if self._cnx is None or self._pid != os.getpid():
+            cnx = sqlite3.connect(self.path, timeout=5, isolation_level=None,
+                                  check_same_thread=False)
+            cnx.execute("PRAGMA journal_mode=WAL")
+            cnx.execute("PRAGMA synchronous=NORMAL")
+            cnx.execute("""CREATE TABLE IF NOT EXISTS entradas (
+                clave TEXT PRIMARY KEY, valor BLOB, meta TEXT, expira REAL)""")
+            cnx.execute("CREATE TABLE IF NOT EXISTS generacion (id INTEGER PRIMARY KEY, n INTEGER)")
+            cnx.execute("INSERT OR IGNORE INTO generacion (id, n) VALUES (1, 0)")
+            self._cnx, self._pid = cnx, os.getpid()
+        return self._cnx
+
+    def generacion(self) -> int:
+        with self._lock:
+            return self._conn().execute("SELECT n FROM generacion WHERE id=1").fetchone()[0]
+
+    def get(self, clave: str) -> Optional[Tuple[Any, Dict[str, Any], float]]:
+        """(valor, meta, expira) o None si no está o ya venció."""
+        with self._lock:
+            row = self._conn().execute(
+                "SELECT valor, meta, expira FROM entradas WHERE clave=?", (clave,)).fetchone()
+        if not row or row[2] < time.time():
+            return None
+        return pickle.loads(row[0]), json.loads(row[1]), row[2]
+
+    def set(self, clave: str, valor: Any, meta: Dict[str, Any], expira: float, max_items: int):
+        blob = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            cnx = self._conn()
+            cnx.execute("INSERT OR REPLACE INTO entradas (clave, valor, meta, expira) VALUES (?,?,?,?)",
+                        (clave, blob, json.dumps(meta, default=str), expira))
+            # Poda: vencidas y, si aún sobran, las que antes vencen
+            cnx.execute("DELETE FROM entradas WHERE expira < ?", (time.time(),))
+            cnx.execute("""DELETE FROM entradas WHERE clave IN (
+                SELECT clave FROM entradas ORDER BY expira DESC LIMIT -1 OFFSET ?)""", (max_items,))
+
+    def invalidate(self, pred: Callable[[str, Dict[str, Any]], bool]) -> Tuple[int, int]:
+        """Borra las claves que cumplen pred y sube la generación. Devuelve (antes, después)."""
+        with self._lock:
+            cnx = self._conn()
+            cnx.execute("BEGIN IMMEDIATE")
+            try:
+                antes = cnx.execute("SELECT n FROM generacion WHERE id=1").fetchone()[0]
+                caen = [clave for clave, meta in cnx.execute("SELECT clave, meta FROM entradas")
+                        if pred(clave, json.loads(meta))]
+                cnx.executemany("DELETE FROM entradas WHERE clave=?", [(c,) for c in caen])
+                cnx.execute("UPDATE generacion SET n = n + 1 WHERE id=1")
+                cnx.execute("COMMIT")
+            except Exception:
+                cnx.execute("ROLLBACK")
+                raise
+        return antes, antes + 1
+
+
+class QueryCache:
+    def __init__(self, max_items: int = 256, ttl: float = 30.0,
+                 shared_path: Optional[str] = None):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.shared = SharedStore(shared_path) if shared_path else None
+        self._items: "OrderedDict[str, Tuple[float, Any, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._gen = None    # última generación compartida vista
+        self._seq = 0       # sube con cada invalidación que afecta a este proceso
+        self._stats = {"hits": 0, "hits_shared": 0, "misses": 0,
+                       "invalidations": 0, "evictions": 0}
+
+    @classmethod
+    def from_env(cls) -> "QueryCache":
+        """CACHE_TTL (0 = desactivada), CACHE_MAX_ITEMS, CACHE_SHARED_PATH."""
+        return cls(max_items=int(os.getenv("CACHE_MAX_ITEMS", "256")),
+                   ttl=float(os.getenv("CACHE_TTL", "30")),
+                   shared_path=os.getenv("CACHE_SHARED_PATH") or None)
+
+    @staticmethod
+    def key(*partes) -> str:
+        return json.dumps(partes, sort_keys=True, default=str)
+
+    def _sync_generacion(self):
+        if not self.shared:
+            return
+        gen = self.shared.generacion()
+        with self._lock:
+            if gen != self._gen:
+                if self._gen is not None:
+                    self._items.clear()
+                    self._seq += 1
+                self._gen = gen
+
+    def get(self, clave: str) -> Tuple[bool, Any]:
+        self._sync_generacion()
+        now = time.time()
+        with self._lock:
+            item = self._items.get(clave)
+            if item and item[0] >= now:
+                self._items.move_to_end(clave)
+                self._stats["hits"] += 1
+                return True, item[1]
+        if self.shared:
+            entrada = self.shared.get(clave)
+            if entrada:
+                valor, meta, expira = entrada
+                with self._lock:
+                    self._stats["hits_shared"] += 1
+                    self._items[clave] = (expira, valor, meta)
+                    self._trim()
+                return True, valor
+        with self._lock:
+            self._stats["misses"] += 1
+        return False, None
+
+    def set(self, clave: str, valor: Any, meta: Optional[Dict[str, Any]] = None):
+        meta = meta or {}
+        expira = time.time() + self.ttl
+        with self._lock:
+            self._items[clave] = (expira, valor, meta)
+            self._items.move_to_end(clave)
+            self._trim()
+        if self.shared:
+            self.shared.set(clave, valor, meta, expira, self.max_items)
+
+    def _trim(self):
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get_or_load(self, clave: str, loader: Callable[[], Any], meta=None) -> Any:
+        """Lee de la caché o llama a loader(). meta puede ser un dict o f(valor) -> dict."""
+        if self.ttl <= 0:
+            return loader()
+        ok, valor = self.get(clave)
+        if ok:
+            return valor
+        seq0 = self._seq
+        valor = loader()
+        # Si hubo una invalidación mientras cargábamos, el valor puede estar viejo
+        self._sync_generacion()
+        if self._seq == seq0:
+            self.set(clave, valor, meta(valor) if callable(meta) else meta)
+        return valor
+
+    def invalidate(self, pred: Callable[[str, Dict[str, Any]], bool]):
+        """Descarta las entradas cuyo (clave, meta) cumple pred, aquí y en el L2."""
+        with self._lock:
+            caen = [k for k, (_, _, meta) in self._items.items() if pred(k, meta)]
+            for k in caen:
+                del self._items[k]
+            self._seq += 1
+            self._stats["invalidations"] += 1
+        if self.shared:
+            antes, despues = self.shared.invalidate(pred)
+            with self._lock:
+                if antes != self._gen:
+                    # Otro worker invalidó algo que aún no habíamos visto
+                    self._items.clear()
+                self._gen = despues
+
+    def clear(self):
+        self.invalidate(lambda clave, meta: True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            st = dict(self._stats)
+            st["items"] = len(self._items)
+        total = st["hits"] + st["hits_shared"] + st["misses"]
+        st["hit_rate"] = round((st["hits"] + st["hits_shared"]) / total, 4) if total else 0.0
+        st["ttl"] = self.ttl
+        st["shared"] = bool(self.shared)
+        return st
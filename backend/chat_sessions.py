@@ -0,0 +1,118 @@
+# backend/chat_sessions.py
+"""
+Historial del chat guardado en el servidor, por sesión (chat_id).
+
+El cliente ya no manda la conversación: aquí se guardan los últimos
+CHAT_TURNOS turnos literales y los anteriores se compactan en un resumen
+acumulado (extractivo, sin llamar a la IA). Al armar el prompt se respeta un
+presupuesto de tokens (CHAT_MAX_TOKENS, estimado como len/4): primero entra
+el mensaje, luego el resumen y después los turnos más recientes que quepan.
+Así el tamaño del prompt —y la latencia por turno— no crece con la charla.
+
+Las sesiones viven en memoria (QueryCache, TTL deslizante); con
+CHAT_SHARED_PATH se guardan en un SQLite compartido (cache.SharedStore) para
+que cualquier worker de la máquina continúe la conversación. Debe ser otro
+archivo que CACHE_SHARED_PATH: aquel se poda y se vacía con sus propias reglas.
+"""
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from cache import QueryCache, SharedStore
+
+_ESPACIOS = re.compile(r"\s+")
+_FRASE = re.compile(r"(?<=[.!?])\s")
+
+
+def estimar_tokens(texto: Optional[str]) -> int:
+    """Aproximación barata (~4 caracteres por token) suficiente para el presupuesto."""
+    return (len(texto or "") + 3) // 4
+
+
+def _recortar(texto: str, max_chars: int) -> str:
+    texto = _ESPACIOS.sub(" ", texto or "").strip()
+    primera = _FRASE.split(texto, 1)[0]
+    if len(primera) > max_chars:
+        primera = primera[:max_chars - 1].rstrip() + "…"
+    return primera
+
+
+class ChatSessionStore:
+    def __init__(self, max_turnos: int = 6, max_tokens: int = 1500,
+                 max_tokens_resumen: int = 300, ttl: float = 3600,
+                 max_sesiones: int = 5000, shared_path: Optional[str] = None):
+        self.max_turnos = max_turnos
+        self.max_tokens = max_tokens
+        self.max_tokens_resumen = max_tokens_resumen
+        self.ttl = ttl
+        self.max_sesiones = max_sesiones
+        # Compartido: se lee siempre del SQLite (un L1 por worker quedaría viejo
+        # en cuanto otro worker atienda el siguiente turno de la misma sesión)
+        self._shared = SharedStore(shared_path) if shared_path else None
+        self._mem = QueryCache(max_items=max_sesiones, ttl=ttl)
+
+    @classmethod
+    def from_env(cls) -> "ChatSessionStore":
+        """CHAT_TURNOS, CHAT_MAX_TOKENS, CHAT_RESUMEN_TOKENS, CHAT_SESION_TTL, CHAT_MAX_SESIONES."""
+        return cls(max_turnos=int(os.getenv("CHAT_TURNOS", "6")),
+                   max_tokens=int(os.getenv("CHAT_MAX_TOKENS", "1500")),
+                   max_tokens_resumen=int(os.getenv("CHAT_RESUMEN_TOKENS", "300")),
+                   ttl=float(os.getenv("CHAT_SESION_TTL", "3600")),
+                   max_sesiones=int(os.getenv("CHAT_MAX_SESIONES", "5000")),
+                   shared_path=os.getenv("CHAT_SHARED_PATH") or None)
+
+    def _leer(self, chat_id: str) -> Dict[str, Any]:
+        if self._shared:
+            entrada = self._shared.get(chat_id)
+            ok, estado = bool(entrada), entrada and entrada[0]
+        else:
+            ok, estado = self._mem.get(chat_id)
+        return estado if ok else {"resumen": "", "turnos": [], "total": 0}
+
+    def _guardar(self, chat_id: str, estado: Dict[str, Any]):
+        if self._shared:
+            self._shared.set(chat_id, estado, {}, time.time() + self.ttl, self.max_sesiones)
+        else:
+            self._mem.set(chat_id, estado)
+
+    def contexto(self, chat_id: str, mensaje: str) -> Tuple[str, List[Dict[str, str]]]:
+        """(resumen, historial) a enviar con `mensaje` sin pasar de max_tokens."""
+        estado = self._leer(chat_id)
+        restante = self.max_tokens - estimar_tokens(mensaje)
+        resumen = estado["resumen"]
+        if estimar_tokens(resumen) > restante:
+            resumen = ""
+        restante -= estimar_tokens(resumen)
+        historial = []
+        for turno in reversed(estado["turnos"]):
+            coste = estimar_tokens(turno["usuario"]) + estimar_tokens(turno["ia"])
+            if coste > restante:
+                break
+            historial.append(turno)
+            restante -= coste
+        historial.reverse()
+        return resumen, historial
+
+    def registrar(self, chat_id: str, mensaje: str, respuesta: str):
+        """Añade el turno y compacta en el resumen los que exceden max_turnos."""
+        estado = self._leer(chat_id)
+        # Los valores de la caché se comparten entre hilos: se construye uno nuevo
+        turnos = estado["turnos"] + [{"usuario": mensaje, "ia": respuesta}]
+        lineas = [l for l in estado["resumen"].split("\n") if l]
+        while len(turnos) > self.max_turnos:
+            viejo = turnos.pop(0)
+            lineas.append(f"- Usuario: {_recortar(viejo['usuario'], 160)} "
+                          f"| Asistente: {_recortar(viejo['ia'], 160)}")
+        # Resumen acotado: se olvidan primero los turnos más antiguos
+        while lineas and estimar_tokens("\n".join(lineas)) > self.max_tokens_resumen:
+            lineas.pop(0)
+        self._guardar(chat_id, {"resumen": "\n".join(lineas), "turnos": turnos,
+                                "total": estado["total"] + 1})
+
+    def borrar(self, chat_id: str):
+        self._guardar(chat_id, {"resumen": "", "turnos": [], "total": 0})
+
+    def stats(self) -> Dict[str, Any]:
+        return {"sesiones_mem": self._mem.stats()["items"], "shared": bool(self._shared),
+                "ttl": self.ttl, "max_turnos": self.max_turnos, "max_tokens": self.max_tokens}
@@ -1,7 +1,13 @@
 import os
+from pathlib import Path
 from dotenv import load_dotenv # type: ignore
 
-load_dotenv()
+# Único punto que lee .env: primero backend/.env y luego el de la raíz (no
+# pisa lo ya definido). Los módulos que leen variables al importarse
+# (routers, ai_agent, migrations...) importan config antes que nada.
+_AQUI = Path(__file__).resolve().parent
+load_dotenv(_AQUI / '.env')
+load_dotenv(_AQUI.parent / '.env')
 
 class Config:
     SECRET_KEY = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key')
@@ -0,0 +1,9 @@
+# backend/conftest.py
+"""
+Configuración de pytest: los módulos del backend se importan por nombre
+(`import models`), como en la app, porque este directorio es la raíz.
+
+    cd backend && python -m pytest -q
+"""
+# Script manual contra la API real, no es un test
+collect_ignore = ["test_openai.py"]
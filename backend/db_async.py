@@ -0,0 +1,85 @@
+# backend/db_async.py
+"""
+Pool de conexiones MySQL para el modo asyncio (asgi.py), con aiomysql.
+
+Mismas variables que models.Database (DB_HOST, DB_USER, DB_POOL_SIZE,
+DB_POOL_TIMEOUT, DB_POOL_RECYCLE, ...). El pool se crea con la primera
+consulta, ya dentro del bucle de eventos del worker; cada consulta toma una
+conexión, la usa y la devuelve, sin ocupar un hilo mientras espera a MySQL.
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Sequence
+
+import aiomysql
+
+from models import PoolTimeout
+
+
+class AsyncDatabase:
+    def __init__(self):
+        self.host = os.getenv("DB_HOST", "127.0.0.1")
+        self.user = os.getenv("DB_USER", "appuser")
+        self.password = os.getenv("DB_PASSWORD", "app123")
+        self.port = int(os.getenv("DB_PORT", "3307"))
+        self.database = os.getenv("DB_NAME", "soporte_ia")
+        self.pool_size = int(os.getenv("DB_POOL_SIZE", "10"))
+        self.pool_timeout = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+        self.pool_recycle = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+        self._pool = None
+        self._lock = asyncio.Lock()
+
+    async def pool(self):
+        if self._pool is None:
+            async with self._lock:
+                if self._pool is None:
+                    self._pool = await aiomysql.create_pool(
+                        host=self.host, user=self.user, password=self.password,
+                        port=self.port, db=self.database, charset="utf8mb4",
+                        minsize=0, maxsize=self.pool_size, pool_recycle=self.pool_recycle,
+                        connect_timeout=5, autocommit=True)
+        return self._pool
+
+    @asynccontextmanager
+    async def connection(self):
+        pool = await self.pool()
+        try:
+            cnx = await asyncio.wait_for(pool.acquire(), self.pool_timeout)
+        except asyncio.TimeoutError:
+            raise PoolTimeout(
+                f"Sin conexiones libres tras {self.pool_timeout}s (pool={self.pool_size})")
+        try:
+            yield cnx
+        finally:
+            pool.release(cnx)
+
+    async def fetchone(self, sql: str, params: Sequence[Any] = ()) -> Optional[Dict[str, Any]]:
+        async with self.connection() as cnx:
+            async with cnx.cursor(aiomysql.DictCursor) as cur:
+                await cur.execute(sql, params)
+                return await cur.fetchone()
+
+    async def fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        async with self.connection() as cnx:
+            async with cnx.cursor(aiomysql.DictCursor) as cur:
+                await cur.execute(sql, params)
+                return list(await cur.fetchall())
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> int:
+        """Una sentencia en autocommit; devuelve rowcount."""
+        async with self.connection() as cnx:
+            async with cnx.cursor() as cur:
+                await cur.execute(sql, params)
+                return cur.rowcount
+
+    def pool_stats(self) -> Dict[str, Any]:
+        if self._pool is None:
+            return {"size": self.pool_size, "open": 0, "idle": 0}
+        return {"size": self.pool_size, "open": self._pool.size, "idle": self._pool.freesize}
+
+    async def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
@@ -0,0 +1,268 @@
+# backend/db_sqlite.py
+"""
+Backend SQLite embebido (DB_BACKEND=sqlite): la app completa sin servidor
+MySQL, en un solo archivo (DB_SQLITE_PATH). Pensado para una instalación en
+una sola máquina, desarrollo y benchmarks.
+
+SQLiteDatabase tiene la misma interfaz que models.Database (pool acotado,
+conexión por hilo, cursor(), commit(), end_request()...), así TicketModel,
+AICache, retrieval, dedup y export no cambian: siguen escribiendo SQL de
+MySQL y aquí se traduce, una vez por texto de sentencia (caché LRU), a SQLite:
+
+- %s -> ?
+- NOW(), NOW() +/- INTERVAL n SECOND|MINUTE|HOUR|DAY, UNIX_TIMESTAMP(),
+  FROM_UNIXTIME() -> funciones de fecha de SQLite en hora local
+- ON DUPLICATE KEY UPDATE c=VALUES(c) -> ON CONFLICT DO UPDATE SET c=excluded.c
+- SELECT ... FOR UPDATE -> SELECT dentro de una transacción de escritura
+- DELETE ... [ORDER BY ...] LIMIT n -> DELETE ... WHERE rowid IN (SELECT ...)
+- SET SESSION ... -> se ignora
+
+El texto traducido es siempre el mismo objeto para la misma sentencia, de
+modo que la caché de sentencias preparadas de cada conexión (sqlite3,
+DB_SQLITE_STMT_CACHE) la reutiliza sin volver a compilarla.
+
+Transacciones: las conexiones están en autocommit y la primera sentencia que
+escribe abre BEGIN IMMEDIATE (toma el lock de escritura de entrada, como el
+FOR UPDATE de InnoDB, en vez de fallar al promocionar un lock de lectura).
+Las lecturas fuera de una transacción ven siempre lo último confirmado.
+Los errores de sqlite3 se relanzan como mysql.connector.Error con el errno
+equivalente (ER_DUP_ENTRY, ER_NO_SUCH_TABLE...), que es lo que esperan los
+llamadores.
+
+La búsqueda de texto usa el índice local (search.py): SQLite no tiene el
+FULLTEXT de la migración 7.
+"""
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import mysql.connector
+from mysql.connector import errorcode
+
+from models import Database
+
+SQLITE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "soporte_ia.sqlite3")
+
+# Fechas como en MySQL: TIMESTAMP <-> datetime, texto 'YYYY-MM-DD HH:MM:SS' en hora local
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" "))
+sqlite3.register_converter("TIMESTAMP", lambda b: datetime.fromisoformat(b.decode()))
+
+_AHORA = "datetime('now', 'localtime')"
+_UNIDADES = {"SECOND": "seconds", "MINUTE": "minutes", "HOUR": "hours", "DAY": "days"}
+_INTERVALO = re.compile(r"NOW\(\)\s*([+-])\s*INTERVAL\s+(\?|\d+)\s+(SECOND|MINUTE|HOUR|DAY)\b", re.I)
+_AHORA_COMO = re.compile(r"NOW\(\)\s+AS\s+(\w+)", re.I)
+_DUPLICADO = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.I)
+_VALUES = re.compile(r"\bVALUES\((\w+)\)", re.I)
+_FOR_UPDATE = re.compile(r"\s+FOR\s+UPDATE\s*$", re.I)
+_DELETE_LIMIT = re.compile(r"^\s*DELETE\s+FROM\s+(\w+)\s*(.*?)\s*\bLIMIT\s+(\S+)\s*$", re.I | re.S)
+_LECTURAS = ("SELECT", "WITH", "PRAGMA", "EXPLAIN", "BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")
+
+# Mensaje de sqlite3 -> (errno de MySQL, clase de mysql.connector)
+_ERRORES = (
+    ("UNIQUE constraint failed", errorcode.ER_DUP_ENTRY, mysql.connector.IntegrityError),
+    ("FOREIGN KEY constraint failed", errorcode.ER_NO_REFERENCED_ROW_2, mysql.connector.IntegrityError),
+    ("NOT NULL constraint failed", errorcode.ER_BAD_NULL_ERROR, mysql.connector.IntegrityError),
+    ("CHECK constraint failed", errorcode.ER_CHECK_CONSTRAINT_VIOLATED, mysql.connector.IntegrityError),
+    ("no such table", errorcode.ER_NO_SUCH_TABLE, mysql.connector.ProgrammingError),
+    ("duplicate column name", errorcode.ER_DUP_FIELDNAME, mysql.connector.ProgrammingError),
+    ("index", errorcode.ER_DUP_KEYNAME, mysql.connector.ProgrammingError),       # index ... already exists
+    ("already exists", errorcode.ER_TABLE_EXISTS_ERROR, mysql.connector.ProgrammingError),
+    ("database is locked", errorcode.ER_LOCK_WAIT_TIMEOUT, mysql.connector.OperationalError),
+)
+
+
+def _error_mysql(e: sqlite3.Error) -> mysql.connector.Error:
+    msg = str(e)
+    for texto, errno, clase in _ERRORES:
+        if texto in msg and (texto != "index" or "already exists" in msg):
+            return clase(msg=msg, errno=errno)
+    return mysql.connector.DatabaseError(msg=msg)
+
+
+def _llamadas(sql: str, funcion: str, plantilla: str) -> str:
+    """Reemplaza FUNCION(arg) por plantilla.format(arg), con paréntesis anidados en arg."""
+    patron = re.compile(rf"\b{funcion}\(", re.I)
+    while True:
+        m = patron.search(sql)
+        if not m:
+            return sql
+        nivel, i = 1, m.end()
+        while nivel and i < len(sql):
+            nivel += {"(": 1, ")": -1}.get(sql[i], 0)
+            i += 1
+        sql = sql[:m.start()] + plantilla.format(sql[m.end():i - 1]) + sql[i:]
+
+
+@lru_cache(maxsize=1024)
+def traducir(sql: str) -> Tuple[Optional[str], bool]:
+    """(sentencia SQLite o None si no aplica, ¿escribe?) para una sentencia de MySQL."""
+    if re.match(r"\s*SET\s+SESSION\b", sql, re.I):
+        return None, False
+    s = sql.replace("%s", "?").replace("%%", "%")
+    s = _INTERVALO.sub(lambda m: f"datetime('now', 'localtime', '{m.group(1)}' || {m.group(2)} || "
+                                 f"' {_UNIDADES[m.group(3).upper()]}')", s)
+    # Alias con tipo: sqlite3 lo convierte a datetime como una columna TIMESTAMP
+    s = _AHORA_COMO.sub(lambda m: f'{_AHORA} AS "{m.group(1)} [timestamp]"', s)
+    s = re.sub(r"\bNOW\(\)", _AHORA, s, flags=re.I)
+    s = _llamadas(s, "UNIX_TIMESTAMP", "CAST(strftime('%s', {}, 'utc') AS INTEGER)")
+    s = _llamadas(s, "FROM_UNIXTIME", "datetime({}, 'unixepoch', 'localtime')")
+    m = _DUPLICADO.search(s)
+    if m:
+        s = s[:m.start()] + "ON CONFLICT DO UPDATE SET" + _VALUES.sub(r"excluded.\1", s[m.end():])
+    escribe = not s.lstrip().upper().startswith(_LECTURAS)
+    if _FOR_UPDATE.search(s):
+        s, escribe = _FOR_UPDATE.sub("", s), True
+    m = _DELETE_LIMIT.match(s)
+    if m:
+        tabla, resto, limite = m.groups()
+        s = f"DELETE FROM {tabla} WHERE rowid IN (SELECT rowid FROM {tabla} {resto} LIMIT {limite})"
+    return s, escribe
+
+
+class CursorSQLite:
+    """Cursor con la interfaz de mysql.connector (dictionary=True -> filas dict)."""
+
+    def __init__(self, cnx: "ConexionSQLite", dictionary: bool = False):
+        self._cnx = cnx
+        self._cur = cnx._cnx.cursor()
+        self._dict = dictionary
+        self._nombres = None
+        self.lastrowid = None
+        self.rowcount = -1
+
+    def _preparar(self, sql):
+        s, escribe = traducir(sql)
+        if s is not None and escribe and not self._cnx._cnx.in_transaction:
+            self._cur.execute("BEGIN IMMEDIATE")
+        return s
+
+    def _ejecutado(self):
+        d = self._cur.description
+        self._nombres = [c[0] for c in d] if d else None
+        self.rowcount = self._cur.rowcount
+
+    def execute(self, sql, params=()):
+        try:
+            s = self._preparar(sql)
+            if s is None:
+                return
+            self._cur.execute(s, tuple(params or ()))
+        except sqlite3.Error as e:
+            raise _error_mysql(e) from e
+        self._ejecutado()
+        self.lastrowid = self._cur.lastrowid
+
+    def executemany(self, sql, seq_params):
+        try:
+            s = self._preparar(sql)
+            if s is None:
+                return
+            self._cur.executemany(s, seq_params)
+            self._ejecutado()
+            if self.rowcount > 0 and s.lstrip()[:6].upper() == "INSERT":
+                # Como un INSERT multi-fila de MySQL: lastrowid es el de la PRIMERA fila
+                # (ids consecutivos: la transacción tiene el lock de escritura)
+                ultimo = self._cnx._cnx.execute("SELECT last_insert_rowid()").fetchone()[0]
+                self.lastrowid = ultimo - self.rowcount + 1
+        except sqlite3.Error as e:
+            raise _error_mysql(e) from e
+
+    def _fila(self, fila):
+        return dict(zip(self._nombres, fila)) if self._dict and fila is not None else fila
+
+    def fetchone(self):
+        return self._fila(self._cur.fetchone())
+
+    def fetchmany(self, size=1):
+        filas = self._cur.fetchmany(size)
+        return [dict(zip(self._nombres, f)) for f in filas] if self._dict else filas
+
+    def fetchall(self):
+        filas = self._cur.fetchall()
+        return [dict(zip(self._nombres, f)) for f in filas] if self._dict else filas
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    def close(self):
+        self._cur.close()
+
+
+class ConexionSQLite:
+    """Conexión sqlite3 con la parte de la interfaz de mysql.connector que usa la app."""
+
+    def __init__(self, cnx: sqlite3.Connection):
+        self._cnx = cnx
+
+    def cursor(self, dictionary: bool = False, buffered=None):
+        # buffered no aplica: sqlite3 lee las filas de la página según se piden
+        return CursorSQLite(self, dictionary=dictionary)
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._cnx.in_transaction
+
+    def commit(self):
+        try:
+            self._cnx.commit()
+        except sqlite3.Error as e:
+            raise _error_mysql(e) from e
+
+    def rollback(self):
+        self._cnx.rollback()
+
+    def close(self):
+        try:
+            # Recomendado al cerrar: actualiza estadísticas del planificador si hace falta
+            self._cnx.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass
+        self._cnx.close()
+
+
+class SQLiteDatabase(Database):
+    """Pool de conexiones a un archivo SQLite con la interfaz de models.Database."""
+    dialecto = "sqlite"
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("DB_SQLITE_PATH") or SQLITE_PATH
+        self.database = self.path
+        self.busy_ms = int(os.getenv("DB_SQLITE_BUSY_MS", "5000"))            # espera por el lock de escritura
+        self.cache_mb = int(os.getenv("DB_SQLITE_CACHE_MB", "32"))            # caché de páginas por conexión
+        self.mmap_mb = int(os.getenv("DB_SQLITE_MMAP_MB", "256"))             # lectura por mmap (0 = no)
+        self.stmt_cache = int(os.getenv("DB_SQLITE_STMT_CACHE", "256"))       # sentencias preparadas por conexión
+        self._iniciar_pool()
+        print(f"DB: SQLite {self.path} (pool {self.pool_size})")
+
+    def _new_connection(self):
+        carpeta = os.path.dirname(self.path)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        raw = sqlite3.connect(self.path, timeout=self.busy_ms / 1000, isolation_level=None,
+                              check_same_thread=False, cached_statements=self.stmt_cache,
+                              detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+        raw.execute("PRAGMA journal_mode=WAL")
+        raw.execute("PRAGMA synchronous=NORMAL")        # con WAL: durable salvo corte de luz
+        raw.execute("PRAGMA foreign_keys=ON")
+        raw.execute("PRAGMA temp_store=MEMORY")
+        raw.execute(f"PRAGMA cache_size=-{self.cache_mb * 1024}")
+        raw.execute(f"PRAGMA mmap_size={self.mmap_mb * 1024 * 1024}")
+        cnx = ConexionSQLite(raw)
+        cnx._pool_born = cnx._pool_used = time.monotonic()
+        return cnx
+
+    def _health_check(self, cnx):
+        # Archivo local: no hay sockets que se caigan ni conexiones que reciclar
+        return cnx
+
+    def server_connect(self):
+        """Sin servidor: una conexión propia (fuera del pool) al archivo, que se crea si no existe."""
+        return self._new_connection()
@@ -0,0 +1,275 @@
+# backend/dedup.py
+"""
+Detección de tickets casi duplicados al darlos de alta.
+
+Cada descripción se convierte en una firma MinHash de 64 valores (one
+permutation hashing sobre 4-gramas de caracteres del texto plegado, así
+aguanta acentos, mayúsculas y erratas sueltas). Las firmas de los tickets
+abiertos viven en memoria en un índice LSH de 16 bandas x 4 filas: buscar un
+ticket nuevo son 16 consultas a diccionarios más comparar unos pocos
+candidatos, sin importar cuántos tickets abiertos haya.
+
+- Se construye desde la BD al arrancar (hilo de fondo, tras el fork).
+- El mismo hilo relee cada DEDUP_SYNC_SEG segundos los tickets con
+  fecha_actualizacion posterior a la última pasada (idx_tickets_actualizacion):
+  entran los nuevos y los reabiertos de cualquier worker y salen los cerrados.
+- Los que se cierran en este worker salen en el acto con el oyente de
+  TicketModel, que además adelanta la siguiente pasada.
+- buscar() no toca la BD: sólo mira el índice en memoria.
+
+Las firmas usan hash() de Python (aleatorio por proceso): no se persisten.
+"""
+import os
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from intents import plegar
+
+ESTADOS_ABIERTOS = ('abierto', 'en_proceso')
+_MASCARA = (1 << 64) - 1
+
+
+class DedupIndex:
+    def __init__(self, db, permutaciones: int = 64, bandas: int = 16, umbral: float = 0.6,
+                 intervalo_sync: float = 5.0, shingle: int = 4, max_chars: int = 2000):
+        if permutaciones % bandas:
+            raise ValueError("permutaciones debe ser múltiplo de bandas")
+        self.db = db
+        self.k = permutaciones
+        self.bandas = bandas
+        self.filas = permutaciones // bandas
+        self.umbral = umbral
+        self.intervalo_sync = intervalo_sync
+        self.shingle = shingle
+        self.max_chars = max_chars
+        self._lock = threading.RLock()
+        self._firmas: Dict[int, Tuple[int, ...]] = {}
+        self._cubetas: List[Dict[int, Set[int]]] = [{} for _ in range(bandas)]
+        self._watermark = None
+        self._listo = False
+        self._despertar = threading.Event()
+        self._hilo = None
+        self._stats = {"consultas": 0, "duplicados": 0, "candidatos": 0, "sincronizados": 0}
+
+    @classmethod
+    def from_env(cls, db) -> "DedupIndex":
+        """DEDUP_UMBRAL (similitud Jaccard estimada), DEDUP_BANDAS, DEDUP_SYNC_SEG."""
+        return cls(db,
+                   umbral=float(os.getenv("DEDUP_UMBRAL", "0.6")),
+                   bandas=int(os.getenv("DEDUP_BANDAS", "16")),
+                   intervalo_sync=float(os.getenv("DEDUP_SYNC_SEG", "5")))
+
+    # ---------- firmas ----------
+    def firma(self, texto: Optional[str]) -> Optional[Tuple[int, ...]]:
+        """MinHash del texto, o None si es demasiado corto para compararlo."""
+        t = plegar((texto or "")[:self.max_chars])
+        n = len(t) - self.shingle + 1
+        if n < 4:
+            return None
+        k = self.k
+        minimos = [_MASCARA] * k
+        for i in range(n):
+            h = hash(t[i:i + self.shingle]) & _MASCARA
+            b, v = h % k, h // k
+            if v < minimos[b]:
+                minimos[b] = v
+        # Densificación: una cubeta vacía toma la siguiente llena (desplazada),
+        # así textos cortos siguen dando firmas comparables
+        if _MASCARA in minimos:
+            llenas = list(minimos)
+            for b in range(k):
+                if llenas[b] == _MASCARA:
+                    for j in range(1, k):
+                        v = llenas[(b + j) % k]
+                        if v != _MASCARA:
+                            minimos[b] = v + j * 0x9E3779B1
+                            break
+        return tuple(minimos)
+
+    def similitud(self, a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+        return sum(1 for x, y in zip(a, b) if x == y) / self.k
+
+    def _claves(self, firma: Tuple[int, ...]):
+        r = self.filas
+        return [hash(firma[i * r:(i + 1) * r]) for i in range(self.bandas)]
+
+    # ---------- mantenimiento ----------
+    def agregar(self, ticket_id: int, firma: Optional[Tuple[int, ...]]):
+        if firma is None:
+            return
+        with self._lock:
+            self.quitar(ticket_id)
+            self._firmas[ticket_id] = firma
+            for banda, clave in zip(self._cubetas, self._claves(firma)):
+                banda.setdefault(clave, set()).add(ticket_id)
+
+    def quitar(self, ticket_id: int):
+        with self._lock:
+            firma = self._firmas.pop(ticket_id, None)
+            if firma is None:
+                return
+            for banda, clave in zip(self._cubetas, self._claves(firma)):
+                ids = banda.get(clave)
+                if ids:
+                    ids.discard(ticket_id)
+                    if not ids:
+                        del banda[clave]
+
+    def iniciar(self):
+        """Construye el índice en un hilo de fondo (idempotente, tras el fork)."""
+        with self._lock:
+            if self._hilo:
+                return
+            self._hilo = threading.Thread(target=self._loop, name="dedup", daemon=True)
+            self._hilo.start()
+
+    def _loop(self):
+        try:
+            self._reconstruir()
+        except Exception as e:
+            print("Dedup: no se pudo construir el índice:", e)
+            return
+        while True:
+            self._despertar.wait(self.intervalo_sync)
+            self._despertar.clear()
+            try:
+                self._sincronizar()
+            except Exception as e:
+                print("Dedup: error sincronizando:", e)
+
+    def _reconstruir(self):
+        """Firma todos los tickets abiertos de la BD."""
+        t0 = time.time()
+        with self.db.connection():
+            cur = self.db.cursor()
+            # La marca se toma antes del recorrido: lo que cambie mientras tanto
+            # lo recoge la primera sincronización
+            cur.execute("SELECT NOW() AS ahora")
+            ahora = cur.fetchone()["ahora"]
+            ultimo = 0
+            while True:
+                cur.execute("""SELECT id, descripcion FROM tickets
+                               WHERE id > %s AND estado IN ('abierto','en_proceso')
+                               ORDER BY id LIMIT 2000""", (ultimo,))
+                filas = cur.fetchall()
+                for f in filas:
+                    self.agregar(f["id"], self.firma(f["descripcion"]))
+                if filas:
+                    ultimo = filas[-1]["id"]
+                if len(filas) < 2000:
+                    break
+            cur.close()
+        self._watermark = ahora
+        self._listo = True
+        print(f"Dedup: índice listo ({len(self._firmas)} tickets abiertos, {time.time() - t0:.1f}s)")
+
+    def _sincronizar(self):
+        """Aplica los tickets creados o cambiados (en cualquier worker) desde la última pasada."""
+        if self._watermark is None:
+            return
+        # Solape de 1 s: fecha_actualizacion tiene resolución de segundos
+        desde, ultimo_id = self._watermark - timedelta(seconds=1), 0
+        nuevo = self._watermark
+        with self.db.connection():
+            cur = self.db.cursor()
+            while True:
+                cur.execute("""
+                    SELECT id, descripcion, estado, fecha_actualizacion FROM tickets
+                    WHERE fecha_actualizacion > %s OR (fecha_actualizacion = %s AND id > %s)
+                    ORDER BY fecha_actualizacion, id LIMIT 1000""", (desde, desde, ultimo_id))
+                filas = cur.fetchall()
+                for f in filas:
+                    if f["estado"] in ESTADOS_ABIERTOS:
+                        self.agregar(f["id"], self.firma(f["descripcion"]))
+                    else:
+                        self.quitar(f["id"])
+                with self._lock:
+                    self._stats["sincronizados"] += len(filas)
+                if filas:
+                    nuevo = max(nuevo, filas[-1]["fecha_actualizacion"])
+                if len(filas) < 1000:
+                    break
+                desde, ultimo_id = filas[-1]["fecha_actualizacion"], filas[-1]["id"]
+            cur.close()
+        self._watermark = nuevo
+
+    def on_ticket(self, evento, ticket_ids, campos):
+        """
+        Oyente de TicketModel.suscribir: saca en el acto los tickets de este
+        worker que se cierran y adelanta la sincronización (reaperturas).
+        """
+        if evento != 'cambio' or 'estado' not in campos:
+            return
+        ids = [tid for tid in ticket_ids if tid in self._firmas]
+        if ids:
+            for tid in self._cerrados(ids):
+                self.quitar(tid)
+        self._despertar.set()
+
+    def _cerrados(self, ids: List[int]) -> Set[int]:
+        with self.db.connection():
+            cur = self.db.cursor()
+            cur.execute(f"SELECT id, estado FROM tickets WHERE id IN ({', '.join(['%s'] * len(ids))})",
+                        list(ids))
+            abiertos = {f["id"] for f in cur.fetchall() if f["estado"] in ESTADOS_ABIERTOS}
+            cur.close()
+        return set(ids) - abiertos
+
+    # ---------- consultas ----------
+    def buscar(self, texto: Optional[str] = None, firma: Optional[Tuple[int, ...]] = None,
+               excluir: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Ticket abierto más parecido por encima del umbral: {"id", "similitud"} o None."""
+        if not self._listo:
+            return None
+        if firma is None:
+            firma = self.firma(texto)
+        if firma is None:
+            return None
+        with self._lock:
+            self._stats["consultas"] += 1
+            candidatos: Set[int] = set()
+            for banda, clave in zip(self._cubetas, self._claves(firma)):
+                candidatos |= banda.get(clave, set())
+            candidatos.discard(excluir)
+            self._stats["candidatos"] += len(candidatos)
+            mejor = max(((self.similitud(firma, self._firmas[c]), c) for c in candidatos),
+                        default=None)
+            if not mejor or mejor[0] < self.umbral:
+                return None
+            self._stats["duplicados"] += 1
+        return {"id": mejor[1], "similitud": round(mejor[0], 3)}
+
+    def enlazar_lote(self, items: List[Tuple[int, Optional[Tuple[int, ...]], Optional[int]]]
+                     ) -> List[Tuple[int, int]]:
+        """
+        Alta masiva: items = [(ticket_id, firma, duplicado_de)] en orden de alta.
+        Añade cada ticket al índice y devuelve [(ticket_id, duplicado_de)] para
+        los que repiten a uno anterior del mismo lote (aún sin enlace).
+        """
+        lote: Set[int] = set()
+        enlaces = []
+        for tid, firma, duplicado_de in items:
+            if firma is None:
+                continue
+            if duplicado_de is None and lote:
+                with self._lock:
+                    candidatos = set()
+                    for banda, clave in zip(self._cubetas, self._claves(firma)):
+                        candidatos |= banda.get(clave, set()) & lote
+                    mejor = max(((self.similitud(firma, self._firmas[c]), c) for c in candidatos),
+                                default=None)
+                if mejor and mejor[0] >= self.umbral:
+                    enlaces.append((tid, mejor[1]))
+            self.agregar(tid, firma)
+            lote.add(tid)
+        return enlaces
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            st = dict(self._stats)
+            st.update(listo=self._listo, tickets=len(self._firmas),
+                      sincronizado=self._watermark.isoformat() if self._watermark else None,
+                      umbral=self.umbral, bandas=self.bandas, filas=self.filas)
+        return st
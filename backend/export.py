@@ -0,0 +1,90 @@
+# backend/export.py
+"""
+Exportación de tickets en CSV o NDJSON, en streaming.
+
+Las filas salen de TicketModel.exportar_tickets (cursor sin buffer) y aquí se
+serializan en trozos de ~64 KB: ni la consulta ni la respuesta se arman
+completas en memoria. Lo usan /api/tickets/export y la línea de comandos:
+
+    python export.py --formato csv --estado abierto,en_proceso -o abiertos.csv
+    python export.py --formato ndjson --desde 2024-01-01 > tickets.ndjson
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator
+
+FORMATOS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+COLUMNAS = ('id', 'usuario_id', 'nombre', 'telefono', 'domicilio', 'titulo', 'descripcion',
+            'categoria', 'tipo', 'prioridad', 'estado', 'asignado_admin', 'solucion_ia',
+            'notas_admin', 'duplicado_de', 'fecha_creacion')
+TROZO = 64 * 1024
+
+
+def _valor(v):
+    return v.isoformat() if isinstance(v, (datetime, date)) else v
+
+
+def filas_csv(filas: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    # BOM: Excel abre el CSV como UTF-8 y respeta acentos y eñes
+    buf = io.StringIO()
+    buf.write("\ufeff")
+    w = csv.writer(buf)
+    w.writerow(COLUMNAS)
+    for f in filas:
+        w.writerow([_valor(f.get(c)) for c in COLUMNAS])
+        if buf.tell() >= TROZO:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def filas_ndjson(filas: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    partes, tam = [], 0
+    for f in filas:
+        linea = json.dumps({c: _valor(f.get(c)) for c in COLUMNAS}, ensure_ascii=False) + "\n"
+        partes.append(linea)
+        tam += len(linea)
+        if tam >= TROZO:
+            yield "".join(partes)
+            partes, tam = [], 0
+    yield "".join(partes)
+
+
+def serializar(formato: str, filas: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    if formato not in FORMATOS:
+        raise ValueError(f"formato inválido: {formato} (usa {' o '.join(FORMATOS)})")
+    return filas_csv(filas) if formato == "csv" else filas_ndjson(filas)
+
+
+if __name__ == "__main__":
+    from models import Database, TicketModel
+
+    p = argparse.ArgumentParser(description="Exporta tickets en streaming (memoria constante).")
+    p.add_argument("--formato", choices=sorted(FORMATOS), default="csv")
+    p.add_argument("-o", "--salida", help="archivo de salida (por defecto, la salida estándar)")
+    for campo in ("estado", "prioridad", "categoria", "tipo", "usuario_id", "desde", "hasta"):
+        p.add_argument(f"--{campo}")
+    args = p.parse_args()
+    filtros = {k: v for k, v in vars(args).items() if k not in ("formato", "salida") and v}
+
+    db = Database.from_env()
+    m = TicketModel(db)
+    # newline="": el módulo csv ya escribe \r\n
+    salida = (open(args.salida, "w", encoding="utf-8", newline="") if args.salida
+              else io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", newline=""))
+    try:
+        for trozo in serializar(args.formato, m.exportar_tickets(filtros)):
+            salida.write(trozo)
+    finally:
+        salida.flush()
+        if args.salida:
+            salida.close()
+    db.close()
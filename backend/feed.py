@@ -0,0 +1,215 @@
+# backend/feed.py
+"""
+Cambios de tickets en vivo para el panel (/api/tickets/feed).
+
+Un solo hilo por proceso consulta la BD y reparte lo que encuentra a todos
+los clientes conectados (SSE o long-poll): con diez pestañas abiertas sigue
+habiendo una consulta por intervalo, no diez.
+
+- Cada FEED_INTERVALO seg. lee la marca de datos (TicketModel.marca_datos:
+  contador de escrituras + última fecha_actualizacion). Sólo si cambió lee
+  las filas modificadas desde la marca anterior menos FEED_SOLAPE seg. (por
+  idx_tickets_actualizacion; fecha_actualizacion tiene resolución de segundos
+  y una transacción larga puede confirmar filas con fecha algo anterior). Las
+  que ya se enviaron con el mismo contenido se descartan.
+- Los cambios se numeran en un búfer circular (FEED_MAX_EVENTOS). El cursor
+  del cliente es "<época>.<seq>.<unix>": en el mismo proceso se continúa por
+  seq; si viene de otro worker o de la página recién renderizada se usa la
+  fecha. Si el búfer ya no lo cubre se contesta reset (recargar la página).
+- Sin clientes durante FEED_OCIOSO seg. el hilo deja de consultar y, al
+  volver uno, retoma desde donde se quedó.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+
+def _plano(fila: Dict[str, Any]) -> Dict[str, Any]:
+    # Mismo texto que muestra la plantilla ({{ t.fecha_creacion }})
+    return {k: (str(v) if isinstance(v, datetime) else v) for k, v in fila.items() if k != "ts"}
+
+
+class ChangeFeed:
+    def __init__(self, model, intervalo: float = 1.0, solape: int = 5,
+                 max_eventos: int = 2000, max_lote: int = 500, ocioso: float = 60.0):
+        self.model = model
+        self.intervalo = intervalo
+        self.solape = solape
+        self.max_lote = max_lote
+        self.ocioso = ocioso
+        self.epoca = uuid.uuid4().hex[:8]
+        self._cond = threading.Condition()
+        self._despertar = threading.Event()
+        self._eventos: "deque[Tuple[int, int, Dict[str, Any]]]" = deque(maxlen=max_eventos)
+        self._seq = 0
+        self._seq_min = 0           # un cliente con seq >= _seq_min no se perdió nada
+        self._cubre_desde = None    # unix: el búfer tiene todo lo modificado desde aquí
+        self._watermark = None
+        self._piso = 0              # tras un desborde no se relee lo ya descartado
+        self._marca = None
+        self._firmas: Dict[int, Tuple[int, int]] = {}   # id -> (ts, hash) dentro del solape
+        self._resumen: Tuple[int, Optional[Dict[str, Any]]] = (0, None)   # (seq, stats)
+        self._ultimo_cliente = 0.0
+        self._hilo = None
+        self._stats = {"consultas": 0, "lecturas": 0, "eventos": 0, "resets": 0, "clientes": 0}
+
+    @classmethod
+    def from_env(cls, model) -> "ChangeFeed":
+        """FEED_INTERVALO, FEED_SOLAPE, FEED_MAX_EVENTOS, FEED_OCIOSO."""
+        return cls(model,
+                   intervalo=float(os.getenv("FEED_INTERVALO", "1")),
+                   solape=int(os.getenv("FEED_SOLAPE", "5")),
+                   max_eventos=int(os.getenv("FEED_MAX_EVENTOS", "2000")),
+                   ocioso=float(os.getenv("FEED_OCIOSO", "60")))
+
+    @staticmethod
+    def cursor_inicial(marca: Dict[str, Any]) -> str:
+        """Cursor para una página renderizada con esta marca de datos."""
+        ultima = marca.get("ultima")
+        return f"-.0.{int(ultima.timestamp()) if ultima else 0}"
+
+    # ---------- hilo de consulta ----------
+    def iniciar(self):
+        with self._cond:
+            if self._hilo:
+                return
+            self._hilo = threading.Thread(target=self._bucle, name="feed", daemon=True)
+            self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            if time.time() - self._ultimo_cliente > self.ocioso:
+                self._despertar.wait()
+            self._despertar.clear()
+            try:
+                with self.model.db.connection():
+                    self._consultar()
+            except Exception as e:
+                print("Feed: error consultando cambios:", e)
+            time.sleep(self.intervalo)
+
+    def _consultar(self):
+        marca = self.model.marca_datos()
+        self._stats["consultas"] += 1
+        clave = (marca["version"], marca["ultima"])
+        if clave == self._marca:
+            return
+        ultima = int(marca["ultima"].timestamp()) if marca["ultima"] else 0
+        if self._watermark is None:
+            # Arranque: no se reenvía la historia, sólo la ventana de solape
+            self._watermark = ultima
+            with self._cond:
+                self._cubre_desde = ultima - self.solape
+        desde = max(self._watermark - self.solape, self._piso)
+        filas = self.model.cambios_desde(desde, self.max_lote + 1)
+        self._stats["lecturas"] += 1
+        resumen = self.model.stats_resumen()
+        if len(filas) > self.max_lote:
+            self._desbordar(ultima, resumen)
+        else:
+            self._publicar(filas, resumen)
+            self._watermark = max([self._watermark] + [int(f["ts"]) for f in filas])
+        self._marca = clave
+        # Sólo hace falta recordar lo que aún puede volver a leerse por el solape
+        limite = self._watermark - self.solape
+        self._firmas = {i: f for i, f in self._firmas.items() if f[0] >= limite}
+
+    def _publicar(self, filas, resumen):
+        nuevos = []
+        for f in filas:
+            ticket = _plano(f)
+            firma = (int(f["ts"]), hash(json.dumps(ticket, sort_keys=True, default=str)))
+            if self._firmas.get(f["id"]) == firma:
+                continue
+            self._firmas[f["id"]] = firma
+            nuevos.append((int(f["ts"]), ticket))
+        with self._cond:
+            for ts, ticket in nuevos:
+                self._seq += 1
+                if len(self._eventos) == self._eventos.maxlen:
+                    self._seq_min = self._eventos[0][0]
+                self._eventos.append((self._seq, ts, ticket))
+            if nuevos or resumen != self._resumen[1]:
+                self._resumen = (self._seq, resumen)
+            self._stats["eventos"] += len(nuevos)
+            self._cond.notify_all()
+
+    def _desbordar(self, ultima: int, resumen):
+        """Demasiados cambios de golpe (p. ej. una importación): los clientes recargan."""
+        with self._cond:
+            self._eventos.clear()
+            self._seq += 1
+            self._seq_min = self._seq
+            self._cubre_desde = ultima
+            self._resumen = (self._seq, resumen)
+            self._stats["resets"] += 1
+            self._cond.notify_all()
+        self._watermark = self._piso = ultima + 1
+        self._firmas.clear()
+
+    # ---------- clientes ----------
+    def _parsear(self, cursor: Optional[str]) -> Tuple[str, int, Optional[int]]:
+        try:
+            epoca, seq, ts = (cursor or "").split(".")
+            return epoca, int(seq), int(ts)
+        except ValueError:
+            return "", 0, None
+
+    def _pendientes(self, epoca: str, seq: int, ts: Optional[int]) -> Optional[Dict[str, Any]]:
+        """Lo que le falta a ese cursor; {"reset": True} si el búfer ya no lo cubre."""
+        if epoca == self.epoca and seq >= self._seq_min:
+            nuevos = [e for e in self._eventos if e[0] > seq]
+        elif self._cubre_desde is None:
+            return None                         # aún no hubo primera consulta
+        elif ts is not None and ts >= self._cubre_desde:
+            nuevos = [e for e in self._eventos if e[1] >= ts - self.solape]
+            seq = -1
+        else:
+            return {"reset": True}
+        # Un ticket cambiado varias veces se envía una sola, en su último estado
+        ultimos = {e[2]["id"]: e for e in nuevos}
+        nuevos = [e for e in nuevos if ultimos[e[2]["id"]] is e]
+        res_seq, resumen = self._resumen
+        return {"reset": False,
+                "tickets": [e[2] for e in nuevos],
+                "stats": resumen if res_seq > seq else None,
+                "cursor": f"{self.epoca}.{self._seq}.{max([ts or 0] + [e[1] for e in nuevos])}"}
+
+    def esperar(self, cursor: Optional[str], timeout: float = 25.0) -> Dict[str, Any]:
+        """
+        Bloquea hasta que haya cambios para `cursor` o pase `timeout`.
+        Devuelve {"reset", "tickets", "stats", "cursor"}; el cursor devuelto es
+        el que hay que mandar en la siguiente llamada.
+        """
+        self._ultimo_cliente = time.time()
+        self.iniciar()
+        self._despertar.set()
+        epoca, seq, ts = self._parsear(cursor)
+        fin = time.monotonic() + timeout
+        with self._cond:
+            self._stats["clientes"] += 1
+            try:
+                while True:
+                    res = self._pendientes(epoca, seq, ts)
+                    if res and (res["reset"] or res["tickets"] or res["stats"]):
+                        return res
+                    restante = fin - time.monotonic()
+                    if restante <= 0:
+                        return res or {"reset": False, "tickets": [], "stats": None,
+                                       "cursor": cursor or ""}
+                    self._cond.wait(min(restante, self.intervalo * 5))
+                    self._ultimo_cliente = time.time()
+            finally:
+                self._stats["clientes"] -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            st = dict(self._stats)
+            st.update(epoca=self.epoca, seq=self._seq, en_bufer=len(self._eventos),
+                      watermark=self._watermark, activo=time.time() - self._ultimo_cliente <= self.ocioso)
+        return st
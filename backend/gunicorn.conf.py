@@ -0,0 +1,61 @@
+# backend/gunicorn.conf.py
+"""
+Servidor de producción:
+
+    cd backend
+    gunicorn -c gunicorn.conf.py
+
+Workers pre-fork con hilos (gthread). El maestro no importa la app: ejecuta
+bootstrap.py una vez (migraciones + admin) y cada worker importa wsgi.py tras
+el fork, así los pools MySQL, los SQLite compartidos y los hilos de fondo son
+suyos y ninguno hereda sockets del maestro.
+
+Recarga sin cortar peticiones: kill -HUP <pid del maestro> levanta workers
+nuevos con el código actual y deja que los viejos terminen lo que tienen en
+curso (GUNICORN_GRACEFUL seg.). El bootstrap no se repite en la recarga.
+"""
+import multiprocessing
+import os
+import sys
+
+wsgi_app = "wsgi:app"
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", str(min(multiprocessing.cpu_count() * 2 + 1, 8))))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL", "30"))
+keepalive = 5
+# Reciclar workers de vez en cuando acota fugas de memoria; el jitter evita que caigan a la vez
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+# Nada de preload: la app se importa en cada worker, después del fork
+preload_app = False
+accesslog = os.getenv("GUNICORN_ACCESSLOG") or None
+errorlog = "-"
+
+
+def on_starting(server):
+    # Una vez por despliegue, en el maestro y antes de crear workers
+    import metrics
+    metrics.limpiar_directorio()
+    if os.getenv("DB_AUTO_MIGRATE", "1") == "1":
+        import bootstrap
+        bootstrap.bootstrap()
+
+
+def worker_exit(server, worker):
+    # Cierra las conexiones ociosas del pool del worker que sale
+    routers = sys.modules.get("routers")
+    if routers is not None:
+        routers.db.close()
+    # Último volcado de sus métricas (METRICS_DIR) antes de que child_exit lo recoja
+    metrics = sys.modules.get("metrics")
+    if metrics is not None:
+        metrics.guardar()
+
+
+def child_exit(server, worker):
+    # En el maestro: los contadores del worker que salió pasan a muertos.json
+    import metrics
+    metrics.proceso_terminado(worker.pid)
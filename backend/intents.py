@@ -0,0 +1,195 @@
+# backend/intents.py
+"""
+Motor de intenciones del chat (respuestas predefinidas sin IA).
+
+Las intenciones —frases gatillo, respuesta y si piden ticket— se cargan de un
+JSON (INTENTS_PATH, por defecto backend/intents.json) y se compilan una sola
+vez en un autómata Aho–Corasick. Cada mensaje se recorre en una única pasada
+lineal, da igual que haya ocho frases o varios miles.
+
+Antes de buscar, texto y frases se "pliegan" igual: minúsculas, sin acentos,
+signos a espacio y letras repetidas colapsadas ("leeentooo" == "lento"). Las
+frases casan por palabra completa; una frase terminada en * casa como prefijo
+("configur*" -> configurar, configuración...).
+
+    python intents.py "mi pc va muy lentaaa"   # qué intenciones detecta
+    python intents.py --bench                  # micro-benchmark vs. búsqueda ingenua
+"""
+import json
+import os
+import re
+import sys
+import unicodedata
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+INTENTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intents.json")
+
+_NO_ALNUM = re.compile(r"[^a-z0-9]+")
+_REPETIDAS = re.compile(r"(.)\1+")
+
+
+def plegar(texto: str) -> str:
+    texto = (texto or "").lower()
+    if not texto.isascii():
+        # NFKD separa las tildes (á -> a + ´, ñ -> n + ~) y el ascii las descarta
+        texto = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode()
+    texto = _NO_ALNUM.sub(" ", texto).strip()
+    return _REPETIDAS.sub(r"\1", texto)
+
+
+class AhoCorasick:
+    """Autómata sobre cadenas ya plegadas. buscar() devuelve (fin, id) de cada aparición."""
+
+    def __init__(self, patrones: List[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        for pid, patron in enumerate(patrones):
+            estado = 0
+            for c in patron:
+                sig = self._goto[estado].get(c)
+                if sig is None:
+                    sig = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[estado][c] = sig
+                estado = sig
+            self._out[estado].append(pid)
+        # Enlaces de fallo por anchura; las salidas se heredan del estado de fallo
+        cola = deque(self._goto[0].values())
+        while cola:
+            estado = cola.popleft()
+            for c, sig in self._goto[estado].items():
+                cola.append(sig)
+                f = self._fail[estado]
+                while f and c not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[sig] = self._goto[f].get(c, 0)
+                self._out[sig] = self._out[sig] + self._out[self._fail[sig]]
+
+    def buscar(self, texto: str) -> Iterator[Tuple[int, int]]:
+        goto, fail, out = self._goto, self._fail, self._out
+        estado = 0
+        for i, c in enumerate(texto):
+            sig = goto[estado].get(c)
+            while sig is None and estado:
+                estado = fail[estado]
+                sig = goto[estado].get(c)
+            estado = sig or 0
+            if out[estado]:
+                for pid in out[estado]:
+                    yield i, pid
+
+
+class IntentEngine:
+    def __init__(self, config: Dict[str, Any]):
+        defecto = config.get("default") or {}
+        self.respuesta_defecto = defecto.get("answer") or ""
+        self.intents: List[Dict[str, Any]] = []
+        patrones: List[str] = []
+        self._frases: List[Tuple[int, int, bool]] = []   # (intent, largo, prefijo)
+        for n, it in enumerate(config.get("intents") or []):
+            self.intents.append({
+                "nombre": it["nombre"],
+                "answer": it.get("answer"),
+                "ticket_required": bool(it.get("ticket_required")),
+                "prioridad": int(it.get("prioridad", 0)),
+            })
+            for frase in it.get("frases") or []:
+                prefijo = frase.rstrip().endswith("*")
+                p = plegar(frase.rstrip().rstrip("*"))
+                if p:
+                    patrones.append(p)
+                    self._frases.append((n, len(p), prefijo))
+        self._ac = AhoCorasick(patrones)
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> "IntentEngine":
+        with open(path or INTENTS_PATH, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def from_env(cls) -> "IntentEngine":
+        """INTENTS_PATH: JSON con {"default": {...}, "intents": [...]}."""
+        return cls.from_file(os.getenv("INTENTS_PATH") or INTENTS_PATH)
+
+    def detectar(self, texto: str) -> List[Dict[str, Any]]:
+        """Intenciones presentes, de mayor prioridad a menor (empate: la que aparece antes)."""
+        t = plegar(texto)
+        vistos: Dict[int, int] = {}
+        for fin, pid in self._ac.buscar(t):
+            n, largo, prefijo = self._frases[pid]
+            ini = fin - largo + 1
+            # Límite de palabra: el autómata encuentra subcadenas ("disco" en "discord")
+            if ini > 0 and t[ini - 1] != " ":
+                continue
+            if not prefijo and fin + 1 < len(t) and t[fin + 1] != " ":
+                continue
+            if n not in vistos or ini < vistos[n]:
+                vistos[n] = ini
+        orden = sorted(vistos, key=lambda n: (-self.intents[n]["prioridad"], vistos[n]))
+        return [self.intents[n] for n in orden]
+
+    def responder(self, texto: str) -> Tuple[str, bool, Optional[str]]:
+        """(answer, ticket_required, nombre de la intención que da la respuesta)."""
+        encontradas = self.detectar(texto)
+        ticket_required = any(it["ticket_required"] for it in encontradas)
+        for it in encontradas:
+            if it["answer"]:
+                return it["answer"], ticket_required, it["nombre"]
+        return self.respuesta_defecto, ticket_required, None
+
+
+def _bench(n_frases: int = 5000, n_mensajes: int = 2000):
+    import random
+    import time
+    rnd = random.Random(7)
+    letras = "abcdefghijklmnopqrstuvwxyz"
+    palabra = lambda: "".join(rnd.choice(letras) for _ in range(rnd.randint(4, 9)))
+    base = IntentEngine.from_file()
+    with open(INTENTS_PATH, encoding="utf-8") as f:
+        config = json.load(f)
+    config["intents"].append({"nombre": "relleno", "frases": [
+        f"{palabra()} {palabra()}" for _ in range(n_frases)]})
+    motor = IntentEngine(config)
+    frases = [f for it in config["intents"] for f in it.get("frases", [])]
+    mensajes = [" ".join(palabra() for _ in range(rnd.randint(5, 40))) + " mi pc va lenta"
+                for _ in range(n_mensajes)]
+
+    # Lo que hacía /chat, pero buscando todas las frases (hay que saber qué intenciones aparecen)
+    plegadas = [plegar(f.rstrip("*")) for f in frases]
+    t0 = time.perf_counter()
+    for m in mensajes:
+        t = plegar(m)
+        [f for f in plegadas if f in t]
+    ingenua = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for m in mensajes:
+        motor.responder(m)
+    automata = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for m in mensajes:
+        base.responder(m)
+    solo_base = time.perf_counter() - t0
+
+    print(f"{len(frases)} frases, {n_mensajes} mensajes")
+    print(f"  búsqueda ingenua : {ingenua / n_mensajes * 1e6:8.1f} µs/mensaje")
+    print(f"  Aho–Corasick     : {automata / n_mensajes * 1e6:8.1f} µs/mensaje")
+    print(f"  (sólo intents.json, {len(base._frases)} frases: "
+          f"{solo_base / n_mensajes * 1e6:.1f} µs/mensaje)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench":
+        _bench()
+    else:
+        motor = IntentEngine.from_env()
+        texto = " ".join(sys.argv[1:])
+        print("plegado:", plegar(texto))
+        for it in motor.detectar(texto):
+            print(f"  {it['nombre']} (prioridad {it['prioridad']}, ticket={it['ticket_required']})")
+        print(motor.responder(texto)[0])
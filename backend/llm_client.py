@@ -0,0 +1,388 @@
+# backend/llm_client.py
+"""
+Capa común de llamadas al modelo (OpenAI) bajo AIAgent: que una API lenta o
+caída no acapare los hilos de los workers.
+
+Cada llamada pasa, en orden, por:
+
+1. Circuito: tras OPENAI_CB_FALLOS fallos seguidos del proveedor (timeout,
+   conexión, 429, 5xx) se abre durante OPENAI_CB_SEG seg. y las llamadas
+   fallan al instante con CircuitoAbierto; quien llama usa su respuesta de
+   respaldo. Pasado ese tiempo deja pasar una llamada de prueba: si sale bien
+   se cierra, si no vuelve a abrirse.
+2. Cuota: cubetas de tokens con OPENAI_RPM peticiones y OPENAI_TPM tokens por
+   minuto (0 = sin límite). Los tokens se cuentan como los cuenta OpenAI para
+   su límite: prompt estimado + max_tokens.
+3. Concurrencia: como mucho OPENAI_MAX_CONCURRENTES llamadas en curso (un
+   stream ocupa su hueco hasta terminar).
+   Si 2 o 3 harían esperar más de OPENAI_ESPERA_MAX seg. se lanza IASaturada.
+4. Timeouts: OPENAI_TIMEOUT por intento (OPENAI_TIMEOUT_CONEXION para
+   conectar) y OPENAI_PLAZO para la llamada entera, reintentos incluidos.
+5. Reintentos: hasta OPENAI_REINTENTOS ante errores transitorios, con espera
+   exponencial y jitter completo (o el Retry-After de un 429), sin pasar del
+   plazo. Un stream sólo se reintenta si falla antes de empezar a llegar.
+
+completar() es la versión con hilos y acompletar() la asyncio (asgi.py);
+comparten circuito y cuota. Cuota y concurrencia son por proceso: con varios
+workers, OPENAI_RPM / OPENAI_TPM son la parte de la cuota de cada uno.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from typing import Any, Dict, Optional
+
+import httpx
+import openai
+from openai import AsyncOpenAI, OpenAI  # type: ignore
+
+import metrics
+from chat_sessions import estimar_tokens
+
+
+class IANoDisponible(Exception):
+    """La llamada no se hizo: quien llama responde con su texto de respaldo."""
+
+
+class CircuitoAbierto(IANoDisponible):
+    pass
+
+
+class IASaturada(IANoDisponible):
+    pass
+
+
+def _sano(e: Exception) -> Optional[bool]:
+    """¿Qué dice el error del proveedor? False: falla (transitorio), True: contestó, None: no es suyo."""
+    if isinstance(e, openai.APIConnectionError):      # incluye APITimeoutError
+        return False
+    if isinstance(e, openai.APIStatusError):
+        return not (e.status_code in (408, 409, 429) or e.status_code >= 500)
+    return None
+
+
+class CubetaTokens:
+    """`tasa` tokens por segundo, acumulables hasta `capacidad`. Sin tasa no limita."""
+
+    def __init__(self, tasa: float, capacidad: float):
+        self.tasa = tasa
+        self.capacidad = max(capacidad, 1.0)
+        self._tokens = self.capacidad
+        self._t = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reservar(self, n: float, espera_max: float) -> Optional[float]:
+        """
+        Toma n tokens y devuelve los seg. que hay que esperar antes de usarlos
+        (0 si ya estaban), o None sin tomar nada si serían más de espera_max.
+        El saldo puede quedar en negativo: los siguientes esperan detrás.
+        """
+        if not self.tasa:
+            return 0.0
+        n = min(n, self.capacidad)
+        with self._lock:
+            ahora = time.monotonic()
+            self._tokens = min(self.capacidad, self._tokens + (ahora - self._t) * self.tasa)
+            self._t = ahora
+            espera = max(0.0, (n - self._tokens) / self.tasa)
+            if espera > espera_max:
+                return None
+            self._tokens -= n
+            return espera
+
+    def devolver(self, n: float):
+        if self.tasa:
+            with self._lock:
+                self._tokens = min(self.capacidad, self._tokens + min(n, self.capacidad))
+
+
+class Circuito:
+    """Cortacircuitos cerrado -> abierto -> semiabierto (una llamada de prueba) -> cerrado."""
+
+    def __init__(self, fallos: int = 5, enfriamiento: float = 30.0):
+        self.fallos = fallos
+        self.enfriamiento = enfriamiento
+        self._seguidos = 0
+        self._abierto_hasta = 0.0
+        self._prueba = False
+        self._aperturas = 0
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self) -> str:
+        if not self._abierto_hasta:
+            return "cerrado"
+        return "abierto" if time.monotonic() < self._abierto_hasta else "semiabierto"
+
+    def disponible(self) -> bool:
+        """Consulta sin efectos: ¿se intentaría ahora una llamada?"""
+        estado = self.estado
+        return estado == "cerrado" or (estado == "semiabierto" and not self._prueba)
+
+    def permitir(self) -> bool:
+        """¿Puede salir esta llamada? En semiabierto sólo la primera (la de prueba)."""
+        with self._lock:
+            if not self._abierto_hasta:
+                return True
+            if time.monotonic() < self._abierto_hasta or self._prueba:
+                return False
+            self._prueba = True
+            return True
+
+    def registrar(self, sano: Optional[bool]):
+        """Resultado de una llamada permitida (sano=None: error nuestro, no cuenta)."""
+        with self._lock:
+            if sano is None:
+                self._prueba = False
+            elif sano:
+                self._seguidos, self._abierto_hasta, self._prueba = 0, 0.0, False
+            else:
+                self._seguidos += 1
+                if self._prueba or self._seguidos >= self.fallos:
+                    if not self._abierto_hasta:
+                        self._aperturas += 1
+                        print(f"IA: circuito abierto tras {self._seguidos} fallos seguidos "
+                              f"({self.enfriamiento:.0f}s sin llamar al modelo)")
+                    self._abierto_hasta = time.monotonic() + self.enfriamiento
+                    self._prueba = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"estado": self.estado, "fallos_seguidos": self._seguidos, "aperturas": self._aperturas}
+
+
+class LLMClient:
+    def __init__(self, api_key: Optional[str], timeout: float = 30.0, timeout_conexion: float = 5.0,
+                 plazo: float = 45.0, reintentos: int = 2, espera_base: float = 0.5,
+                 espera_tope: float = 8.0, max_concurrentes: int = 16, espera_max: float = 2.0,
+                 rpm: float = 0, tpm: float = 0, cb_fallos: int = 5, cb_seg: float = 30.0):
+        # Los reintentos son de esta capa: el cliente de openai no reintenta por su cuenta
+        t = httpx.Timeout(timeout, connect=timeout_conexion)
+        self.client = OpenAI(api_key=api_key, timeout=t, max_retries=0) if api_key else None
+        self.aclient = AsyncOpenAI(api_key=api_key, timeout=t, max_retries=0) if api_key else None
+        self.timeout = timeout
+        self.timeout_conexion = timeout_conexion
+        self.plazo = plazo
+        self.reintentos = reintentos
+        self.espera_base = espera_base
+        self.espera_tope = espera_tope
+        self.max_concurrentes = max_concurrentes
+        self.espera_max = espera_max
+        # Ráfaga de hasta 10 s de cuota: OpenAI no deja gastar el minuto entero de golpe
+        self.rpm = CubetaTokens(rpm / 60, rpm / 6)
+        self.tpm = CubetaTokens(tpm / 60, tpm / 6)
+        self.circuito = Circuito(cb_fallos, cb_seg)
+        self._sem = threading.BoundedSemaphore(max_concurrentes)
+        self._asem: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+        self._stats = {"llamadas": 0, "en_curso": 0, "reintentos": 0, "errores": 0,
+                       "rechazos_circuito": 0, "rechazos_saturado": 0}
+
+    @classmethod
+    def from_env(cls, api_key: Optional[str]) -> "LLMClient":
+        return cls(api_key,
+                   timeout=float(os.getenv("OPENAI_TIMEOUT", "30")),
+                   timeout_conexion=float(os.getenv("OPENAI_TIMEOUT_CONEXION", "5")),
+                   plazo=float(os.getenv("OPENAI_PLAZO", "45")),
+                   reintentos=int(os.getenv("OPENAI_REINTENTOS", "2")),
+                   max_concurrentes=int(os.getenv("OPENAI_MAX_CONCURRENTES", "16")),
+                   espera_max=float(os.getenv("OPENAI_ESPERA_MAX", "2")),
+                   rpm=float(os.getenv("OPENAI_RPM", "0")),
+                   tpm=float(os.getenv("OPENAI_TPM", "0")),
+                   cb_fallos=int(os.getenv("OPENAI_CB_FALLOS", "5")),
+                   cb_seg=float(os.getenv("OPENAI_CB_SEG", "30")))
+
+    def disponible(self) -> bool:
+        """False con el circuito abierto (el triage no reclama tickets mientras tanto)."""
+        return self.client is not None and self.circuito.disponible()
+
+    def _contar(self, clave: str, n: int = 1):
+        with self._lock:
+            self._stats[clave] += n
+
+    def _rechazo(self, operacion: str, motivo: str) -> IANoDisponible:
+        self._contar(f"rechazos_{motivo}")
+        metrics.ia_rechazos.inc(operacion, motivo)
+        if motivo == "circuito":
+            return CircuitoAbierto("IA no disponible (circuito abierto)")
+        return IASaturada("IA saturada (cuota o llamadas en curso)")
+
+    def _cuota(self, operacion: str, kwargs: Dict[str, Any], espera_max: float) -> float:
+        """Reserva petición + tokens; seg. a esperar antes de llamar."""
+        tokens = sum(estimar_tokens(m.get("content")) for m in kwargs.get("messages") or ()) \
+            + (kwargs.get("max_tokens") or 0)
+        e_rpm = self.rpm.reservar(1, espera_max)
+        e_tpm = self.tpm.reservar(tokens, espera_max) if e_rpm is not None else None
+        if e_tpm is None:
+            if e_rpm is not None:
+                self.rpm.devolver(1)
+            raise self._rechazo(operacion, "saturado")
+        return max(e_rpm, e_tpm)
+
+    def _espera_reintento(self, e: Exception, intento: int, fin: float) -> Optional[float]:
+        """Seg. antes del siguiente intento, o None si no se reintenta."""
+        if _sano(e) is not False or intento >= self.reintentos:
+            return None
+        espera = random.uniform(0, min(self.espera_tope, self.espera_base * 2 ** intento))
+        respuesta = getattr(e, "response", None)
+        if respuesta is not None and respuesta.headers.get("retry-after"):
+            try:
+                espera = min(self.espera_tope, float(respuesta.headers["retry-after"]))
+            except ValueError:
+                pass
+        return espera if time.monotonic() + espera < fin else None
+
+    def _timeout(self, fin: float) -> httpx.Timeout:
+        # El último intento no pasa del plazo de la llamada
+        return httpx.Timeout(max(0.1, min(self.timeout, fin - time.monotonic())),
+                             connect=self.timeout_conexion)
+
+    def _error(self, operacion: str, t0: float):
+        self._contar("errores")
+        metrics.registrar_ia(operacion, time.perf_counter() - t0, "error")
+
+    # ---------- hilos ----------
+    def completar(self, operacion: str, **kwargs):
+        """chat.completions.create con los límites de arriba (stream=True: devuelve un generador)."""
+        if self.client is None:
+            raise RuntimeError("OPENAI_API_KEY no configurada")
+        t0 = time.perf_counter()
+        fin = time.monotonic() + self.plazo
+        if not self.circuito.disponible():
+            raise self._rechazo(operacion, "circuito")
+        espera = self._cuota(operacion, kwargs, self.espera_max)
+        if espera:
+            time.sleep(espera)
+        if not self._sem.acquire(timeout=self.espera_max):
+            raise self._rechazo(operacion, "saturado")
+        self._contar("en_curso")
+        liberar = True
+        try:
+            intento = 0
+            while True:
+                if not self.circuito.permitir():
+                    raise self._rechazo(operacion, "circuito")
+                self._contar("llamadas")
+                try:
+                    response = self.client.chat.completions.create(
+                        timeout=self._timeout(fin), **kwargs)
+                    break
+                except Exception as e:
+                    self.circuito.registrar(_sano(e))
+                    espera = self._espera_reintento(e, intento, fin)
+                    if espera is None:
+                        self._error(operacion, t0)
+                        raise
+                # Un reintento también gasta cuota
+                espera = max(espera, self._cuota(operacion, kwargs, max(0.0, fin - time.monotonic())))
+                intento += 1
+                self._contar("reintentos")
+                metrics.ia_reintentos.inc(operacion)
+                time.sleep(espera)
+            self.circuito.registrar(True)
+            if kwargs.get("stream"):
+                liberar = False
+                return self._stream(operacion, response, t0)
+            metrics.registrar_ia(operacion, time.perf_counter() - t0, "ok", getattr(response, "usage", None))
+            return response
+        finally:
+            if liberar:
+                self._liberar()
+
+    def _liberar(self):
+        self._contar("en_curso", -1)
+        self._sem.release()
+
+    def _stream(self, operacion, response, t0):
+        # El hueco se devuelve al acabar el stream, o al recolectarlo si nadie lo leyó
+        fin = []
+        gen = self._leer_stream(operacion, response, t0, fin)
+        fin.append(weakref.finalize(gen, self._liberar))
+        return gen
+
+    def _leer_stream(self, operacion, response, t0, fin):
+        try:
+            yield from metrics.medir_stream(operacion, response, t0)
+        finally:
+            fin[0]()
+
+    # ---------- asyncio ----------
+    def _semaforo(self) -> asyncio.Semaphore:
+        if self._asem is None:
+            self._asem = asyncio.Semaphore(self.max_concurrentes)
+        return self._asem
+
+    async def acompletar(self, operacion: str, **kwargs):
+        """completar() sin bloquear el bucle de eventos (stream=True: generador asíncrono)."""
+        if self.aclient is None:
+            raise RuntimeError("OPENAI_API_KEY no configurada")
+        t0 = time.perf_counter()
+        fin = time.monotonic() + self.plazo
+        if not self.circuito.disponible():
+            raise self._rechazo(operacion, "circuito")
+        espera = self._cuota(operacion, kwargs, self.espera_max)
+        if espera:
+            await asyncio.sleep(espera)
+        sem = self._semaforo()
+        try:
+            await asyncio.wait_for(sem.acquire(), self.espera_max)
+        except asyncio.TimeoutError:
+            raise self._rechazo(operacion, "saturado")
+        self._contar("en_curso")
+        liberar = True
+        try:
+            intento = 0
+            while True:
+                if not self.circuito.permitir():
+                    raise self._rechazo(operacion, "circuito")
+                self._contar("llamadas")
+                try:
+                    response = await self.aclient.chat.completions.create(
+                        timeout=self._timeout(fin), **kwargs)
+                    break
+                except Exception as e:
+                    self.circuito.registrar(_sano(e))
+                    espera = self._espera_reintento(e, intento, fin)
+                    if espera is None:
+                        self._error(operacion, t0)
+                        raise
+                espera = max(espera, self._cuota(operacion, kwargs, max(0.0, fin - time.monotonic())))
+                intento += 1
+                self._contar("reintentos")
+                metrics.ia_reintentos.inc(operacion)
+                await asyncio.sleep(espera)
+            self.circuito.registrar(True)
+            if kwargs.get("stream"):
+                liberar = False
+                return self._astream(operacion, response, t0, sem)
+            metrics.registrar_ia(operacion, time.perf_counter() - t0, "ok", getattr(response, "usage", None))
+            return response
+        finally:
+            if liberar:
+                self._aliberar(sem)
+
+    def _aliberar(self, sem: asyncio.Semaphore):
+        self._contar("en_curso", -1)
+        sem.release()
+
+    def _astream(self, operacion, response, t0, sem):
+        fin = []
+        gen = self._aleer_stream(operacion, response, t0, fin)
+        fin.append(weakref.finalize(gen, self._aliberar, sem))
+        return gen
+
+    async def _aleer_stream(self, operacion, response, t0, fin):
+        try:
+            async for chunk in metrics.amedir_stream(operacion, response, t0):
+                yield chunk
+        finally:
+            fin[0]()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            st = dict(self._stats)
+        st.update(circuito=self.circuito.stats(), max_concurrentes=self.max_concurrentes,
+                  rpm=round(self.rpm.tasa * 60), tpm=round(self.tpm.tasa * 60),
+                  timeout=self.timeout, plazo=self.plazo, reintentos_max=self.reintentos)
+        return st
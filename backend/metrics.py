@@ -0,0 +1,491 @@
+# backend/metrics.py
+"""
+Métricas del proceso en formato de texto de Prometheus (/metrics).
+
+- SQL: cada sentencia que pasa por Database.cursor() (CursorMedido en
+  models.py) suma tiempo y filas a su forma normalizada (literales y listas
+  IN/VALUES colapsados), así `WHERE id=5` y `WHERE id=7` son la misma serie.
+  Las que superan DB_SLOW_MS se imprimen en el log; /health/sql muestra las
+  que más tiempo acumulan.
+- HTTP: latencia por regla de ruta (no por URL, para acotar las series),
+  método y código, y peticiones en curso por ruta (instrumentar(app)).
+- IA: latencia, errores, primer fragmento del streaming, tokens, reintentos
+  y llamadas rechazadas por operación (AIAgent, llm_client.py).
+
+Sin dependencias: contadores e histogramas con un lock cada uno, sin
+asignaciones en el camino caliente más allá de la tupla de etiquetas.
+
+Varios workers (gunicorn, uvicorn --workers): con METRICS_DIR cada proceso
+vuelca sus valores a METRICS_DIR/<pid>.json cada METRICS_VOLCADO_SEG seg. (y
+al salir), y /metrics, lo atienda el worker que lo atienda, suma los de
+todos, como el modo multiproceso de prometheus_client. Contadores e
+histogramas de los workers que ya terminaron se conservan (gunicorn los
+junta en muertos.json en child_exit); sus medidores (en curso, pool) no
+cuentan. Sin METRICS_DIR los valores son los del proceso que contesta.
+"""
+import asyncio
+import bisect
+import glob
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+SLOW_MS = float(os.getenv("DB_SLOW_MS", "200"))
+MAX_SQL = int(os.getenv("METRICS_MAX_SQL", "200"))   # formas de SQL distintas antes de agrupar en "otras"
+DIRECTORIO = os.getenv("METRICS_DIR") or None
+VOLCADO_SEG = float(os.getenv("METRICS_VOLCADO_SEG", "5"))
+
+SEG_DB = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+SEG_HTTP = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SEG_IA = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+
+
+def _escapar(v: Any) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _etiquetas(nombres: Sequence[str], valores: Sequence[Any], extra: str = "") -> str:
+    partes = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _num(v: float) -> str:
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, tuple(etiquetas)
+        self._valores: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *valores, n: float = 1):
+        with self._lock:
+            self._valores[valores] = self._valores.get(valores, 0) + n
+
+    def lineas(self) -> Iterable[str]:
+        with self._lock:
+            items = list(self._valores.items())
+        for vals, v in items:
+            yield f"{self.nombre}{_etiquetas(self.etiquetas, vals)} {_num(v)}"
+
+    def vacio(self) -> "Contador":
+        return type(self)(self.nombre, self.ayuda, self.etiquetas)
+
+    def series(self) -> List[List[Any]]:
+        with self._lock:
+            return [[list(vals), v] for vals, v in self._valores.items()]
+
+    def sumar(self, series: List[List[Any]]):
+        for vals, v in series:
+            self.inc(*vals, n=v)
+
+
+class Medidor(Contador):
+    """Valor que sube y baja (peticiones en curso)."""
+    tipo = "gauge"
+
+    def dec(self, *valores, n: float = 1):
+        self.inc(*valores, n=-n)
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                 limites: Sequence[float] = SEG_HTTP):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, tuple(etiquetas)
+        self.limites = tuple(limites)
+        self._le = [f'le="{lim}"' for lim in self.limites] + ['le="+Inf"']
+        self._series: Dict[Tuple, List] = {}    # etiquetas -> [cubetas..., suma, cuenta]
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, *valores):
+        i = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            s = self._series.get(valores)
+            if s is None:
+                s = self._series[valores] = [0] * (len(self.limites) + 2)
+            if i < len(self.limites):
+                s[i] += 1
+            s[-2] += valor
+            s[-1] += 1
+
+    def lineas(self) -> Iterable[str]:
+        with self._lock:
+            items = [(k, list(s)) for k, s in self._series.items()]
+        n = len(self.limites)
+        for vals, s in items:
+            acumulado = 0
+            for le, c in zip(self._le, s[:n]):
+                acumulado += c
+                yield f"{self.nombre}_bucket{_etiquetas(self.etiquetas, vals, le)} {acumulado}"
+            # +Inf es la cuenta total: lo que pasó del último límite no tiene cubeta propia
+            yield f"{self.nombre}_bucket{_etiquetas(self.etiquetas, vals, self._le[-1])} {s[-1]}"
+            yield f"{self.nombre}_sum{_etiquetas(self.etiquetas, vals)} {_num(round(s[-2], 6))}"
+            yield f"{self.nombre}_count{_etiquetas(self.etiquetas, vals)} {s[-1]}"
+
+    def vacio(self) -> "Histograma":
+        return Histograma(self.nombre, self.ayuda, self.etiquetas, self.limites)
+
+    def series(self) -> List[List[Any]]:
+        with self._lock:
+            return [[list(vals), list(s)] for vals, s in self._series.items()]
+
+    def sumar(self, series: List[List[Any]]):
+        with self._lock:
+            for vals, otra in series:
+                if len(otra) != len(self.limites) + 2:
+                    continue    # volcado con otros límites (código anterior): se ignora
+                s = self._series.setdefault(tuple(vals), [0] * len(otra))
+                for i, v in enumerate(otra):
+                    s[i] += v
+
+
+class Registro:
+    def __init__(self):
+        self._metricas: List[Any] = []
+        self._recolectores: List[Callable[[], Iterable[Tuple[str, str, str, Dict[str, Any], float]]]] = []
+
+    def _agregar(self, m):
+        self._metricas.append(m)
+        return m
+
+    def contador(self, nombre, ayuda, etiquetas=()) -> Contador:
+        return self._agregar(Contador(nombre, ayuda, etiquetas))
+
+    def medidor(self, nombre, ayuda, etiquetas=()) -> Medidor:
+        return self._agregar(Medidor(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), limites=SEG_HTTP) -> Histograma:
+        return self._agregar(Histograma(nombre, ayuda, etiquetas, limites))
+
+    def recolector(self, fn):
+        """
+        fn() -> [(nombre, tipo, ayuda, {etiqueta: valor}, valor)], evaluada en
+        cada /metrics: para valores que ya lleva otro módulo (pool, cachés).
+        """
+        self._recolectores.append(fn)
+        return fn
+
+    def _recolectar(self) -> List[Tuple[str, str, str, Dict[str, Any], float]]:
+        muestras = []
+        for fn in self._recolectores:
+            try:
+                muestras.extend(fn())
+            except Exception as e:
+                print("Metrics: error en recolector:", e)
+        return muestras
+
+    def instantanea(self) -> Dict[str, Any]:
+        """Valores del proceso, serializables (lo que se vuelca a METRICS_DIR)."""
+        return {"metricas": {m.nombre: m.series() for m in self._metricas},
+                "recolectadas": [list(m) for m in self._recolectar()]}
+
+    def exponer(self) -> str:
+        if DIRECTORIO:
+            metricas, muestras = self._sumar_procesos()
+        else:
+            metricas, muestras = self._metricas, self._recolectar()
+        salida = []
+        for m in metricas:
+            salida.append(f"# HELP {m.nombre} {m.ayuda}")
+            salida.append(f"# TYPE {m.nombre} {m.tipo}")
+            salida.extend(m.lineas())
+        vistos = set()
+        for nombre, tipo, ayuda, etiquetas, valor in muestras:
+            if nombre not in vistos:
+                vistos.add(nombre)
+                salida.append(f"# HELP {nombre} {ayuda}")
+                salida.append(f"# TYPE {nombre} {tipo}")
+            salida.append(f"{nombre}{_etiquetas(list(etiquetas), list(etiquetas.values()))} {_num(valor)}")
+        return "\n".join(salida) + "\n"
+
+    # ---------- varios procesos (METRICS_DIR) ----------
+    def _sumar_procesos(self):
+        """Este proceso (al momento) + los volcados de los demás, sumados serie a serie."""
+        propia = self.instantanea()
+        guardar(propia)
+        totales = [m.vacio() for m in self._metricas]
+        recolectadas: Dict[Tuple, List[Any]] = {}
+        for pid, inst in _volcados(propia):
+            vivo = pid is not None and _vivo(pid)
+            for m in totales:
+                if vivo or m.tipo != "gauge":
+                    m.sumar(inst["metricas"].get(m.nombre, []))
+            for nombre, tipo, ayuda, etiquetas, valor in inst["recolectadas"]:
+                if vivo or tipo != "gauge":
+                    clave = (nombre, tuple(sorted(etiquetas.items())))
+                    fila = recolectadas.setdefault(clave, [nombre, tipo, ayuda, etiquetas, 0])
+                    fila[4] += valor
+        return totales, [tuple(f) for f in recolectadas.values()]
+
+
+def _vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _volcados(propia: Dict[str, Any]):
+    """(pid, instantánea) de cada proceso; pid None para muertos.json."""
+    yield os.getpid(), propia
+    for ruta in glob.glob(os.path.join(DIRECTORIO, "*.json")):
+        nombre = os.path.basename(ruta)[:-5]
+        if nombre == str(os.getpid()):
+            continue
+        try:
+            with open(ruta, encoding="utf-8") as f:
+                inst = json.load(f)
+        except (OSError, ValueError):
+            continue    # el worker lo está reemplazando o ya se borró
+        yield (int(nombre) if nombre.isdigit() else None), inst
+
+
+def guardar(inst: Optional[Dict[str, Any]] = None):
+    """Vuelca los valores de este proceso a METRICS_DIR/<pid>.json (reemplazo atómico)."""
+    if not DIRECTORIO:
+        return
+    if inst is None:
+        inst = REGISTRO.instantanea()
+    ruta = os.path.join(DIRECTORIO, f"{os.getpid()}.json")
+    try:
+        os.makedirs(DIRECTORIO, exist_ok=True)
+        with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(inst, f, separators=(",", ":"))
+        os.replace(ruta + ".tmp", ruta)
+    except OSError as e:
+        print("Metrics: no se pudo volcar a METRICS_DIR:", e)
+
+
+_volcador = {"pid": None}
+
+
+def iniciar_volcado():
+    """Hilo que vuelca cada VOLCADO_SEG seg. (idempotente; uno por proceso, tras el fork)."""
+    if not DIRECTORIO or _volcador["pid"] == os.getpid():
+        return
+    _volcador["pid"] = os.getpid()
+
+    def _loop():
+        while True:
+            time.sleep(VOLCADO_SEG)
+            guardar()
+
+    threading.Thread(target=_loop, daemon=True, name="metrics-volcado").start()
+
+
+def limpiar_directorio():
+    """Al arrancar el servidor (maestro): los volcados de una ejecución anterior no cuentan."""
+    if not DIRECTORIO:
+        return
+    os.makedirs(DIRECTORIO, exist_ok=True)
+    for ruta in glob.glob(os.path.join(DIRECTORIO, "*.json")):
+        os.remove(ruta)
+
+
+def proceso_terminado(pid: int):
+    """
+    Maestro de gunicorn (child_exit): suma contadores e histogramas del worker
+    que salió a muertos.json y borra su archivo; sus medidores se descartan.
+    """
+    if not DIRECTORIO:
+        return
+    ruta = os.path.join(DIRECTORIO, f"{pid}.json")
+    muertos = os.path.join(DIRECTORIO, "muertos.json")
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            inst = json.load(f)
+    except (OSError, ValueError):
+        return
+    try:
+        with open(muertos, encoding="utf-8") as f:
+            previo = json.load(f)
+    except (OSError, ValueError):
+        previo = {"metricas": {}, "recolectadas": []}
+    totales = {m.nombre: m.vacio() for m in REGISTRO._metricas if m.tipo != "gauge"}
+    for nombre, m in totales.items():
+        m.sumar(previo["metricas"].get(nombre, []))
+        m.sumar(inst["metricas"].get(nombre, []))
+    recolectadas: Dict[Tuple, List[Any]] = {}
+    for nombre, tipo, ayuda, etiquetas, valor in previo["recolectadas"] + inst["recolectadas"]:
+        if tipo != "gauge":
+            fila = recolectadas.setdefault((nombre, tuple(sorted(etiquetas.items()))),
+                                           [nombre, tipo, ayuda, etiquetas, 0])
+            fila[4] += valor
+    with open(muertos + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"metricas": {n: m.series() for n, m in totales.items()},
+                   "recolectadas": list(recolectadas.values())}, f, separators=(",", ":"))
+    os.replace(muertos + ".tmp", muertos)
+    os.remove(ruta)
+
+
+REGISTRO = Registro()
+
+db_segundos = REGISTRO.histograma("db_consulta_segundos", "Duración de cada sentencia SQL (execute + lectura)",
+                                  ("sql",), SEG_DB)
+db_filas = REGISTRO.contador("db_filas_total", "Filas leídas o afectadas", ("sql",))
+db_lentas = REGISTRO.contador("db_consultas_lentas_total", "Sentencias por encima de DB_SLOW_MS", ("sql",))
+http_segundos = REGISTRO.histograma("http_peticion_segundos", "Latencia por ruta hasta devolver la respuesta",
+                                    ("ruta", "metodo", "codigo"), SEG_HTTP)
+http_en_curso = REGISTRO.medidor("http_peticiones_en_curso", "Peticiones en curso por ruta", ("ruta",))
+ia_segundos = REGISTRO.histograma("ia_llamada_segundos", "Latencia de las llamadas al modelo",
+                                  ("operacion", "resultado"), SEG_IA)
+ia_primer_token = REGISTRO.histograma("ia_primer_fragmento_segundos", "Tiempo hasta el primer fragmento (streaming)",
+                                      ("operacion",), SEG_IA)
+ia_tokens = REGISTRO.contador("ia_tokens_total", "Tokens informados por la API", ("operacion", "tipo"))
+ia_reintentos = REGISTRO.contador("ia_reintentos_total", "Reintentos tras un error transitorio del modelo",
+                                  ("operacion",))
+ia_rechazos = REGISTRO.contador("ia_rechazos_total", "Llamadas no hechas: circuito abierto o sin cupo (llm_client.py)",
+                                ("operacion", "motivo"))
+
+
+# ---------- SQL ----------
+_LITERALES = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|\b\d+(?:\.\d+)?\b|%s|%\(\w+\)s")
+_LISTA = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_LISTAS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_formas: Dict[str, str] = {}
+_por_sql: Dict[str, Dict[str, float]] = {}
+_lock_sql = threading.Lock()
+
+
+def normalizar(sql: str) -> str:
+    """Forma de la sentencia sin valores: la etiqueta de sus métricas."""
+    forma = _formas.get(sql)
+    if forma is None:
+        forma = _LITERALES.sub("?", " ".join(sql.split()))
+        forma = _LISTAS.sub("(...)", _LISTA.sub("(...)", forma))[:300]
+        if len(_formas) >= 4 * MAX_SQL:
+            _formas.clear()     # SQL armado con valores dentro: no dejar crecer la memoria
+        _formas[sql] = forma
+    return forma
+
+
+def registrar_sql(sql: str, seg: float, filas: int):
+    forma = normalizar(sql)
+    with _lock_sql:
+        st = _por_sql.get(forma)
+        if st is None:
+            if len(_por_sql) >= MAX_SQL:
+                forma = "otras"
+                st = _por_sql.setdefault(forma, {"n": 0, "seg": 0.0, "max": 0.0, "filas": 0, "lentas": 0})
+            else:
+                st = _por_sql[forma] = {"n": 0, "seg": 0.0, "max": 0.0, "filas": 0, "lentas": 0}
+        st["n"] += 1
+        st["seg"] += seg
+        st["filas"] += max(filas, 0)
+        if seg > st["max"]:
+            st["max"] = seg
+        lenta = seg * 1000 >= SLOW_MS
+        if lenta:
+            st["lentas"] += 1
+    db_segundos.observar(seg, forma)
+    if filas > 0:
+        db_filas.inc(forma, n=filas)
+    if lenta:
+        db_lentas.inc(forma)
+        print(f"SQL lenta ({seg * 1000:.0f} ms, {filas} filas): {forma}")
+
+
+def resumen_sql(limite: int = 20) -> List[Dict[str, Any]]:
+    """Las sentencias que más tiempo acumulan (para /health/sql)."""
+    with _lock_sql:
+        items = [(f, dict(st)) for f, st in _por_sql.items()]
+    items.sort(key=lambda x: x[1]["seg"], reverse=True)
+    return [{"sql": f, "n": st["n"], "seg_total": round(st["seg"], 4),
+             "ms_medio": round(st["seg"] / st["n"] * 1000, 2) if st["n"] else 0.0,
+             "ms_max": round(st["max"] * 1000, 2), "filas": int(st["filas"]), "lentas": st["lentas"]}
+            for f, st in items[:limite]]
+
+
+# ---------- HTTP ----------
+def instrumentar(app):
+    """Latencia y peticiones en curso por ruta en una app Flask."""
+    from flask import g, request
+
+    def _ruta():
+        return request.url_rule.rule if request.url_rule else "sin_ruta"
+
+    @app.before_request
+    def _inicio():
+        g._metrica_ruta = _ruta()
+        g._metrica_t0 = time.perf_counter()
+        http_en_curso.inc(g._metrica_ruta)
+
+    @app.after_request
+    def _fin(resp):
+        t0 = g.pop("_metrica_t0", None)
+        if t0 is not None:
+            http_segundos.observar(time.perf_counter() - t0, g._metrica_ruta, request.method, resp.status_code)
+        return resp
+
+    @app.teardown_request
+    def _cierre(exc):
+        ruta = g.pop("_metrica_ruta", None)
+        if ruta is not None:
+            t0 = g.pop("_metrica_t0", None)
+            if t0 is not None:
+                # Excepción sin manejar: after_request no llegó a correr
+                http_segundos.observar(time.perf_counter() - t0, ruta, request.method, 500)
+            http_en_curso.dec(ruta)
+
+
+# ---------- IA ----------
+def registrar_ia(operacion: str, seg: float, resultado: str, usage=None):
+    """resultado: ok, error o cortado (el cliente dejó de leer el stream)."""
+    ia_segundos.observar(seg, operacion, resultado)
+    if usage is not None:
+        ia_tokens.inc(operacion, "prompt", n=getattr(usage, "prompt_tokens", 0) or 0)
+        ia_tokens.inc(operacion, "completion", n=getattr(usage, "completion_tokens", 0) or 0)
+
+
+def registrar_primer_fragmento(operacion: str, seg: float):
+    ia_primer_token.observar(seg, operacion)
+
+
+def medir_stream(operacion: str, stream, t0: float):
+    """Envuelve un stream de la API: primer fragmento, duración total y tokens (si llegan)."""
+    primero, usage, resultado = True, None, "error"
+    try:
+        for chunk in stream:
+            if primero:
+                primero = False
+                registrar_primer_fragmento(operacion, time.perf_counter() - t0)
+            usage = getattr(chunk, "usage", None) or usage
+            yield chunk
+        resultado = "ok"
+    except GeneratorExit:
+        resultado = "cortado"
+        raise
+    finally:
+        registrar_ia(operacion, time.perf_counter() - t0, resultado, usage)
+
+
+async def amedir_stream(operacion: str, stream, t0: float):
+    """medir_stream para streams asyncio."""
+    primero, usage, resultado = True, None, "error"
+    try:
+        async for chunk in stream:
+            if primero:
+                primero = False
+                registrar_primer_fragmento(operacion, time.perf_counter() - t0)
+            usage = getattr(chunk, "usage", None) or usage
+            yield chunk
+        resultado = "ok"
+    except (GeneratorExit, asyncio.CancelledError):
+        resultado = "cortado"
+        raise
+    finally:
+        registrar_ia(operacion, time.perf_counter() - t0, resultado, usage)
+
@@ -0,0 +1,443 @@
+# backend/migrations.py
+"""
+Migraciones versionadas del esquema: ÚNICO lugar donde se ejecuta DDL.
+
+    python migrations.py           # aplica las migraciones pendientes
+    python migrations.py status    # versión actual y pendientes
+    python migrations.py sql       # imprime todo el DDL (database/schema.sql)
+    python migrations.py sql sqlite  # el mismo esquema para DB_BACKEND=sqlite
+
+Desde código: migrations.migrate(db). Cada migración se registra en la tabla
+schema_version; un GET_LOCK evita que dos procesos migren a la vez.
+Con DB_BACKEND=sqlite se aplica MIGRATIONS_SQLITE (mismas versiones).
+"""
+import sys
+from typing import List, Tuple
+
+import mysql.connector
+from mysql.connector import errorcode
+
+LOCK_NAME = "soporte_ia_migrations"
+
+# (versión, descripción, sentencias)
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (1, "tablas base usuarios y tickets", [
+        """
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(50) UNIQUE,
+            password_hash VARCHAR(512),
+            nombre VARCHAR(100) NOT NULL,
+            email VARCHAR(100) UNIQUE NOT NULL,
+            role ENUM('usuario','admin') DEFAULT 'usuario',
+            fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS tickets (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            usuario_id INT NULL,
+            nombre VARCHAR(100),
+            telefono VARCHAR(30),
+            domicilio VARCHAR(200),
+            titulo VARCHAR(200),
+            descripcion TEXT NOT NULL,
+            categoria ENUM('hardware','software','redes','otros') NOT NULL,
+            tipo ENUM('preventivo','correctivo') NOT NULL,
+            prioridad ENUM('baja','media','alta','critica') DEFAULT 'media',
+            estado ENUM('abierto','en_proceso','resuelto','cerrado') DEFAULT 'abierto',
+            asignado_admin BOOLEAN DEFAULT FALSE,
+            solucion_ia TEXT,
+            notas_admin TEXT,
+            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            CONSTRAINT fk_tickets_usuario
+              FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
+              ON DELETE SET NULL ON UPDATE CASCADE
+        ) ENGINE=InnoDB
+        """,
+    ]),
+    # Índices de las consultas calientes: listado por cursor (fecha_creacion, id),
+    # filtros del panel + orden por fecha y "mis tickets" por usuario.
+    (2, "índices secundarios de tickets", [
+        "CREATE INDEX idx_tickets_fecha ON tickets (fecha_creacion, id)",
+        "CREATE INDEX idx_tickets_estado ON tickets (estado, fecha_creacion)",
+        "CREATE INDEX idx_tickets_usuario_fecha ON tickets (usuario_id, fecha_creacion)",
+        "CREATE INDEX idx_tickets_categoria ON tickets (categoria, fecha_creacion)",
+        "CREATE INDEX idx_tickets_tipo ON tickets (tipo, fecha_creacion)",
+    ]),
+    # Contadores del panel mantenidos por TicketModel en la misma transacción
+    (3, "tabla ticket_stats con contadores por estado/tipo/categoria", [
+        """
+        CREATE TABLE IF NOT EXISTS ticket_stats (
+            dimension VARCHAR(20) NOT NULL,
+            valor VARCHAR(50) NOT NULL,
+            total INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, valor)
+        ) ENGINE=InnoDB
+        """,
+        "DELETE FROM ticket_stats",
+        "INSERT INTO ticket_stats (dimension, valor, total) SELECT 'total', '', COUNT(*) FROM tickets",
+        """
+        INSERT INTO ticket_stats (dimension, valor, total)
+        SELECT 'estado', estado, COUNT(*) FROM tickets WHERE estado IS NOT NULL GROUP BY estado
+        """,
+        """
+        INSERT INTO ticket_stats (dimension, valor, total)
+        SELECT 'tipo', tipo, COUNT(*) FROM tickets WHERE tipo IS NOT NULL GROUP BY tipo
+        """,
+        """
+        INSERT INTO ticket_stats (dimension, valor, total)
+        SELECT 'categoria', categoria, COUNT(*) FROM tickets WHERE categoria IS NOT NULL GROUP BY categoria
+        """,
+    ]),
+    # Marca durable del triage IA. Los tickets existentes quedan en NULL (no se
+    # triagean en masa); los nuevos nacen 'pendiente'.
+    (4, "columnas triage_estado / triage_intentos", [
+        """
+        ALTER TABLE tickets
+          ADD COLUMN triage_estado ENUM('pendiente','procesando','hecho','error') NULL DEFAULT NULL,
+          ADD COLUMN triage_intentos TINYINT UNSIGNED NOT NULL DEFAULT 0
+        """,
+        "ALTER TABLE tickets ALTER COLUMN triage_estado SET DEFAULT 'pendiente'",
+        "CREATE INDEX idx_tickets_triage ON tickets (triage_estado, id)",
+    ]),
+    # Respuestas de la IA reutilizables entre reinicios (ver ai_cache.py)
+    (5, "tabla ai_respuestas", [
+        """
+        CREATE TABLE IF NOT EXISTS ai_respuestas (
+            clave CHAR(64) PRIMARY KEY,
+            tipo VARCHAR(20) NOT NULL,
+            respuesta MEDIUMTEXT NOT NULL,
+            creada TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expira TIMESTAMP NOT NULL,
+            INDEX idx_ai_respuestas_expira (expira)
+        ) ENGINE=InnoDB
+        """,
+    ]),
+    # Sincronización incremental por marca de agua (retrieval.py)
+    (6, "índice por fecha_actualizacion", [
+        "CREATE INDEX idx_tickets_actualizacion ON tickets (fecha_actualizacion, id)",
+    ]),
+    # Búsqueda de texto del panel (/api/tickets/search)
+    (7, "índice FULLTEXT de titulo/descripcion/notas_admin", [
+        "CREATE FULLTEXT INDEX idx_tickets_texto ON tickets (titulo, descripcion, notas_admin)",
+    ]),
+    # Enlace al ticket abierto del que uno nuevo es probable duplicado (dedup.py)
+    (8, "columna duplicado_de", [
+        """
+        ALTER TABLE tickets
+          ADD COLUMN duplicado_de INT NULL DEFAULT NULL,
+          ADD CONSTRAINT fk_tickets_duplicado
+            FOREIGN KEY (duplicado_de) REFERENCES tickets(id) ON DELETE SET NULL
+        """,
+    ]),
+    # Espera del reintento de triage visible para todos los procesos (triage.py)
+    (9, "columna triage_reintentar_en", [
+        "ALTER TABLE tickets ADD COLUMN triage_reintentar_en TIMESTAMP NULL DEFAULT NULL",
+    ]),
+    # Marca de cada INSERT multi-fila de crear_tickets_bulk: los ids se releen
+    # por ella en vez de suponerlos consecutivos (auto_increment_increment > 1
+    # en réplicas multi-primario, p. ej.)
+    (10, "columna lote_alta", [
+        """
+        ALTER TABLE tickets
+          ADD COLUMN lote_alta CHAR(32) NULL DEFAULT NULL,
+          ADD INDEX idx_tickets_lote_alta (lote_alta)
+        """,
+    ]),
+]
+
+# Mismas versiones para DB_BACKEND=sqlite (db_sqlite.py). ENUM -> TEXT con
+# CHECK, fechas TIMESTAMP en hora local como NOW() de MySQL, y el ON UPDATE
+# CURRENT_TIMESTAMP de fecha_actualizacion como trigger.
+_AHORA_SQLITE = "(datetime('now', 'localtime'))"
+_TRIGGER_ACTUALIZACION = f"""
+        CREATE TRIGGER IF NOT EXISTS trg_tickets_actualizacion AFTER UPDATE ON tickets
+        WHEN NEW.fecha_actualizacion IS OLD.fecha_actualizacion
+        BEGIN
+            UPDATE tickets SET fecha_actualizacion = {_AHORA_SQLITE} WHERE id = NEW.id;
+        END
+        """
+
+MIGRATIONS_SQLITE: List[Tuple[int, str, List[str]]] = [
+    (1, "tablas base usuarios y tickets", [
+        f"""
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE COLLATE NOCASE,
+            password_hash TEXT,
+            nombre TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL COLLATE NOCASE,
+            role TEXT DEFAULT 'usuario' CHECK (role IN ('usuario','admin')),
+            fecha_registro TIMESTAMP DEFAULT {_AHORA_SQLITE}
+        )
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS tickets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            usuario_id INTEGER NULL
+              REFERENCES usuarios(id) ON DELETE SET NULL ON UPDATE CASCADE,
+            nombre TEXT,
+            telefono TEXT,
+            domicilio TEXT,
+            titulo TEXT,
+            descripcion TEXT NOT NULL,
+            categoria TEXT NOT NULL CHECK (categoria IN ('hardware','software','redes','otros')),
+            tipo TEXT NOT NULL CHECK (tipo IN ('preventivo','correctivo')),
+            prioridad TEXT DEFAULT 'media' CHECK (prioridad IN ('baja','media','alta','critica')),
+            estado TEXT DEFAULT 'abierto' CHECK (estado IN ('abierto','en_proceso','resuelto','cerrado')),
+            asignado_admin INTEGER DEFAULT 0,
+            solucion_ia TEXT,
+            notas_admin TEXT,
+            fecha_creacion TIMESTAMP DEFAULT {_AHORA_SQLITE},
+            fecha_actualizacion TIMESTAMP DEFAULT {_AHORA_SQLITE}
+        )
+        """,
+        _TRIGGER_ACTUALIZACION,
+    ]),
+    (2, "índices secundarios de tickets", [
+        "CREATE INDEX IF NOT EXISTS idx_tickets_fecha ON tickets (fecha_creacion, id)",
+        "CREATE INDEX IF NOT EXISTS idx_tickets_estado ON tickets (estado, fecha_creacion)",
+        "CREATE INDEX IF NOT EXISTS idx_tickets_usuario_fecha ON tickets (usuario_id, fecha_creacion)",
+        "CREATE INDEX IF NOT EXISTS idx_tickets_categoria ON tickets (categoria, fecha_creacion)",
+        "CREATE INDEX IF NOT EXISTS idx_tickets_tipo ON tickets (tipo, fecha_creacion)",
+    ]),
+    (3, "tabla ticket_stats con contadores por estado/tipo/categoria", [
+        """
+        CREATE TABLE IF NOT EXISTS ticket_stats (
+            dimension TEXT NOT NULL,
+            valor TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, valor)
+        ) WITHOUT ROWID
+        """,
+        *MIGRATIONS[2][2][1:],
+    ]),
+    # Sin ALTER COLUMN ... SET DEFAULT: la columna nace con el default de los
+    # tickets nuevos y las filas existentes se dejan en NULL (sin tocar su
+    # fecha_actualizacion, por eso el trigger se quita mientras tanto)
+    (4, "columnas triage_estado / triage_intentos", [
+        "DROP TRIGGER IF EXISTS trg_tickets_actualizacion",
+        """
+        ALTER TABLE tickets ADD COLUMN triage_estado TEXT NULL DEFAULT 'pendiente'
+          CHECK (triage_estado IN ('pendiente','procesando','hecho','error'))
+        """,
+        "ALTER TABLE tickets ADD COLUMN triage_intentos INTEGER NOT NULL DEFAULT 0",
+        "UPDATE tickets SET triage_estado = NULL",
+        _TRIGGER_ACTUALIZACION,
+        "CREATE INDEX IF NOT EXISTS idx_tickets_triage ON tickets (triage_estado, id)",
+    ]),
+    (5, "tabla ai_respuestas", [
+        f"""
+        CREATE TABLE IF NOT EXISTS ai_respuestas (
+            clave TEXT PRIMARY KEY,
+            tipo TEXT NOT NULL,
+            respuesta TEXT NOT NULL,
+            creada TIMESTAMP DEFAULT {_AHORA_SQLITE},
+            expira TIMESTAMP NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_ai_respuestas_expira ON ai_respuestas (expira)",
+    ]),
+    (6, "índice por fecha_actualizacion", [
+        "CREATE INDEX IF NOT EXISTS idx_tickets_actualizacion ON tickets (fecha_actualizacion, id)",
+    ]),
+    # SQLite no tiene FULLTEXT: search.py usa el índice local. La versión se
+    # registra igual para que la numeración coincida con MySQL.
+    (7, "índice FULLTEXT de titulo/descripcion/notas_admin", []),
+    (8, "columna duplicado_de", [
+        """
+        ALTER TABLE tickets ADD COLUMN duplicado_de INTEGER NULL DEFAULT NULL
+          REFERENCES tickets(id) ON DELETE SET NULL
+        """,
+    ]),
+    (9, "columna triage_reintentar_en", [
+        "ALTER TABLE tickets ADD COLUMN triage_reintentar_en TIMESTAMP NULL DEFAULT NULL",
+    ]),
+    (10, "columna lote_alta", [
+        "ALTER TABLE tickets ADD COLUMN lote_alta CHAR(32) NULL DEFAULT NULL",
+        "CREATE INDEX IF NOT EXISTS idx_tickets_lote_alta ON tickets (lote_alta)",
+    ]),
+]
+
+# Errores que indican que el cambio ya estaba aplicado (BD creada antes de
+# existir schema_version): se ignoran para que la migración sea idempotente.
+YA_APLICADO = {
+    errorcode.ER_DUP_KEYNAME,
+    errorcode.ER_DUP_FIELDNAME,
+    errorcode.ER_TABLE_EXISTS_ERROR,
+}
+
+
+def crear_base(db):
+    """Crea la base si tenemos permiso; si no, asume que ya existe."""
+    if _sqlite(db):
+        return  # el archivo se crea al conectar
+    try:
+        srv = db.server_connect()
+        cur = srv.cursor()
+        cur.execute(
+            f"CREATE DATABASE IF NOT EXISTS `{db.database}` "
+            "DEFAULT CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;"
+        )
+        cur.close()
+        srv.close()
+    except mysql.connector.Error as e:
+        if e.errno not in (errorcode.ER_DBACCESS_DENIED_ERROR, errorcode.ER_ACCESS_DENIED_ERROR):
+            raise
+
+
+def _sqlite(db) -> bool:
+    return getattr(db, "dialecto", "mysql") == "sqlite"
+
+
+def migraciones(db) -> List[Tuple[int, str, List[str]]]:
+    """La lista de migraciones del motor de `db`."""
+    return MIGRATIONS_SQLITE if _sqlite(db) else MIGRATIONS
+
+
+def _asegurar_tabla_version(cur, sqlite: bool = False):
+    if sqlite:
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                descripcion TEXT NOT NULL,
+                aplicada TIMESTAMP DEFAULT {_AHORA_SQLITE}
+            )
+        """)
+        return
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            descripcion VARCHAR(200) NOT NULL,
+            aplicada TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+    """)
+
+
+def version_actual(db) -> int:
+    cur = db.cursor()
+    try:
+        cur.execute("SELECT COALESCE(MAX(version), 0) AS v FROM schema_version")
+        return int((cur.fetchone() or {}).get("v") or 0)
+    except mysql.connector.Error as e:
+        if e.errno == errorcode.ER_NO_SUCH_TABLE:
+            return 0
+        raise
+    finally:
+        cur.close()
+
+
+def pendientes(db) -> List[Tuple[int, str, List[str]]]:
+    v = version_actual(db)
+    return [m for m in migraciones(db) if m[0] > v]
+
+
+def migrate(db, verbose: bool = True) -> List[int]:
+    """Aplica en orden las migraciones pendientes. Devuelve las versiones aplicadas."""
+    # Camino rápido: esquema al día -> una sola consulta, sin DDL ni locks
+    try:
+        with db.connection():
+            if not pendientes(db):
+                return []
+    except mysql.connector.Error as e:
+        if e.errno != errorcode.ER_BAD_DB_ERROR:
+            raise
+    if _sqlite(db):
+        return _migrate_sqlite(db, verbose)
+    crear_base(db)
+
+    aplicadas = []
+    with db.connection() as cnx:
+        cur = cnx.cursor()
+        cur.execute("SELECT GET_LOCK(%s, 60)", (LOCK_NAME,))
+        if cur.fetchone()[0] != 1:
+            cur.close()
+            raise RuntimeError("No se pudo obtener el lock de migraciones")
+        try:
+            _asegurar_tabla_version(cur)
+            for version, descripcion, sentencias in pendientes(db):  # re-lee con el lock tomado
+                for sql in sentencias:
+                    try:
+                        cur.execute(sql)
+                    except mysql.connector.Error as e:
+                        if e.errno not in YA_APLICADO:
+                            raise
+                cur.execute(
+                    "INSERT INTO schema_version (version, descripcion) VALUES (%s,%s)",
+                    (version, descripcion),
+                )
+                cnx.commit()
+                aplicadas.append(version)
+                if verbose:
+                    print(f"== Migración {version} aplicada: {descripcion}")
+        finally:
+            cur.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cur.fetchone()
+            cur.close()
+    return aplicadas
+
+
+def _migrate_sqlite(db, verbose: bool) -> List[int]:
+    """
+    SQLite: el DDL es transaccional. Todo va en una transacción BEGIN IMMEDIATE,
+    que hace de GET_LOCK (otro proceso espera a que termine) y deja el esquema
+    como estaba si una migración falla.
+    """
+    aplicadas = []
+    with db.connection() as cnx:
+        cur = cnx.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            _asegurar_tabla_version(cur, sqlite=True)
+            for version, descripcion, sentencias in pendientes(db):  # re-lee con el lock tomado
+                for sql in sentencias:
+                    cur.execute(sql)
+                cur.execute(
+                    "INSERT INTO schema_version (version, descripcion) VALUES (%s,%s)",
+                    (version, descripcion),
+                )
+                aplicadas.append(version)
+            cnx.commit()
+        except Exception:
+            cnx.rollback()
+            raise
+        finally:
+            cur.close()
+    if verbose:
+        for version, descripcion, _ in migraciones(db):
+            if version in aplicadas:
+                print(f"== Migración {version} aplicada: {descripcion}")
+    return aplicadas
+
+
+def ddl_completo(sqlite: bool = False) -> str:
+    partes = []
+    for version, descripcion, sentencias in (MIGRATIONS_SQLITE if sqlite else MIGRATIONS):
+        partes.append(f"-- {version}: {descripcion}")
+        partes.extend(" ".join(s.split()) + ";" for s in sentencias)
+    return "\n".join(partes)
+
+
+if __name__ == "__main__":
+    import config  # noqa: F401  (carga .env)
+    from models import Database
+
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "up"
+    if cmd == "sql":
+        print(ddl_completo(sqlite=sys.argv[2:] == ["sqlite"]))
+        sys.exit(0)
+
+    db = Database.from_env()
+    if cmd == "status":
+        with db.connection():
+            print("Versión actual:", version_actual(db))
+            for version, descripcion, _ in pendientes(db):
+                print(f"  pendiente {version}: {descripcion}")
+    elif cmd == "up":
+        aplicadas = migrate(db)
+        print("Esquema al día." if not aplicadas else f"Aplicadas: {aplicadas}")
+    else:
+        print(__doc__)
+        sys.exit(2)
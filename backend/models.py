@@ -1,10 +1,111 @@
 # backend/models.py
+import base64
 import os
-from typing import Optional, Any, Dict
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Any, Dict, Iterator, List, Tuple
 import mysql.connector
 from mysql.connector import errorcode
 
+from cache import QueryCache
+import metrics
+
+
+class PoolTimeout(Exception):
+    """No se liberó ninguna conexión del pool dentro de DB_POOL_TIMEOUT."""
+
+
+class CursorMedido:
+    """
+    Cursor de mysql.connector que mide cada sentencia para metrics.py.
+
+    El tiempo va desde execute() hasta la última lectura de sus filas (los
+    cursores no tienen buffer: el grueso de un SELECT grande llega al leer) y
+    se registra al ejecutar la siguiente sentencia o al cerrar el cursor.
+    """
+    __slots__ = ("_cur", "_sql", "_t0", "_t1", "_filas")
+
+    def __init__(self, cur):
+        self._cur = cur
+        self._sql = None
+
+    def _cerrar_sentencia(self):
+        if self._sql is not None:
+            filas = self._filas or max(self._cur.rowcount or 0, 0)
+            metrics.registrar_sql(self._sql, self._t1 - self._t0, filas)
+            self._sql = None
+
+    def execute(self, sql, params=(), *a, **kw):
+        self._cerrar_sentencia()
+        t0 = time.perf_counter()
+        try:
+            return self._cur.execute(sql, params, *a, **kw)
+        finally:
+            self._sql, self._t0, self._t1, self._filas = sql, t0, time.perf_counter(), 0
+
+    def executemany(self, sql, seq_params, *a, **kw):
+        self._cerrar_sentencia()
+        t0 = time.perf_counter()
+        try:
+            return self._cur.executemany(sql, seq_params, *a, **kw)
+        finally:
+            self._sql, self._t0, self._t1, self._filas = sql, t0, time.perf_counter(), 0
+
+    def _leido(self, filas):
+        if self._sql is not None:
+            self._filas += filas
+            self._t1 = time.perf_counter()
+
+    def fetchone(self):
+        fila = self._cur.fetchone()
+        self._leido(1 if fila is not None else 0)
+        return fila
+
+    def fetchmany(self, size=1):
+        filas = self._cur.fetchmany(size)
+        self._leido(len(filas))
+        return filas
+
+    def fetchall(self):
+        filas = self._cur.fetchall()
+        self._leido(len(filas))
+        return filas
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._cerrar_sentencia()
+        return self._cur.close()
+
+    def __del__(self):
+        try:
+            self._cerrar_sentencia()
+        except Exception:
+            pass
+
+    def __getattr__(self, nombre):
+        # lastrowid, rowcount, description, ...
+        if nombre.startswith("_"):
+            raise AttributeError(nombre)
+        return getattr(self._cur, nombre)
+
+
 class Database:
+    """
+    Pool acotado de conexiones MySQL.
+
+    Cada hilo toma una conexión del pool la primera vez que llama a
+    cursor()/connect() y la conserva hasta end_request() (Flask lo llama en el
+    teardown de cada petición). Así dos peticiones concurrentes nunca comparten
+    conexión ni cursores.
+    """
+    dialecto = "mysql"
+
     def __init__(self):
         # Lee .env (valores por defecto compatibles con XAMPP en 3307)
         self.host = os.getenv("DB_HOST", "127.0.0.1")
@@ -12,8 +113,33 @@ class Database:
         self.password = os.getenv("DB_PASSWORD", "app123")
         self.port = int(os.getenv("DB_PORT", "3307"))
         self.database = os.getenv("DB_NAME", "soporte_ia")
-        self.cnx = None
-        print("== DB cfg ==", self.host, self.user, self.port, self.database)  # debug
+        self._iniciar_pool()
+        print(f"DB: MySQL {self.user}@{self.host}:{self.port}/{self.database} (pool {self.pool_size})")
+
+    @classmethod
+    def from_env(cls) -> "Database":
+        """DB_BACKEND: mysql (por defecto) o sqlite (archivo embebido, ver db_sqlite.py)."""
+        backend = os.getenv("DB_BACKEND", "mysql").lower()
+        if backend == "sqlite":
+            from db_sqlite import SQLiteDatabase
+            return SQLiteDatabase()
+        if backend != "mysql":
+            raise ValueError(f"DB_BACKEND inválido: {backend} (usa mysql o sqlite)")
+        return cls()
+
+    def _iniciar_pool(self):
+        # Pool
+        self.pool_size = int(os.getenv("DB_POOL_SIZE", "10"))
+        self.pool_timeout = float(os.getenv("DB_POOL_TIMEOUT", "10"))      # seg. esperando una conexión libre
+        self.pool_recycle = int(os.getenv("DB_POOL_RECYCLE", "1800"))      # seg. de vida máxima de una conexión
+        self.pool_ping_idle = float(os.getenv("DB_POOL_PING_IDLE", "0"))   # ping sólo si estuvo ociosa más de N seg.
+
+        self._idle = queue.LifoQueue(maxsize=self.pool_size)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._created = 0
+        self._stats = {"in_use": 0, "created": 0, "reconnects": 0,
+                       "waits": 0, "wait_time": 0.0, "timeouts": 0}
 
     def server_connect(self):
         """Conecta al servidor (sin BD) para poder crear la base si hace falta."""
@@ -25,11 +151,8 @@ class Database:
             connection_timeout=5,
         )
 
-    def connect(self):
-        """Conexión normal a la BD."""
-        if self.cnx and self.cnx.is_connected():
-            return self.cnx
-        self.cnx = mysql.connector.connect(
+    def _new_connection(self):
+        cnx = mysql.connector.connect(
             host=self.host,
             user=self.user,
             password=self.password,
@@ -37,83 +160,281 @@ class Database:
             database=self.database,
             connection_timeout=5,
         )
-        return self.cnx
+        cnx._pool_born = cnx._pool_used = time.monotonic()
+        return cnx
+
+    # ---------- POOL ----------
+    def acquire(self):
+        """Saca una conexión sana del pool (espera si están todas en uso)."""
+        try:
+            cnx = self._idle.get_nowait()
+        except queue.Empty:
+            cnx = None
+            with self._lock:
+                crear = self._created < self.pool_size
+                if crear:
+                    self._created += 1
+            if crear:
+                try:
+                    cnx = self._new_connection()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+                with self._lock:
+                    self._stats["created"] += 1
+            else:
+                t0 = time.monotonic()
+                try:
+                    cnx = self._idle.get(timeout=self.pool_timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"Sin conexiones libres tras {self.pool_timeout}s (pool={self.pool_size})")
+                finally:
+                    with self._lock:
+                        self._stats["waits"] += 1
+                        self._stats["wait_time"] += time.monotonic() - t0
+
+        try:
+            cnx = self._health_check(cnx)
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        with self._lock:
+            self._stats["in_use"] += 1
+        return cnx
+
+    def _health_check(self, cnx):
+        """Descarta conexiones viejas o caídas y las reemplaza por una nueva."""
+        now = time.monotonic()
+        viejo = self.pool_recycle and now - cnx._pool_born > self.pool_recycle
+        if not viejo:
+            if now - cnx._pool_used <= self.pool_ping_idle:
+                return cnx
+            try:
+                cnx.ping(reconnect=False)
+                return cnx
+            except mysql.connector.Error:
+                pass
+        try:
+            cnx.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._stats["reconnects"] += 1
+        return self._new_connection()
+
+    def release(self, cnx, discard: bool = False):
+        """
+        Devuelve una conexión al pool deshaciendo cualquier transacción abierta.
+        discard=True la cierra en su lugar (p. ej. si quedaron filas sin leer).
+        """
+        with self._lock:
+            self._stats["in_use"] -= 1
+        try:
+            if not discard:
+                if cnx.in_transaction:
+                    cnx.rollback()
+                cnx._pool_used = time.monotonic()
+                self._idle.put_nowait(cnx)
+                return
+        except Exception:
+            pass
+        # Conexión rota o descartada: se cierra y deja hueco para crear otra
+        try:
+            cnx.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    def pool_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            st = dict(self._stats)
+            st["size"] = self.pool_size
+            st["open"] = self._created
+        st["idle"] = self._idle.qsize()
+        st["wait_time"] = round(st["wait_time"], 4)
+        return st
+
+    # ---------- CONEXIÓN DEL HILO ACTUAL ----------
+    def connect(self):
+        """Conexión del hilo actual (la toma del pool si aún no tiene una)."""
+        cnx = getattr(self._local, "cnx", None)
+        if cnx is None:
+            cnx = self.acquire()
+            self._local.cnx = cnx
+        return cnx
+
+    def end_request(self, exc=None):
+        """Devuelve al pool la conexión del hilo actual (teardown de Flask)."""
+        cnx = getattr(self._local, "cnx", None)
+        if cnx is not None:
+            self._local.cnx = None
+            self.release(cnx)
+
+    @contextmanager
+    def connection(self):
+        """Ámbito explícito para scripts e hilos de fondo; reentrante."""
+        propia = getattr(self._local, "cnx", None) is None
+        try:
+            yield self.connect()
+        finally:
+            if propia:
+                self.end_request()
 
     def cursor(self):
-        self.connect()
-        return self.cnx.cursor(dictionary=True)
+        return CursorMedido(self.connect().cursor(dictionary=True))
 
     def commit(self):
-        if self.cnx and self.cnx.is_connected():
-            self.cnx.commit()
+        cnx = getattr(self._local, "cnx", None)
+        if cnx is not None:
+            cnx.commit()
+
+    def rollback(self):
+        cnx = getattr(self._local, "cnx", None)
+        if cnx is not None:
+            cnx.rollback()
 
     def close(self):
-        if self.cnx and self.cnx.is_connected():
-            self.cnx.close()
+        """Cierra las conexiones ociosas del pool."""
+        self.end_request()
+        while True:
+            try:
+                cnx = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                cnx.close()
+            except Exception:
+                pass
+            with self._lock:
+                self._created -= 1
 
-    def init_schema(self):
-        """Crea base y tablas si no existen. Si no hay permiso para CREATE, ignora el error."""
-        # 1) Crear base de datos si tenemos permiso
-        try:
-            srv = self.server_connect()
-            cur = srv.cursor()
-            cur.execute(
-                f"CREATE DATABASE IF NOT EXISTS `{self.database}` "
-                "DEFAULT CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;"
-            )
-            cur.close()
-            srv.close()
-        except mysql.connector.Error as e:
-            if e.errno not in (errorcode.ER_DBACCESS_DENIED_ERROR, errorcode.ER_ACCESS_DENIED_ERROR):
-                raise
 
-        # 2) Crear tablas
-        cnx = self.connect()
-        cur = cnx.cursor()
+# ---------- Valores válidos (mismos ENUM que la tabla tickets) ----------
+CATEGORIAS = ('hardware', 'software', 'redes', 'otros')
+TIPOS = ('preventivo', 'correctivo')
+PRIORIDADES = ('baja', 'media', 'alta', 'critica')
+ESTADOS = ('abierto', 'en_proceso', 'resuelto', 'cerrado')
 
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS usuarios (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            username VARCHAR(50) UNIQUE,
-            password_hash VARCHAR(512),
-            nombre VARCHAR(100) NOT NULL,
-            email VARCHAR(100) UNIQUE NOT NULL,
-            role ENUM('usuario','admin') DEFAULT 'usuario',
-            fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        ) ENGINE=InnoDB;
-        """)
+PAGE_SIZE = int(os.getenv("TICKETS_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = 500
+EXPORT_NET_TIMEOUT = int(os.getenv("EXPORT_NET_TIMEOUT", "600"))
 
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS tickets (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            usuario_id INT NULL,
-            nombre VARCHAR(100),
-            telefono VARCHAR(30),
-            domicilio VARCHAR(200),
-            titulo VARCHAR(200),
-            descripcion TEXT NOT NULL,
-            categoria ENUM('hardware','software','redes','otros') NOT NULL,
-            tipo ENUM('preventivo','correctivo') NOT NULL,
-            prioridad ENUM('baja','media','alta','critica') DEFAULT 'media',
-            estado ENUM('abierto','en_proceso','resuelto','cerrado') DEFAULT 'abierto',
-            asignado_admin BOOLEAN DEFAULT FALSE,
-            solucion_ia TEXT,
-            notas_admin TEXT,
-            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-            CONSTRAINT fk_tickets_usuario
-              FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
-              ON DELETE SET NULL ON UPDATE CASCADE
-        ) ENGINE=InnoDB;
-        """)
 
-        cnx.commit()
-        cur.close()
+def encode_cursor(fecha: datetime, ticket_id: int) -> str:
+    """Cursor opaco con la última fila vista: (fecha_creacion, id)."""
+    raw = f"{fecha.isoformat()}|{ticket_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        fecha, tid = raw.split("|")
+        return datetime.fromisoformat(fecha), int(tid)
+    except Exception:
+        raise ValueError("cursor inválido")
+
+
+def _parse_fecha(valor: str, fin: bool = False) -> datetime:
+    """'YYYY-MM-DD' o ISO completo. Con fin=True una fecha sola cubre el día entero."""
+    try:
+        dt = datetime.fromisoformat(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"fecha inválida: {valor}")
+    if fin and len(valor) == 10:
+        dt += timedelta(days=1)
+    return dt
+
+
+# Longitudes de las columnas VARCHAR de tickets
+LONGITUDES = {'nombre': 100, 'telefono': 30, 'domicilio': 200, 'titulo': 200}
+
+
+def normalizar_ticket(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Valida un ticket de entrada (JSON de la API) y completa los valores por
+    defecto. Lanza ValueError con un mensaje legible si algo no cuadra.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("cada ticket debe ser un objeto JSON")
+    descripcion = (data.get('descripcion') or data.get('problema') or '').strip()
+    if not descripcion:
+        raise ValueError("Falta el campo descripcion")
+    t = {
+        'usuario_id': data.get('usuario_id'),
+        'nombre': data.get('nombre'),
+        'telefono': data.get('telefono'),
+        'domicilio': data.get('domicilio'),
+        'titulo': data.get('titulo') or 'Ticket de soporte',
+        'descripcion': descripcion,
+        'categoria': data.get('categoria') or 'otros',
+        'tipo': data.get('tipo') or 'correctivo',
+        'prioridad': data.get('prioridad') or 'media',
+        'estado': data.get('estado') or 'abierto',
+        'duplicado_de': data.get('duplicado_de'),
+    }
+    for campo, validos in (('categoria', CATEGORIAS), ('tipo', TIPOS),
+                           ('prioridad', PRIORIDADES), ('estado', ESTADOS)):
+        if t[campo] not in validos:
+            raise ValueError(f"{campo} inválido: {t[campo]}")
+    for campo, maximo in LONGITUDES.items():
+        if t[campo] is not None and len(str(t[campo])) > maximo:
+            raise ValueError(f"{campo} supera {maximo} caracteres")
+    for campo in ('usuario_id', 'duplicado_de'):
+        if t[campo] is not None:
+            try:
+                t[campo] = int(t[campo])
+            except (TypeError, ValueError):
+                raise ValueError(f"{campo} inválido")
+    return t
 
 
 class TicketModel:
-    def __init__(self, db: Optional[Database] = None):
-        self.db = db or Database()
+    # Filtros de listado: campo -> valores permitidos
+    FILTROS_ENUM = {
+        'estado': ESTADOS,
+        'prioridad': PRIORIDADES,
+        'categoria': CATEGORIAS,
+        'tipo': TIPOS,
+    }
+    CAMPOS_LISTADO = """id, usuario_id, nombre, telefono, domicilio,
+                 titulo, descripcion, categoria, tipo,
+                 prioridad, estado, asignado_admin, solucion_ia,
+                 notas_admin, duplicado_de, fecha_creacion"""
+    COLUMNAS_LISTADO = f"""
+          SELECT {CAMPOS_LISTADO}
+          FROM tickets
+        """
+    # Columnas del índice FULLTEXT (migración 7)
+    COLUMNAS_TEXTO = "titulo, descripcion, notas_admin"
+
+    def __init__(self, db: Optional[Database] = None, cache: Optional[QueryCache] = None):
+        self.db = db or Database.from_env()
+        # Caché de lecturas del panel (stats y listados); ver cache.py
+        self.cache = cache or QueryCache.from_env()
+        self._oyentes = []
+
+    # ---------- EVENTOS ----------
+    def suscribir(self, fn):
+        """
+        fn(evento, ticket_ids, campos) se llama tras cada commit:
+        evento 'alta' (campos vacío) o 'cambio' (campos modificados).
+        Un oyente que falla no afecta a la escritura.
+        """
+        self._oyentes.append(fn)
+
+    def _notificar(self, evento: str, ticket_ids, campos=()):
+        for fn in self._oyentes:
+            try:
+                fn(evento, list(ticket_ids), set(campos))
+            except Exception as e:
+                print(f"Error en oyente de tickets ({evento}):", e)
 
     # ---------- USUARIOS ----------
     def existe_admin(self) -> bool:
@@ -225,80 +546,554 @@ class TicketModel:
         return row
 
     # ---------- STATS (para cuadro comparativo) ----------
+    # Contadores en ticket_stats (dimension, valor) -> total, mantenidos en la
+    # misma transacción que cada INSERT/UPDATE de tickets. Leerlos es O(1).
+    # La fila ('version', '') sube con cada escritura: es la marca de datos de
+    # los ETag (ver marca_datos).
+    DIMENSIONES_STATS = ('estado', 'tipo', 'categoria')
+
+    def _aplicar_deltas_stats(self, cur, deltas: Dict[Tuple[str, str], int]):
+        deltas = {**deltas, ('version', ''): 1}
+        filas = sorted((d, v, n) for (d, v), n in deltas.items() if n and v is not None)
+        # Orden fijo de claves -> todas las transacciones bloquean en el mismo orden
+        cur.execute(
+            "INSERT INTO ticket_stats (dimension, valor, total) VALUES "
+            + ", ".join(["(%s,%s,%s)"] * len(filas))
+            + " ON DUPLICATE KEY UPDATE total = total + VALUES(total)",
+            [x for fila in filas for x in fila],
+        )
+
     def stats_resumen(self) -> Dict[str, Any]:
+        return self.cache.get_or_load("stats", self._stats_resumen_db, {"ns": "stats"})
+
+    def marca_datos(self) -> Dict[str, Any]:
+        """
+        {"version": int, "ultima": datetime UTC | None}: el contador de escrituras
+        y la última fecha_actualizacion. Una consulta por clave primaria y por
+        índice (MAX sobre idx_tickets_actualizacion): sirve para contestar 304
+        sin ejecutar el listado ni las stats.
+        """
         cur = self.db.cursor()
+        cur.execute("""
+            SELECT (SELECT total FROM ticket_stats WHERE dimension='version' AND valor='') AS version,
+                   (SELECT UNIX_TIMESTAMP(MAX(fecha_actualizacion)) FROM tickets) AS ultima
+        """)
+        row = cur.fetchone() or {}
+        cur.close()
+        ultima = row.get("ultima")
+        return {"version": row.get("version") or 0,
+                "ultima": datetime.fromtimestamp(int(ultima), timezone.utc) if ultima else None}
 
-        cur.execute("SELECT COUNT(*) AS total FROM tickets")
-        total = (cur.fetchone() or {}).get("total", 0)
+    def _stats_resumen_db(self) -> Dict[str, Any]:
+        cur = self.db.cursor()
+        cur.execute("SELECT dimension, valor, total FROM ticket_stats")
+        rows = cur.fetchall() or []
+        cur.close()
 
-        cur.execute("SELECT estado, COUNT(*) c FROM tickets GROUP BY estado")
-        estados_rows = cur.fetchall() or []
-        estados = {r["estado"]: r["c"] for r in estados_rows}
+        res = {
+            "total": 0,
+            "estados": {},     # abierto, en_proceso, resuelto, cerrado
+            "tipos": {},       # preventivo, correctivo
+            "categorias": {},  # hardware, software, redes, otros
+        }
+        destino = {"estado": "estados", "tipo": "tipos", "categoria": "categorias"}
+        for r in rows:
+            if r["dimension"] == "total":
+                res["total"] = r["total"]
+            elif r["dimension"] in destino and r["total"]:
+                res[destino[r["dimension"]]][r["valor"]] = r["total"]
+        return res
 
-        cur.execute("SELECT tipo, COUNT(*) c FROM tickets GROUP BY tipo")
-        tipos_rows = cur.fetchall() or []
-        tipos = {r["tipo"]: r["c"] for r in tipos_rows}
+    def reconstruir_stats(self):
+        """Recalcula ticket_stats desde tickets (reconciliación; ver rebuild_stats.py)."""
+        cur = self.db.cursor()
+        try:
+            # La versión se conserva (y sube): un ETag viejo no debe volver a valer
+            cur.execute("DELETE FROM ticket_stats WHERE dimension <> 'version'")
+            self._aplicar_deltas_stats(cur, {})
+            cur.execute("""
+                INSERT INTO ticket_stats (dimension, valor, total)
+                SELECT 'total', '', COUNT(*) FROM tickets
+            """)
+            for dim in self.DIMENSIONES_STATS:
+                cur.execute(f"""
+                    INSERT INTO ticket_stats (dimension, valor, total)
+                    SELECT '{dim}', {dim}, COUNT(*) FROM tickets
+                    WHERE {dim} IS NOT NULL GROUP BY {dim}
+                """)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        finally:
+            cur.close()
+        self.cache.clear()
 
-        cur.execute("SELECT categoria, COUNT(*) c FROM tickets GROUP BY categoria")
-        cat_rows = cur.fetchall() or []
-        categorias = {r["categoria"]: r["c"] for r in cat_rows}
+    # ---------- INVALIDACIÓN DE CACHÉ ----------
+    @classmethod
+    def _filtros_admiten(cls, filtros: Dict[str, Any], valores: Dict[str, Any]) -> bool:
+        """¿Un ticket con estos valores podría aparecer en un listado con estos filtros?"""
+        for campo in (*cls.FILTROS_ENUM, 'usuario_id'):
+            f = filtros.get(campo)
+            if f and str(valores.get(campo)) not in str(f).split(','):
+                return False
+        return True
 
-        cur.close()
-        return {
-            "total": total,
-            "estados": estados,       # abierto, en_proceso, resuelto, cerrado
-            "tipos": tipos,           # preventivo, correctivo
-            "categorias": categorias  # hardware, software, redes, otros
-        }
+    def _invalidar_por_alta(self, *valores: Dict[str, Any]):
+        # Un ticket nuevo es el más reciente: sólo afecta a primeras páginas compatibles
+        def pred(clave, meta):
+            if meta.get("ns") == "stats":
+                return True
+            return (meta.get("ns") == "tickets" and not meta.get("cursor")
+                    and any(self._filtros_admiten(meta.get("filtros") or {}, v) for v in valores))
+        self.cache.invalidate(pred)
+
+    def _invalidar_por_cambio(self, ticket_ids, campos):
+        ids, campos = set(ticket_ids), set(campos)
+        stats_cambia = bool(campos & set(self.DIMENSIONES_STATS))
+
+        def pred(clave, meta):
+            if meta.get("ns") == "stats":
+                return stats_cambia
+            if meta.get("ns") != "tickets":
+                return False
+            # Páginas que lo muestran, o filtradas por un campo que cambió (puede entrar/salir)
+            return bool(ids & set(meta.get("ids") or ())) or bool(campos & set(meta.get("filtros") or {}))
+        self.cache.invalidate(pred)
 
     # ---------- TICKETS ----------
     def crear_ticket(self, usuario_id, titulo, descripcion, categoria, tipo,
                      nombre=None, telefono=None, domicilio=None,
-                     prioridad='media', estado='abierto') -> int:
+                     prioridad='media', estado='abierto', duplicado_de=None) -> int:
+        """duplicado_de: id del ticket abierto del que éste es probable duplicado (dedup.py)."""
+        cur = self.db.cursor()
+        try:
+            cur.execute("""
+                INSERT INTO tickets
+                (usuario_id, nombre, telefono, domicilio, titulo, descripcion,
+                 categoria, tipo, prioridad, estado, duplicado_de)
+                VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+            """, (usuario_id, nombre, telefono, domicilio,
+                  titulo, descripcion, categoria, tipo, prioridad, estado, duplicado_de))
+            tid = cur.lastrowid
+            self._aplicar_deltas_stats(cur, {
+                ('total', ''): 1, ('estado', estado): 1,
+                ('tipo', tipo): 1, ('categoria', categoria): 1,
+            })
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        finally:
+            cur.close()
+        self._invalidar_por_alta({'estado': estado, 'prioridad': prioridad, 'categoria': categoria,
+                                  'tipo': tipo, 'usuario_id': usuario_id})
+        self._notificar('alta', [tid])
+        return tid
+
+    COLUMNAS_ALTA = ('usuario_id', 'nombre', 'telefono', 'domicilio', 'titulo', 'descripcion',
+                     'categoria', 'tipo', 'prioridad', 'estado', 'duplicado_de')
+
+    def crear_tickets_bulk(self, filas, chunk_size: int = 500) -> List[Dict[str, Any]]:
+        """
+        Alta masiva. Valida todas las filas y las inserta con INSERT multi-fila
+        (executemany) en transacciones de chunk_size filas, con los contadores de
+        ticket_stats en la misma transacción.
+        Devuelve un resultado por fila de entrada: {"index", "ticket_id"} o {"index", "error"}.
+        """
+        resultados: List[Dict[str, Any]] = []
+        validas = []
+        for i, data in enumerate(filas):
+            try:
+                validas.append((i, normalizar_ticket(data)))
+            except ValueError as e:
+                resultados.append({"index": i, "error": str(e)})
+        malas = self._referencias_inexistentes(validas)
+        resultados.extend({"index": i, "error": e} for i, e in malas.items())
+        validas = [(i, t) for i, t in validas if i not in malas]
+
+        columnas = (*self.COLUMNAS_ALTA, 'lote_alta')
+        sql = (f"INSERT INTO tickets ({', '.join(columnas)}) "
+               f"VALUES ({', '.join(['%s'] * len(columnas))})")
+        creados, ids_creados = [], []
+        for inicio in range(0, len(validas), chunk_size):
+            chunk = validas[inicio:inicio + chunk_size]
+            deltas: Dict[Tuple[str, str], int] = {('total', ''): len(chunk)}
+            for _, t in chunk:
+                for d in self.DIMENSIONES_STATS:
+                    deltas[(d, t[d])] = deltas.get((d, t[d]), 0) + 1
+            lote = uuid.uuid4().hex
+            cur = self.db.cursor()
+            try:
+                cur.executemany(sql, [(*(t[c] for c in self.COLUMNAS_ALTA), lote) for _, t in chunk])
+                # Los ids se releen por la marca del lote (migración 10): no se
+                # suponen consecutivos. Dentro de un INSERT crecen en el orden de las filas.
+                cur.execute("SELECT id FROM tickets WHERE lote_alta = %s ORDER BY id", (lote,))
+                ids = [f["id"] for f in cur.fetchall()]
+                if len(ids) != len(chunk):
+                    raise RuntimeError(f"el lote {lote} devolvió {len(ids)} ids para {len(chunk)} filas")
+                self._aplicar_deltas_stats(cur, deltas)
+                self.db.commit()
+            except Exception:
+                self.db.rollback()
+                cur.close()
+                # Chunk rechazado: se reintenta fila a fila para aislar las malas
+                for i, t in chunk:
+                    try:
+                        tid = self.crear_ticket(**t)
+                        resultados.append({"index": i, "ticket_id": tid})
+                    except Exception as e:
+                        resultados.append({"index": i, "error": str(e)})
+                continue
+            cur.close()
+            for tid, (i, t) in zip(ids, chunk):
+                resultados.append({"index": i, "ticket_id": tid})
+            creados.extend(t for _, t in chunk)
+            ids_creados.extend(ids)
+
+        if creados:
+            distintos = {tuple((c, t[c]) for c in (*self.FILTROS_ENUM, 'usuario_id')) for t in creados}
+            self._invalidar_por_alta(*(dict(d) for d in distintos))
+            self._notificar('alta', ids_creados)
+        resultados.sort(key=lambda r: r["index"])
+        return resultados
+
+    def _referencias_inexistentes(self, validas: List[Tuple[int, Dict[str, Any]]]) -> Dict[int, str]:
+        """
+        usuario_id y duplicado_de que no existen, comprobados con una consulta
+        por tabla: {index: error}. Así una referencia mala no tumba el
+        INSERT de todo su chunk.
+        """
+        existen = {}
+        cur = self.db.cursor()
+        try:
+            for campo, tabla in (('usuario_id', 'usuarios'), ('duplicado_de', 'tickets')):
+                pedidos = sorted({t[campo] for _, t in validas if t[campo] is not None})
+                existen[campo] = set()
+                for inicio in range(0, len(pedidos), 1000):
+                    parte = pedidos[inicio:inicio + 1000]
+                    cur.execute(f"SELECT id FROM {tabla} WHERE id IN ({', '.join(['%s'] * len(parte))})",
+                                parte)
+                    existen[campo].update(f["id"] for f in cur.fetchall())
+        finally:
+            cur.close()
+        malas = {}
+        for i, t in validas:
+            for campo in ('usuario_id', 'duplicado_de'):
+                if t[campo] is not None and t[campo] not in existen[campo]:
+                    malas[i] = f"{campo} inexistente: {t[campo]}"
+        return malas
+
+    CAMPOS_EDITABLES = {
+        'estado', 'prioridad', 'notas_admin', 'asignado_admin', 'solucion_ia',
+        'tipo', 'categoria', 'titulo', 'descripcion', 'nombre', 'telefono', 'domicilio',
+        'triage_estado', 'duplicado_de',
+    }
+
+    def actualizar_ticket(self, ticket_id, **updates):
+        self.actualizar_tickets([(ticket_id, updates)])
+
+    def actualizar_tickets(self, cambios) -> Dict[str, List[int]]:
+        """
+        Aplica muchos cambios [(ticket_id, {campo: valor}), ...] en UNA transacción.
+        Los tickets con el mismo conjunto de cambios se actualizan con un único
+        UPDATE ... WHERE id IN (...). Devuelve {"actualizados": [...], "no_encontrados": [...]}.
+        """
+        por_id: Dict[int, Dict[str, Any]] = {}
+        for ticket_id, updates in cambios:
+            limpios = {k: v for k, v in updates.items() if k in self.CAMPOS_EDITABLES}
+            if limpios:
+                por_id.setdefault(int(ticket_id), {}).update(limpios)
+        if not por_id:
+            return {"actualizados": [], "no_encontrados": []}
+
+        ids = sorted(por_id)
+        cur = self.db.cursor()
+        try:
+            # Bloquea todas las filas en orden de id (evita interbloqueos entre lotes)
+            # y trae los valores previos para los deltas de ticket_stats
+            cur.execute(
+                f"SELECT id, estado, tipo, categoria FROM tickets "
+                f"WHERE id IN ({', '.join(['%s'] * len(ids))}) ORDER BY id FOR UPDATE", ids)
+            antes = {r['id']: r for r in cur.fetchall()}
+
+            grupos: Dict[Tuple, List[int]] = {}
+            for tid in ids:
+                if tid in antes:
+                    clave = tuple(sorted(por_id[tid].items()))
+                    grupos.setdefault(clave, []).append(tid)
+            for clave, tids in grupos.items():
+                cur.execute(
+                    f"UPDATE tickets SET {', '.join(f'{k}=%s' for k, _ in clave)} "
+                    f"WHERE id IN ({', '.join(['%s'] * len(tids))})",
+                    [v for _, v in clave] + tids)
+
+            deltas: Dict[Tuple[str, str], int] = {}
+            for tid, previo in antes.items():
+                for d in self.DIMENSIONES_STATS:
+                    nuevo = por_id[tid].get(d, previo[d])
+                    if nuevo != previo[d]:
+                        deltas[(d, previo[d])] = deltas.get((d, previo[d]), 0) - 1
+                        deltas[(d, nuevo)] = deltas.get((d, nuevo), 0) + 1
+            self._aplicar_deltas_stats(cur, deltas)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        finally:
+            cur.close()
+
+        actualizados = sorted(antes)
+        campos = {k for tid in actualizados for k in por_id[tid]}
+        if actualizados:
+            self._invalidar_por_cambio(actualizados, campos)
+            self._notificar('cambio', actualizados, campos)
+        return {"actualizados": actualizados,
+                "no_encontrados": [tid for tid in ids if tid not in antes]}
+
+    # ---------- TRIAGE IA (ver triage.py) ----------
+    def reclamar_triage(self, ticket_id) -> Optional[Dict[str, Any]]:
+        """
+        Marca el ticket 'procesando' si seguía 'pendiente' y devuelve lo que
+        necesita la IA. None si otro worker (u otro proceso) ya lo tomó.
+        """
+        cur = self.db.cursor()
+        try:
+            cur.execute("""
+                UPDATE tickets SET triage_estado='procesando', triage_intentos=triage_intentos+1
+                WHERE id=%s AND triage_estado='pendiente'
+            """, (ticket_id,))
+            if cur.rowcount != 1:
+                self.db.commit()
+                return None
+            cur.execute("SELECT id, descripcion, categoria, triage_intentos FROM tickets WHERE id=%s",
+                        (ticket_id,))
+            row = cur.fetchone()
+            self.db.commit()
+            return row
+        except Exception:
+            self.db.rollback()
+            raise
+        finally:
+            cur.close()
+
+    def devolver_triage(self, ticket_id) -> bool:
+        """Deshace reclamar_triage sin gastar el intento (la IA no llegó a llamarse)."""
         cur = self.db.cursor()
         cur.execute("""
-            INSERT INTO tickets
-            (usuario_id, nombre, telefono, domicilio, titulo, descripcion,
-             categoria, tipo, prioridad, estado)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-        """, (usuario_id, nombre, telefono, domicilio,
-              titulo, descripcion, categoria, tipo, prioridad, estado))
+            UPDATE tickets SET triage_estado='pendiente', triage_intentos=triage_intentos-1
+            WHERE id=%s AND triage_estado='procesando' AND triage_intentos > 0
+        """, (ticket_id,))
+        n = cur.rowcount
         self.db.commit()
-        tid = cur.lastrowid
         cur.close()
-        return tid
+        return n == 1
 
-    def actualizar_ticket(self, ticket_id, **updates):
-        permitidos = {
-            'estado', 'prioridad', 'notas_admin', 'asignado_admin', 'solucion_ia',
-            'tipo', 'categoria', 'titulo', 'descripcion', 'nombre', 'telefono', 'domicilio'
-        }
-        sets, vals = [], []
-        for k, v in updates.items():
-            if k in permitidos:
-                sets.append(f"{k}=%s")
-                vals.append(v)
-        if not sets:
-            return
-        vals.append(ticket_id)
+    def posponer_triage(self, ticket_id, segundos: int):
+        """Vuelve a 'pendiente' pero ningún proceso lo recoge antes de `segundos` (espera del reintento)."""
         cur = self.db.cursor()
-        cur.execute(f"UPDATE tickets SET {', '.join(sets)} WHERE id=%s", vals)
+        cur.execute("""
+            UPDATE tickets SET triage_estado='pendiente',
+                   triage_reintentar_en = NOW() + INTERVAL %s SECOND
+            WHERE id=%s
+        """, (int(segundos), ticket_id))
         self.db.commit()
         cur.close()
 
-    def obtener_tickets(self, admin=False, usuario_id: Optional[int]=None):
+    def tickets_pendientes_triage(self, limit: int = 500) -> List[int]:
+        """Los 'pendiente' cuya espera de reintento (si la hay) ya pasó."""
         cur = self.db.cursor()
-        base = """
-          SELECT id, usuario_id, nombre, telefono, domicilio,
-                 titulo, descripcion, categoria, tipo,
-                 prioridad, estado, asignado_admin, solucion_ia,
-                 notas_admin, fecha_creacion
-          FROM tickets
+        cur.execute("""
+            SELECT id FROM tickets
+            WHERE triage_estado='pendiente'
+              AND (triage_reintentar_en IS NULL OR triage_reintentar_en <= NOW())
+            ORDER BY id LIMIT %s""", (limit,))
+        ids = [r['id'] for r in cur.fetchall()]
+        cur.close()
+        return ids
+
+    def liberar_triage_vencidos(self, minutos: int = 10) -> int:
+        """Devuelve a 'pendiente' los que quedaron 'procesando' (proceso caído a mitad)."""
+        cur = self.db.cursor()
+        cur.execute("""
+            UPDATE tickets SET triage_estado='pendiente'
+            WHERE triage_estado='procesando'
+              AND fecha_actualizacion < NOW() - INTERVAL %s MINUTE
+        """, (minutos,))
+        n = cur.rowcount
+        self.db.commit()
+        cur.close()
+        return n
+
+    def _where_filtros(self, filtros) -> Tuple[List[str], List[Any]]:
+        """
+        Traduce filtros (dict o request.args) a condiciones SQL.
+        estado/prioridad/categoria/tipo aceptan varios valores separados por coma;
+        desde/hasta filtran fecha_creacion; usuario_id por dueño.
+        """
+        where, params = [], []
+        filtros = filtros or {}
+        for campo, validos in self.FILTROS_ENUM.items():
+            valor = filtros.get(campo)
+            if not valor:
+                continue
+            valores = [v.strip() for v in str(valor).split(',') if v.strip()]
+            malos = [v for v in valores if v not in validos]
+            if malos:
+                raise ValueError(f"{campo} inválido: {', '.join(malos)}")
+            if len(valores) == 1:
+                where.append(f"{campo}=%s")
+            else:
+                where.append(f"{campo} IN ({', '.join(['%s'] * len(valores))})")
+            params.extend(valores)
+
+        if filtros.get('usuario_id'):
+            try:
+                params.append(int(filtros.get('usuario_id')))
+            except (TypeError, ValueError):
+                raise ValueError("usuario_id inválido")
+            where.append("usuario_id=%s")
+        if filtros.get('desde'):
+            where.append("fecha_creacion >= %s")
+            params.append(_parse_fecha(filtros.get('desde')))
+        if filtros.get('hasta'):
+            where.append("fecha_creacion < %s")
+            params.append(_parse_fecha(filtros.get('hasta'), fin=True))
+        return where, params
+
+    def _filtros_dict(self, filtros) -> Dict[str, str]:
+        """Sólo los filtros conocidos, como dict plano (request.args incluido)."""
+        return {k: str(filtros.get(k)) for k in
+                (*self.FILTROS_ENUM, 'usuario_id', 'desde', 'hasta')
+                if filtros.get(k)} if filtros else {}
+
+    def _sql_tickets(self, filtros=None, cursor: Optional[str] = None,
+                     limit: Optional[int] = None) -> Tuple[str, List[Any]]:
+        """SELECT del listado en orden (fecha_creacion, id) DESC, con keyset opcional."""
+        where, params = self._where_filtros(filtros)
+        if cursor:
+            fecha, tid = decode_cursor(cursor)
+            where.append("(fecha_creacion < %s OR (fecha_creacion = %s AND id < %s))")
+            params.extend([fecha, fecha, tid])
+        sql = self.COLUMNAS_LISTADO
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY fecha_creacion DESC, id DESC"
+        if limit:
+            sql += " LIMIT %s"
+            params.append(limit)
+        return sql, params
+
+    def obtener_tickets(self, admin=False, usuario_id: Optional[int] = None,
+                        filtros=None, cursor: Optional[str] = None,
+                        limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Página de tickets (más nuevos primero).
+        Devuelve {"tickets": [...], "next_cursor": str|None}; next_cursor se pasa
+        tal cual para pedir la página siguiente. Sin admin sólo ve los de usuario_id.
         """
-        if admin or not usuario_id:
-            cur.execute(base + " ORDER BY fecha_creacion DESC")
-        else:
-            cur.execute(base + " WHERE usuario_id=%s ORDER BY fecha_creacion DESC", (usuario_id,))
+        filtros = self._filtros_dict(filtros)
+        if not admin and usuario_id:
+            filtros['usuario_id'] = str(usuario_id)
+        limit = max(1, min(int(limit or PAGE_SIZE), MAX_PAGE_SIZE))
+
+        def cargar():
+            # Se pide una fila de más para saber si hay página siguiente
+            sql, params = self._sql_tickets(filtros, cursor, limit + 1)
+            cur = self.db.cursor()
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+            cur.close()
+
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                last = rows[-1]
+                next_cursor = encode_cursor(last['fecha_creacion'], last['id'])
+            return {"tickets": rows, "next_cursor": next_cursor}
+
+        # meta: lo que necesitan las invalidaciones para decidir si esta página cae
+        return self.cache.get_or_load(
+            QueryCache.key("tickets", filtros, cursor, limit), cargar,
+            lambda pagina: {"ns": "tickets", "filtros": filtros, "cursor": cursor,
+                            "ids": [t['id'] for t in pagina["tickets"]]})
+
+    def exportar_tickets(self, filtros=None, lote: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Todos los tickets que cumplen `filtros`, en el orden del listado, fila a
+        fila. Usa una conexión propia del pool y un cursor sin buffer: las filas
+        se leen del socket de lote en lote, así la memoria no depende del total
+        y la primera fila sale en cuanto MySQL la envía.
+        Los filtros se validan al llamar (ValueError), no al empezar a iterar.
+        """
+        sql, params = self._sql_tickets(self._filtros_dict(filtros))
+        return self._recorrer(sql, params, lote)
+
+    def _recorrer(self, sql: str, params: List[Any], lote: int) -> Iterator[Dict[str, Any]]:
+        cnx = self.db.acquire()
+        completo = False
+        try:
+            cur = cnx.cursor(dictionary=True, buffered=False)
+            # El servidor espera a que leamos; con un cliente lento el límite
+            # por defecto (60 s) cortaría la exportación a medias
+            cur.execute("SET SESSION net_write_timeout = %s", (EXPORT_NET_TIMEOUT,))
+            cur.execute(sql, params)
+            while True:
+                filas = cur.fetchmany(lote)
+                if not filas:
+                    break
+                yield from filas
+            cur.execute("SET SESSION net_write_timeout = DEFAULT")
+            cur.close()
+            completo = True
+        finally:
+            # Cortada a medias (cliente desconectado) la conexión aún tiene
+            # filas pendientes en el socket: se cierra en vez de reutilizarla
+            self.db.release(cnx, discard=not completo)
+
+    def cambios_desde(self, ts: int, limit: int = 500) -> List[Dict[str, Any]]:
+        """
+        Tickets con fecha_actualizacion >= ts (unix), por idx_tickets_actualizacion,
+        en orden de modificación; cada fila lleva `ts`. Lo usa feed.py.
+        """
+        cur = self.db.cursor()
+        cur.execute(f"""
+            SELECT {self.CAMPOS_LISTADO}, UNIX_TIMESTAMP(fecha_actualizacion) AS ts
+            FROM tickets WHERE fecha_actualizacion >= FROM_UNIXTIME(%s)
+            ORDER BY fecha_actualizacion, id LIMIT %s""", (ts, limit))
         rows = cur.fetchall()
         cur.close()
         return rows
+
+    # ---------- BÚSQUEDA DE TEXTO ----------
+    def buscar_texto(self, q: str, filtros=None, limit: Optional[int] = None,
+                     offset: int = 0) -> Dict[str, Any]:
+        """
+        MATCH ... AGAINST sobre el índice FULLTEXT, más relevantes primero.
+        Devuelve {"tickets": [... + relevancia], "next_offset": int|None}.
+        Sin índice FULLTEXT, MySQL lanza ER_FT_MATCHING_KEY_NOT_FOUND (ver search.py).
+        """
+        limit = max(1, min(int(limit or PAGE_SIZE), MAX_PAGE_SIZE))
+        where, params = self._where_filtros(self._filtros_dict(filtros))
+        match = f"MATCH({self.COLUMNAS_TEXTO}) AGAINST (%s IN NATURAL LANGUAGE MODE)"
+        sql = (f"SELECT {self.CAMPOS_LISTADO}, {match} AS relevancia FROM tickets "
+               f"WHERE {' AND '.join([match] + where)} "
+               "ORDER BY relevancia DESC, id DESC LIMIT %s OFFSET %s")
+        cur = self.db.cursor()
+        cur.execute(sql, [q, q, *params, limit + 1, offset])
+        rows = cur.fetchall()
+        cur.close()
+        next_offset = offset + limit if len(rows) > limit else None
+        return {"tickets": rows[:limit], "next_offset": next_offset}
+
+    def obtener_por_ids(self, ids: List[int], filtros=None) -> List[Dict[str, Any]]:
+        """Tickets con esos ids (que cumplan filtros), en el orden de `ids`."""
+        if not ids:
+            return []
+        where, params = self._where_filtros(self._filtros_dict(filtros))
+        where.insert(0, f"id IN ({', '.join(['%s'] * len(ids))})")
+        cur = self.db.cursor()
+        cur.execute(self.COLUMNAS_LISTADO + " WHERE " + " AND ".join(where), [*ids, *params])
+        por_id = {r['id']: r for r in cur.fetchall()}
+        cur.close()
+        return [por_id[i] for i in ids if i in por_id]
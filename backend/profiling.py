@@ -0,0 +1,159 @@
+# backend/profiling.py
+"""
+Perfilado bajo demanda de peticiones en producción (cProfile).
+
+Apagado salvo PROFILE_ENABLED=1. Entonces se perfila una petición si:
+- la pide un admin con la cabecera `X-Profile: 1` o `?_profile=1`, o
+- cae en la muestra aleatoria PROFILE_SAMPLE_RATE (0..1, por defecto 0).
+
+Sólo una petición a la vez por proceso (las demás siguen sin perfilar) y sólo
+el trabajo de la vista: consultas de TicketModel, render de plantillas,
+llamadas a AIAgent... no el cuerpo de una respuesta en streaming, que se
+genera después. Cada perfil se guarda en PROFILE_DIR como archivo .prof
+(pstats; se abre con `python -m pstats` o snakeviz) y se conservan los
+PROFILE_MAX más recientes. El panel los lista en /admin/profiles.
+"""
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+_NOMBRE = re.compile(r"^(\d+)-(\d+)-(\d+)-([\w.]+)\.prof$")
+
+
+class Perfilador:
+    def __init__(self, directorio: str = PROFILE_DIR, muestreo: float = 0.0, maximo: int = 50,
+                 activo: bool = False):
+        self.directorio = directorio
+        self.muestreo = muestreo
+        self.maximo = maximo
+        self.activo = activo
+        self._ocupado = threading.Lock()
+        self._stats = {"perfiles": 0, "omitidos": 0, "errores": 0}
+
+    @classmethod
+    def from_env(cls) -> "Perfilador":
+        """PROFILE_ENABLED, PROFILE_SAMPLE_RATE, PROFILE_DIR, PROFILE_MAX."""
+        return cls(directorio=os.getenv("PROFILE_DIR") or PROFILE_DIR,
+                   muestreo=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+                   maximo=int(os.getenv("PROFILE_MAX", "50")),
+                   activo=os.getenv("PROFILE_ENABLED", "0") == "1")
+
+    # ---------- petición ----------
+    def empezar(self, pedido: bool) -> Optional[cProfile.Profile]:
+        """Perfil en marcha para esta petición, o None si no toca o ya hay otro."""
+        if not self.activo or not (pedido or (self.muestreo and random.random() < self.muestreo)):
+            return None
+        if not self._ocupado.acquire(blocking=False):
+            self._stats["omitidos"] += 1
+            return None
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            # Otro perfilador activo en el proceso (p. ej. un depurador)
+            self._ocupado.release()
+            self._stats["omitidos"] += 1
+            return None
+        prof._t0 = time.perf_counter()
+        return prof
+
+    def terminar(self, prof: cProfile.Profile, ruta: str) -> Optional[str]:
+        """Detiene el perfil, lo guarda y devuelve el nombre del archivo."""
+        try:
+            prof.disable()
+            ms = int((time.perf_counter() - prof._t0) * 1000)
+            os.makedirs(self.directorio, exist_ok=True)
+            slug = re.sub(r"[^\w.]+", "_", ruta).strip("_") or "raiz"
+            nombre = f"{int(time.time() * 1000)}-{os.getpid()}-{ms}-{slug[:60]}.prof"
+            prof.dump_stats(os.path.join(self.directorio, nombre))
+            self._stats["perfiles"] += 1
+            self._podar()
+            return nombre
+        except OSError as e:
+            self._stats["errores"] += 1
+            print("Profiling: no se pudo guardar el perfil:", e)
+            return None
+        finally:
+            self._ocupado.release()
+
+    def _podar(self):
+        # Anillo: se borran los más viejos (de cualquier worker) por encima de PROFILE_MAX
+        archivos = sorted(f for f in os.listdir(self.directorio) if _NOMBRE.match(f))
+        for f in archivos[:max(len(archivos) - self.maximo, 0)]:
+            try:
+                os.remove(os.path.join(self.directorio, f))
+            except OSError:
+                pass     # otro worker ya lo borró
+
+    def instrumentar(self, app):
+        """Hooks de Flask: perfila la petición si toca y devuelve X-Profile-Id con el archivo."""
+        from flask import g, request, session
+
+        @app.before_request
+        def _perfil_inicio():
+            if not self.activo:
+                return
+            pedido = (request.headers.get("X-Profile") == "1" or request.args.get("_profile") == "1") \
+                and session.get("role") == "admin"
+            g._perfil = self.empezar(pedido)
+
+        @app.after_request
+        def _perfil_fin(resp):
+            prof = g.pop("_perfil", None)
+            if prof is not None:
+                nombre = self.terminar(prof, request.url_rule.rule if request.url_rule else request.path)
+                if nombre:
+                    resp.headers["X-Profile-Id"] = nombre
+            return resp
+
+        @app.teardown_request
+        def _perfil_error(exc):
+            # La vista lanzó una excepción: after_request no corrió
+            prof = g.pop("_perfil", None)
+            if prof is not None:
+                self.terminar(prof, request.path)
+
+    # ---------- consulta ----------
+    def listar(self) -> List[Dict[str, Any]]:
+        if not os.path.isdir(self.directorio):
+            return []
+        perfiles = []
+        for f in sorted(os.listdir(self.directorio), reverse=True):
+            m = _NOMBRE.match(f)
+            if m:
+                perfiles.append({"nombre": f, "fecha": int(m.group(1)) / 1000, "pid": int(m.group(2)),
+                                 "ms": int(m.group(3)), "ruta": m.group(4),
+                                 "bytes": os.path.getsize(os.path.join(self.directorio, f))})
+        return perfiles
+
+    def ruta_archivo(self, nombre: str) -> Optional[str]:
+        """Ruta de un perfil existente; None si el nombre no es de un perfil (sin ../)."""
+        if not _NOMBRE.match(nombre):
+            return None
+        ruta = os.path.join(self.directorio, nombre)
+        return ruta if os.path.isfile(ruta) else None
+
+    def resumen(self, nombre: str, orden: str = "cumulative", limite: int = 40) -> Optional[str]:
+        """Las `limite` funciones con más tiempo (texto de pstats)."""
+        ruta = self.ruta_archivo(nombre)
+        if ruta is None:
+            return None
+        if orden not in ("cumulative", "tottime", "ncalls"):
+            orden = "cumulative"
+        salida = io.StringIO()
+        st = pstats.Stats(ruta, stream=salida)
+        st.strip_dirs().sort_stats(orden).print_stats(limite)
+        return salida.getvalue()
+
+    def stats(self) -> Dict[str, Any]:
+        st = dict(self._stats)
+        st.update(activo=self.activo, muestreo=self.muestreo, maximo=self.maximo,
+                  directorio=self.directorio, en_curso=self._ocupado.locked())
+        return st
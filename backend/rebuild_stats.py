@@ -0,0 +1,10 @@
+# rebuild_stats.py (ejecútalo:  python rebuild_stats.py)
+# Reconcilia ticket_stats con la tabla tickets si los contadores se desviaron
+# (p. ej. tras editar filas a mano en MySQL).
+from models import Database, TicketModel
+
+db = Database.from_env()
+m = TicketModel(db)
+with db.connection():
+    m.reconstruir_stats()
+    print("Stats reconstruidas:", m.stats_resumen())
@@ -2,7 +2,7 @@
 from werkzeug.security import generate_password_hash
 from models import Database, TicketModel
 
-db = Database()
+db = Database.from_env()
 m = TicketModel(db)
 h = generate_password_hash("admin123", method="pbkdf2:sha256")
 m.force_admin_password("admin", h, "Administrador", "admin@soporte.com")
@@ -0,0 +1,431 @@
+# backend/retrieval.py
+"""
+Búsqueda BM25 sobre tickets resueltos/cerrados para contestar el chat sin IA.
+
+Se indexan titulo + descripcion de los tickets 'resuelto'/'cerrado' que tienen
+solucion_ia (las notas_admin son internas y nunca se devuelven por el chat).
+Si la mejor coincidencia supera RETRIEVAL_MIN_SCORE (BM25 dividido por el de
+un documento de largo medio que contiene una vez cada término: ~0..1 y no
+depende del tamaño del corpus) y cubre suficientes palabras de la consulta,
+el chat responde con esa solución, sin el id del ticket, y no llama al modelo.
+
+Índice:
+- base: archivo RETRIEVAL_PATH (cabecera + JSON con léxico/documentos +
+  postings uint32 (doc, tf)) que se abre con mmap al arrancar; las listas de
+  postings no se copian a memoria.
+- delta: tickets cambiados desde que se escribió el archivo, en memoria, con
+  lápidas para los documentos de la base que ya no valen. Cada
+  RETRIEVAL_COMPACTAR cambios se fusiona todo en un archivo nuevo (os.replace).
+
+Un hilo por proceso mantiene el índice al día leyendo los tickets con
+fecha_actualizacion posterior a la marca de agua (índice de la migración 6);
+los oyentes de TicketModel sólo lo despiertan, así el alta/edición no paga nada
+y los cambios hechos por otros workers también llegan.
+"""
+import array
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from intents import plegar
+
+ESTADOS_INDEXADOS = ('resuelto', 'cerrado')
+CAMPOS_INDEXADOS = {'estado', 'titulo', 'descripcion', 'notas_admin', 'solucion_ia'}
+RETRIEVAL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "retrieval.idx")
+
+STOPWORDS = set("""
+a al algo ante aun con como cual de del desde donde el ella en entre era es esa ese eso esta
+este esto fue ha hace han hay la las le les lo los me mi mis muy ni no nos o otra otro para
+pero por porque que se si sin sobre su sus te tengo tiene tu un una uno unos y ya yo
+""".split())
+
+_MAGIC = b"BM25IDX1"
+_CABECERA = struct.Struct("<8sQ")
+
+
+def tokens(texto: Optional[str]) -> List[str]:
+    salida = []
+    for t in plegar(texto or "").split():
+        if len(t) < 2 or t in STOPWORDS:
+            continue
+        if len(t) > 4 and t.endswith("s"):   # plural simple: impresoras -> impresora
+            t = t[:-1]
+        salida.append(t)
+    return salida
+
+
+class _Base:
+    """Índice en disco, de sólo lectura (postings vía mmap)."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.ids: List[int] = []
+        self.largos = array.array("I")
+        self.terminos: Dict[str, List[int]] = {}    # término -> [offset, df]
+        self.suma_largos = 0
+        self.watermark: Optional[str] = None
+        self.postings = memoryview(array.array("I"))
+        self._mm = None
+        if path and os.path.exists(path):
+            self._abrir(path)
+        self.posicion = {tid: i for i, tid in enumerate(self.ids)}
+
+    def _abrir(self, path: str):
+        with open(path, "rb") as f:
+            # En Windows un archivo mapeado no se puede reemplazar con os.replace
+            mm = f.read() if os.name == "nt" else mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, largo_meta = _CABECERA.unpack_from(mm, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} no es un índice BM25")
+        ini = _CABECERA.size
+        meta = json.loads(mm[ini:ini + largo_meta].decode("utf-8"))
+        inicio_post = ini + largo_meta + (-(ini + largo_meta) % 4)
+        self._mm = mm
+        self.postings = memoryview(mm)[inicio_post:].cast("I")
+        self.ids = meta["ids"]
+        self.largos = array.array("I", meta["largos"])
+        self.terminos = meta["terminos"]
+        self.suma_largos = sum(self.largos)
+        self.watermark = meta.get("watermark")
+
+    def lista(self, termino: str):
+        """Postings del término como memoryview [doc, tf, doc, tf, ...]."""
+        pos = self.terminos.get(termino)
+        if not pos:
+            return ()
+        off, df = pos
+        return self.postings[2 * off: 2 * (off + df)]
+
+    def cerrar(self):
+        """Suelta el mmap; se llama al reemplazar la base (con el lock, sin lecturas en curso)."""
+        self.postings.release()
+        self.postings = memoryview(array.array("I"))
+        if isinstance(self._mm, mmap.mmap):
+            try:
+                self._mm.close()
+            except BufferError:
+                pass    # queda una vista viva: lo cierra el recolector
+        self._mm = None
+
+
+def _escribir(path: str, ids: List[int], largos: List[int],
+              postings: Dict[str, List[Tuple[int, int]]], watermark: Optional[str]):
+    terminos, plano, off = {}, array.array("I"), 0
+    for t in sorted(postings):
+        lista = postings[t]
+        terminos[t] = [off, len(lista)]
+        for doc, tf in lista:
+            plano.append(doc)
+            plano.append(min(tf, 0xFFFFFFFF))
+        off += len(lista)
+    meta = json.dumps({"ids": ids, "largos": largos, "terminos": terminos,
+                       "watermark": watermark}, separators=(",", ":")).encode("utf-8")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_CABECERA.pack(_MAGIC, len(meta)))
+        f.write(meta)
+        f.write(b"\0" * (-(_CABECERA.size + len(meta)) % 4))
+        plano.tofile(f)
+    os.replace(tmp, path)   # atómico: otros procesos ven el archivo viejo o el nuevo
+
+
+class RetrievalIndex:
+    def __init__(self, db, path: str = RETRIEVAL_PATH, min_score: float = 0.6,
+                 min_cobertura: float = 0.6, intervalo: float = 10.0,
+                 compactar_cada: int = 1000, k1: float = 1.2, b: float = 0.75,
+                 estados: Optional[Tuple[str, ...]] = ESTADOS_INDEXADOS,
+                 campos: Tuple[str, ...] = ('titulo', 'descripcion'),
+                 requiere_solucion: bool = True):
+        """estados/campos/requiere_solucion definen qué se indexa (search.py indexa todo)."""
+        self.db = db
+        self.path = path
+        self.estados = estados
+        self.campos = campos
+        self.requiere_solucion = requiere_solucion
+        self.min_score = min_score
+        self.min_cobertura = min_cobertura
+        self.intervalo = intervalo
+        self.compactar_cada = compactar_cada
+        self.k1, self.b = k1, b
+        self._lock = threading.RLock()
+        self._despertar = threading.Event()
+        self._hilo = None
+        self._listo = False
+        self._base = _Base()
+        self._lapidas = set()                              # ids de la base ya no válidos
+        self._delta_docs: Dict[int, Dict[str, int]] = {}   # ticket -> {término: tf}
+        self._delta_post: Dict[str, Dict[int, int]] = {}   # término -> {ticket: tf}
+        self._delta_largos: Dict[int, int] = {}
+        self._fechas: Dict[int, Any] = {}                  # última fecha_actualizacion vista
+        self._suma = 0
+        self._watermark: Optional[datetime] = None
+        self._stats = {"consultas": 0, "aciertos": 0, "sincronizados": 0, "compactaciones": 0}
+
+    @classmethod
+    def from_env(cls, db) -> "RetrievalIndex":
+        """RETRIEVAL_PATH, RETRIEVAL_MIN_SCORE, RETRIEVAL_MIN_COBERTURA, RETRIEVAL_SYNC_SEG, RETRIEVAL_COMPACTAR."""
+        return cls(db,
+                   path=os.getenv("RETRIEVAL_PATH") or RETRIEVAL_PATH,
+                   min_score=float(os.getenv("RETRIEVAL_MIN_SCORE", "0.6")),
+                   min_cobertura=float(os.getenv("RETRIEVAL_MIN_COBERTURA", "0.6")),
+                   intervalo=float(os.getenv("RETRIEVAL_SYNC_SEG", "10")),
+                   compactar_cada=int(os.getenv("RETRIEVAL_COMPACTAR", "1000")))
+
+    # ---------- ciclo de vida ----------
+    def iniciar(self):
+        """Carga/construye el índice en un hilo de fondo (idempotente, tras el fork)."""
+        with self._lock:
+            if self._hilo:
+                return
+            self._hilo = threading.Thread(target=self._loop, daemon=True,
+                                          name="bm25-" + os.path.basename(self.path))
+            self._hilo.start()
+
+    def on_ticket(self, evento, ticket_ids, campos):
+        """Oyente de TicketModel.suscribir: adelanta la próxima sincronización."""
+        if evento == 'alta' or campos & CAMPOS_INDEXADOS:
+            self._despertar.set()
+
+    def _loop(self):
+        try:
+            self._cargar()
+        except Exception as e:
+            print("Retrieval: no se pudo cargar el índice:", e)
+            return
+        while True:
+            try:
+                self._sincronizar()
+                if len(self._delta_docs) + len(self._lapidas) >= self.compactar_cada:
+                    self._compactar()
+            except Exception as e:
+                print("Retrieval: error sincronizando:", e)
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+
+    def _cargar(self):
+        try:
+            base = _Base(self.path)
+        except (OSError, ValueError, KeyError) as e:
+            print("Retrieval: índice ilegible, se reconstruye:", e)
+            base = _Base()
+        if base.watermark:
+            with self._lock:
+                self._base.cerrar()
+                self._base = base
+                self._suma = base.suma_largos
+                self._watermark = datetime.fromisoformat(base.watermark)
+                self._listo = True
+            return
+        self._reconstruir()
+
+    def _reconstruir(self):
+        """Indexa todos los tickets resueltos desde la BD y escribe el archivo."""
+        t0 = time.time()
+        with self.db.connection():
+            cur = self.db.cursor()
+            cur.execute("SELECT NOW() AS ahora")
+            ahora = cur.fetchone()["ahora"]
+            ultimo = 0
+            filtro, params = "", []
+            if self.estados:
+                filtro = f"estado IN ({', '.join(['%s'] * len(self.estados))}) AND "
+                params = list(self.estados)
+            while True:
+                cur.execute(f"""
+                    SELECT id, titulo, descripcion, estado, notas_admin, solucion_ia, fecha_actualizacion
+                    FROM tickets WHERE {filtro}id > %s
+                    ORDER BY id LIMIT 2000""", (*params, ultimo))
+                filas = cur.fetchall()
+                if not filas:
+                    break
+                for fila in filas:
+                    self._aplicar(fila)
+                ultimo = filas[-1]["id"]
+            cur.close()
+        self._watermark = ahora
+        self._compactar()
+        self._listo = True
+        print(f"Retrieval: índice construido ({len(self._base.ids)} tickets, {time.time() - t0:.1f}s)")
+
+    # ---------- mantenimiento ----------
+    def _aplicar(self, fila: Dict[str, Any]):
+        tid = fila["id"]
+        indexable = ((not self.estados or fila.get("estado") in self.estados)
+                     and (not self.requiere_solucion
+                          or fila.get("solucion_ia")))
+        tf = Counter(tokens(" ".join(fila.get(c) or "" for c in self.campos))) \
+            if indexable else None
+        with self._lock:
+            self._quitar(tid)
+            if tf:
+                self._delta_docs[tid] = dict(tf)
+                for t, n in tf.items():
+                    self._delta_post.setdefault(t, {})[tid] = n
+                largo = sum(tf.values())
+                self._delta_largos[tid] = largo
+                self._suma += largo
+
+    def _quitar(self, tid: int):
+        idx = self._base.posicion.get(tid)
+        if idx is not None and tid not in self._lapidas:
+            self._lapidas.add(tid)
+            self._suma -= self._base.largos[idx]
+        viejo = self._delta_docs.pop(tid, None)
+        if viejo:
+            for t in viejo:
+                post = self._delta_post.get(t)
+                if post is not None:
+                    post.pop(tid, None)
+                    if not post:
+                        del self._delta_post[t]
+            self._suma -= self._delta_largos.pop(tid, 0)
+
+    def _sincronizar(self):
+        if self._watermark is None:
+            return
+        # Solape de 1 s: fecha_actualizacion tiene resolución de segundos
+        desde, ultimo_id = self._watermark - timedelta(seconds=1), 0
+        nuevo = self._watermark
+        with self.db.connection():
+            cur = self.db.cursor()
+            while True:
+                cur.execute("""
+                    SELECT id, titulo, descripcion, estado, notas_admin, solucion_ia, fecha_actualizacion
+                    FROM tickets
+                    WHERE fecha_actualizacion > %s OR (fecha_actualizacion = %s AND id > %s)
+                    ORDER BY fecha_actualizacion, id LIMIT 1000""", (desde, desde, ultimo_id))
+                filas = cur.fetchall()
+                for fila in filas:
+                    if self._fechas.get(fila["id"]) == fila["fecha_actualizacion"]:
+                        continue
+                    self._aplicar(fila)
+                    self._fechas[fila["id"]] = fila["fecha_actualizacion"]
+                    self._stats["sincronizados"] += 1
+                if filas:
+                    nuevo = max(nuevo, filas[-1]["fecha_actualizacion"])
+                if len(filas) < 1000:
+                    break
+                desde, ultimo_id = filas[-1]["fecha_actualizacion"], filas[-1]["id"]
+            cur.close()
+        self._watermark = nuevo
+
+    def _compactar(self):
+        """
+        Fusiona base (sin lápidas) + delta en un archivo nuevo y lo vuelve a abrir.
+        Sólo lo llama el hilo del índice, único que modifica el delta: se puede
+        leer sin lock y sólo el cambio de base final lo toma.
+        """
+        base, lapidas = self._base, set(self._lapidas)
+        ids, largos, nuevo_idx = [], [], {}
+        for i, tid in enumerate(base.ids):
+            if tid not in lapidas:
+                nuevo_idx[i] = len(ids)
+                ids.append(tid)
+                largos.append(base.largos[i])
+        delta_idx = {}
+        for tid, largo in self._delta_largos.items():
+            delta_idx[tid] = len(ids)
+            ids.append(tid)
+            largos.append(largo)
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for t in base.terminos:
+            lista = base.lista(t)
+            vivos = [(nuevo_idx[lista[j]], lista[j + 1]) for j in range(0, len(lista), 2)
+                     if lista[j] in nuevo_idx]
+            if vivos:
+                postings[t] = vivos
+        for t, docs in self._delta_post.items():
+            postings.setdefault(t, []).extend((delta_idx[tid], tf) for tid, tf in docs.items())
+        lista = None    # última vista sobre la base vieja, que se cierra abajo
+        watermark = self._watermark.isoformat() if self._watermark else None
+        _escribir(self.path, ids, largos, postings, watermark)
+        nueva = _Base(self.path)
+        with self._lock:
+            base.cerrar()
+            self._base = nueva
+            self._lapidas.clear()
+            self._delta_docs.clear()
+            self._delta_post.clear()
+            self._delta_largos.clear()
+            self._fechas.clear()
+            self._suma = nueva.suma_largos
+            self._stats["compactaciones"] += 1
+
+    # ---------- consultas ----------
+    def buscar(self, texto: str, k: int = 3) -> List[Dict[str, Any]]:
+        """
+        Los k mejores tickets: [{id, score, relevancia, cobertura}]. relevancia =
+        score / máximo posible de la consulta; cobertura = fracción de términos presentes.
+        """
+        consulta = set(tokens(texto))
+        if not consulta or not self._listo:
+            return []
+        with self._lock:
+            base, lapidas = self._base, self._lapidas
+            n_docs = len(base.ids) - len(lapidas) + len(self._delta_docs)
+            if n_docs <= 0:
+                return []
+            promedio = self._suma / n_docs
+            k1, b = self.k1, self.b
+            puntos: Dict[int, float] = {}
+            vistos: Dict[int, int] = {}
+            maximo = 0.0
+            for t in consulta:
+                lista = base.lista(t)
+                delta = self._delta_post.get(t, {})
+                df = len(lista) // 2 + len(delta)
+                if not df:
+                    continue
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                maximo += idf   # aporte de tf=1 en un documento de largo medio
+                for j in range(0, len(lista), 2):
+                    tid = base.ids[lista[j]]
+                    if tid in lapidas:
+                        continue
+                    tf, dl = lista[j + 1], base.largos[lista[j]]
+                    puntos[tid] = puntos.get(tid, 0.0) + idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / promedio))
+                    vistos[tid] = vistos.get(tid, 0) + 1
+                for tid, tf in delta.items():
+                    dl = self._delta_largos[tid]
+                    puntos[tid] = puntos.get(tid, 0.0) + idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / promedio))
+                    vistos[tid] = vistos.get(tid, 0) + 1
+        mejores = sorted(puntos.items(), key=lambda x: -x[1])[:k]
+        return [{"id": tid, "score": round(s, 3), "relevancia": round(s / maximo, 3),
+                 "cobertura": round(vistos[tid] / len(consulta), 3)}
+                for tid, s in mejores]
+
+    def mejor_respuesta(self, texto: str) -> Optional[Dict[str, Any]]:
+        """Solución del ticket más parecido si pasa los umbrales; None si hay que preguntar a la IA."""
+        with self._lock:
+            self._stats["consultas"] += 1
+        for hit in self.buscar(texto, k=3):
+            if hit["relevancia"] < self.min_score or hit["cobertura"] < self.min_cobertura:
+                break
+            with self.db.connection():
+                cur = self.db.cursor()
+                cur.execute("SELECT id, titulo, estado, solucion_ia FROM tickets WHERE id=%s",
+                            (hit["id"],))
+                fila = cur.fetchone()
+                cur.close()
+            # El índice puede ir unos segundos por detrás: se confirma contra la BD
+            if fila and fila["estado"] in ESTADOS_INDEXADOS and fila["solucion_ia"]:
+                with self._lock:
+                    self._stats["aciertos"] += 1
+                return {"id": fila["id"], "titulo": fila["titulo"], "score": hit["score"],
+                        "solucion": fila["solucion_ia"]}
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            st = dict(self._stats)
+            st.update(listo=self._listo, docs_base=len(self._base.ids), lapidas=len(self._lapidas),
+                      docs_delta=len(self._delta_docs), terminos_base=len(self._base.terminos),
+                      watermark=self._watermark.isoformat() if self._watermark else None)
+        st["tasa_aciertos"] = round(st["aciertos"] / st["consultas"], 4) if st["consultas"] else 0.0
+        return st
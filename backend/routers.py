@@ -1,45 +1,118 @@
 # backend/routers.py
+"""
+Rutas de la mesa de ayuda (blueprint) y create_app().
+
+Importar este módulo no abre conexiones ni ejecuta DDL: los servicios se
+construyen sin tocar la BD y el pool conecta con la primera petición, ya
+dentro de cada worker. Las migraciones y el admin por defecto se preparan una
+vez por despliegue con bootstrap.py (ver gunicorn.conf.py).
+
+    python routers.py                      # desarrollo (debug + reloader)
+    gunicorn -c gunicorn.conf.py           # producción (wsgi:app)
+"""
+import config  # noqa: F401  (carga .env antes que el resto de módulos)
+import hashlib
+import hmac
+import json
 import os
-from dotenv import load_dotenv
+import time
+import uuid
+from datetime import datetime
 
-load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
-
-from flask import Flask, request, jsonify, render_template, session, redirect, url_for, flash
+from flask import (Blueprint, Flask, current_app, request, jsonify, render_template, session,
+                   redirect, url_for, flash, Response, send_file, stream_with_context)
 from flask_cors import CORS
+from werkzeug.http import is_resource_modified
 from werkzeug.security import generate_password_hash, check_password_hash
 from models import Database, TicketModel
-
-from pathlib import Path
-# Carga .env tanto de /backend como de la raíz del proyecto
-here = Path(__file__).resolve().parent
-load_dotenv(here / '.env')
-load_dotenv(here.parent / '.env')
+from ai_agent import AIAgent
+from ai_cache import AICache
+from chat_sessions import ChatSessionStore
+from intents import IntentEngine
+from retrieval import RetrievalIndex
+from search import TicketSearch, BusquedaNoDisponible
+from dedup import DedupIndex
+from feed import ChangeFeed
+import export
+from triage import TriageWorker
+import bootstrap
+import metrics
+from profiling import Perfilador
 
 
 APP_ROOT = os.path.dirname(os.path.abspath(__file__))
 TEMPLATES_DIR = os.path.abspath(os.path.join(APP_ROOT, '../frontend'))
 
-app = Flask(__name__, template_folder=TEMPLATES_DIR, static_folder=TEMPLATES_DIR)
-app.secret_key = os.getenv("SECRET_KEY", "clave-secreta-por-defecto")
-CORS(app)
+bp = Blueprint('soporte', __name__)
 
 # DB & modelos
-db = Database()
-db.init_schema()
+db = Database.from_env()
 ticket_model = TicketModel(db)
 
-# ===== Admin por defecto =====
-def ensure_admin():
-    h = generate_password_hash("admin123", method="pbkdf2:sha256")
-    ticket_model.force_admin_password(
-        username="admin",
-        password_hash=h,
-        nombre="Administrador",
-        email="admin@soporte.com",  # si ya está usado por otro, se respeta el email actual del admin
-    )
-    print("== Admin listo: admin / admin123")
-
-ensure_admin()
+def release_db(exc):
+    # Cada petición devuelve su conexión al pool
+    db.end_request(exc)
+
+# IA con caché de respuestas (memoria + tabla ai_respuestas)
+ai_cache = AICache.from_env(db)
+ai_agent = AIAgent(cache=ai_cache)
+# Historial del chat en el servidor, con presupuesto de tokens (ver chat_sessions.py)
+chat_sessions = ChatSessionStore.from_env()
+# POST /chat (el respaldo sin streams) sólo llama a la IA si se pide: ocupa el hilo mientras espera
+CHAT_IA_SINCRONO = os.getenv("CHAT_IA_SINCRONO", "0") == "1"
+# Respuestas predefinidas: intents.json compilado una vez (ver intents.py)
+intent_engine = IntentEngine.from_env()
+
+# Triage IA asíncrono de los tickets nuevos (ver triage.py)
+triage = None
+if os.getenv("TRIAGE_ENABLED", "1" if os.getenv("OPENAI_API_KEY") else "0") == "1":
+    triage = TriageWorker.from_env(ticket_model, ai_agent)
+    ticket_model.suscribir(triage.on_ticket)
+
+# Soluciones de tickets resueltos reutilizadas en el chat (ver retrieval.py)
+retrieval = None
+if os.getenv("RETRIEVAL_ENABLED", "1") == "1":
+    retrieval = RetrievalIndex.from_env(db)
+    ticket_model.suscribir(retrieval.on_ticket)
+
+# Detección de duplicados al dar de alta (ver dedup.py)
+dedup = None
+if os.getenv("DEDUP_ENABLED", "1") == "1":
+    dedup = DedupIndex.from_env(db)
+    ticket_model.suscribir(dedup.on_ticket)
+
+# Cambios en vivo para el panel: un hilo por proceso, arranca con el primer cliente (ver feed.py)
+feed = ChangeFeed.from_env(ticket_model)
+
+# Perfilado bajo demanda de peticiones (PROFILE_ENABLED; ver profiling.py)
+perfilador = Perfilador.from_env()
+
+# Búsqueda de texto del panel: FULLTEXT de MySQL o índice local (ver search.py)
+ticket_search = TicketSearch.from_env(ticket_model)
+
+def iniciar_servicios():
+    # Los hilos de fondo se arrancan con el primer request, ya dentro del worker
+    if triage:
+        triage.iniciar()
+    if retrieval:
+        retrieval.iniciar()
+    ticket_search.iniciar()
+    if dedup:
+        dedup.iniciar()
+    metrics.iniciar_volcado()
+
+# ===== App =====
+def create_app() -> Flask:
+    """Crea la app Flask con las rutas del blueprint (una por worker, sin tocar la BD)."""
+    app = Flask(__name__, template_folder=TEMPLATES_DIR, static_folder=TEMPLATES_DIR)
+    app.secret_key = os.getenv("SECRET_KEY", "clave-secreta-por-defecto")
+    CORS(app)
+    app.register_blueprint(bp)
+    metrics.instrumentar(app)
+    perfilador.instrumentar(app)
+    app.before_request(iniciar_servicios)
+    app.teardown_appcontext(release_db)
+    return app
 
 # ===== Helpers =====
 def login_required(f):
@@ -47,7 +120,7 @@ def login_required(f):
     @wraps(f)
     def wrap(*a, **kw):
         if 'user_id' not in session:
-            return redirect(url_for('login'))
+            return redirect(url_for('.login'))
         return f(*a, **kw)
     return wrap
 
@@ -60,26 +133,65 @@ def admin_required(f):
         return f(*a, **kw)
     return wrap
 
+def admin_or_token_required(f):
+    # Para integraciones (correo, monitoreo): sesión admin o cabecera X-API-Token == INGEST_TOKEN
+    from functools import wraps
+    @wraps(f)
+    def wrap(*a, **kw):
+        token = os.getenv("INGEST_TOKEN")
+        # compare_digest: el tiempo de la comparación no revela cuántos caracteres coinciden
+        enviado = request.headers.get('X-API-Token') or ''
+        if session.get('role') == 'admin' or (token and hmac.compare_digest(enviado.encode(), token.encode())):
+            return f(*a, **kw)
+        return jsonify({'success': False, 'message': 'No autorizado.'}), 401
+    return wrap
+
+# ===== Caché HTTP condicional =====
+# El ETag de una vista sale de la marca de datos (contador de escrituras) más
+# sus parámetros y el usuario; si el cliente ya la tiene se contesta 304 sin
+# ejecutar el listado ni las stats. No se usa Last-Modified: fecha_actualizacion
+# tiene resolución de segundos y dos escrituras en el mismo segundo darían un
+# 304 con datos viejos.
+# Las plantillas también forman parte de la vista: un despliegue con HTML nuevo cambia el ETag
+_VERSION_PLANTILLAS = max(os.stat(os.path.join(TEMPLATES_DIR, f)).st_mtime_ns
+                          for f in os.listdir(TEMPLATES_DIR) if f.endswith('.html'))
+
+def etag_vista(marca, *partes):
+    clave = repr((marca['version'], _VERSION_PLANTILLAS, session.get('user_id'), partes)).encode()
+    return hashlib.blake2b(clave, digest_size=12).hexdigest()
+
+def con_validadores(resp, etag):
+    resp.set_etag(etag, weak=True)
+    # private: depende de la sesión; no-cache: revalidar siempre (barato con 304)
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp
+
+def no_modificado(etag):
+    """Respuesta 304 si If-None-Match ya corresponde a estos datos."""
+    if is_resource_modified(request.environ, etag=etag):
+        return None
+    return con_validadores(Response(status=304), etag)
+
 # ===== Páginas =====
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/perfil')
+@bp.route('/perfil')
 def perfil():
     if 'user_id' in session:
-        return redirect(url_for('admin'))
+        return redirect(url_for('.admin'))
     return render_template('login.html')
 
 # ⚠️ ÚNICA ruta de login (no tengas otra en el archivo)
-@app.route('/login', methods=['GET','POST'])
+@bp.route('/login', methods=['GET','POST'])
 def login():
     if request.method == 'POST':
         user_input = (request.form.get('username') or '').strip()
         password = request.form.get('password') or ''
         if not user_input or not password:
             flash("Completa usuario y contraseña.", "error")
-            return redirect(url_for('login', next=request.args.get('next')))
+            return redirect(url_for('.login', next=request.args.get('next')))
 
         user = ticket_model.obtener_usuario_por_username_o_email(user_input)
         print(f"DBG user_input: '{user_input}'")
@@ -99,59 +211,152 @@ def login():
 
         if not ok:
             flash("Usuario o contraseña incorrectos.", "error")
-            return redirect(url_for('login', next=request.args.get('next')))
+            return redirect(url_for('.login', next=request.args.get('next')))
 
         session['user_id'] = user['id']
         session['username'] = user['username']
         session['role'] = user['role']
-        return redirect(request.args.get('next') or url_for('admin'))
+        return redirect(request.args.get('next') or url_for('.admin'))
 
     return render_template('login.html')
 
 
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     session.clear()
-    return redirect(url_for('login'))
+    return redirect(url_for('.login'))
 
-@app.route('/admin')
+@bp.route('/admin')
 @login_required
 @admin_required
 def admin():
-    # stats opcional si lo tienes implementado, si no, quítalo
-    stats = {}
-    if hasattr(ticket_model, 'stats_resumen'):
-        stats = ticket_model.stats_resumen()
-    tickets = ticket_model.obtener_tickets(admin=True)
-    return render_template('admin.html', tickets=tickets, stats=stats)
+    marca = ticket_model.marca_datos()
+    etag = etag_vista(marca, 'admin', sorted(request.args.items(multi=True)))
+    # Con mensajes flash pendientes la página no es la misma que la guardada
+    if '_flashes' not in session:
+        resp = no_modificado(etag)
+        if resp:
+            return resp
+    stats = ticket_model.stats_resumen()
+    try:
+        pagina = ticket_model.obtener_tickets(admin=True, filtros=request.args,
+                                              cursor=request.args.get('cursor'))
+    except ValueError as e:
+        flash(str(e), "error")
+        pagina = ticket_model.obtener_tickets(admin=True)
+    filtros = {k: v for k, v in request.args.items() if k != 'cursor' and v}
+    # Una página con avisos (flash) se muestra una sola vez: no lleva validadores
+    con_avisos = '_flashes' in session
+    resp = current_app.make_response(render_template('admin.html', tickets=pagina['tickets'], stats=stats,
+                                             next_cursor=pagina['next_cursor'], filtros=filtros,
+                                             feed_cursor=ChangeFeed.cursor_inicial(marca)))
+    return resp if con_avisos else con_validadores(resp, etag)
 
 # ===== API mínima =====
-@app.route('/chat', methods=['POST'])
+def respuesta_predefinida(user_message):
+    """Respuesta fija del chat (sin IA). Devuelve (answer, ticket_required)."""
+    answer, ticket_required, _ = intent_engine.responder(user_message)
+    return answer, ticket_required
+
+def respuesta_recuperada(user_message):
+    """Solución de un ticket resuelto parecido, o None si hay que preguntar a la IA."""
+    if not retrieval:
+        return None
+    try:
+        hit = retrieval.mejor_respuesta(user_message)
+    except Exception as e:
+        print("Retrieval: error buscando:", e)
+        return None
+    if not hit:
+        return None
+    return f"Esto resolvió un caso parecido:\n{hit['solucion']}"
+
+def chat_id_actual():
+    """Id de la conversación del visitante, guardado en la cookie de sesión."""
+    if 'chat_id' not in session:
+        session['chat_id'] = uuid.uuid4().hex
+    return session['chat_id']
+
+@bp.route('/chat', methods=['POST'])
 def chat():
     data = request.get_json(silent=True) or {}
     user_message = (data.get('message') or '').strip()
     if not user_message:
         return jsonify({"answer": "¿Podrías escribir tu consulta técnica?", "ticket_required": False}), 200
-    m = user_message.lower()
-    gatillos = ["lento","lenta","ticket","soporte","no enciende","pantalla azul","ssd","disco"]
-    ticket_required = any(g in m for g in gatillos)
-    pasos = (
-        "Prueba esto:\n"
-        "1) Reinicia y aplica actualizaciones.\n"
-        "2) Desinstala programas que no uses.\n"
-        "3) Limpia temporales (Win+R → cleanmgr).\n"
-        "4) Revisa el Administrador de tareas.\n"
-        "5) Escanea con antivirus."
-    )
-    if "lento" in m or "lenta" in m:
-        answer = "Entiendo, tu equipo está lento. " + pasos + "\n\nSi sigue igual, deja **nombre, teléfono, domicilio y descripción** para crear ticket."
-        ticket_required = True
-    else:
-        answer = "Gracias por tu consulta. " + pasos + "\n\nSi prefieres atención directa, comparte **nombre, teléfono, domicilio y descripción** para crear ticket."
+    answer, ticket_required = respuesta_predefinida(user_message)
+    previa = respuesta_recuperada(user_message)
+    if previa:
+        answer = previa
+        chat_sessions.registrar(chat_id_actual(), user_message, answer)
+    elif CHAT_IA_SINCRONO and ai_agent.client:
+        chat_id = chat_id_actual()
+        resumen, historial = chat_sessions.contexto(chat_id, user_message)
+        try:
+            answer = ai_agent.generar_respuesta_chat(user_message, historial, resumen, fallback=False)
+            chat_sessions.registrar(chat_id, user_message, answer)
+        except Exception as e:
+            print("Chat: IA no disponible:", e)
     return jsonify({"answer": answer, "ticket_required": ticket_required}), 200
 
-@app.route('/api/crear-ticket', methods=['POST'])
+@bp.route('/chat/reset', methods=['POST'])
+def chat_reset():
+    if 'chat_id' in session:
+        chat_sessions.borrar(session['chat_id'])
+    return jsonify({"success": True}), 200
+
+def _sse(data, evento=None, id=None):
+    linea = f"id: {id}\n" if id else ""
+    linea += f"event: {evento}\n" if evento else ""
+    return linea + "data: " + json.dumps(data, ensure_ascii=False, default=str) + "\n\n"
+
+@bp.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Chat por Server-Sent Events: eventos `data: {"token": "..."}` según llega
+    cada fragmento del modelo y un `event: done` final con ticket_required.
+    Si la IA no está disponible se envía la respuesta predefinida de /chat.
+    """
+    data = request.get_json(silent=True) or {}
+    user_message = (data.get('message') or '').strip()
+    if user_message:
+        respaldo, ticket_required = respuesta_predefinida(user_message)
+    else:
+        respaldo, ticket_required = "¿Podrías escribir tu consulta técnica?", False
+    # Se resuelve antes de empezar el stream: la cookie de sesión va en las cabeceras
+    chat_id = chat_id_actual() if user_message else None
+
+    def eventos():
+        # Comentario inicial: el navegador recibe las cabeceras sin esperar a la IA
+        yield ": ok\n\n"
+        enviado = False
+        previa = respuesta_recuperada(user_message) if user_message else None
+        if previa:
+            enviado = True
+            yield _sse({"token": previa})
+            chat_sessions.registrar(chat_id, user_message, previa)
+        elif user_message:
+            resumen, historial = chat_sessions.contexto(chat_id, user_message)
+            partes = []
+            try:
+                for trozo in ai_agent.generar_respuesta_chat_stream(user_message, historial, resumen):
+                    enviado = True
+                    partes.append(trozo)
+                    yield _sse({"token": trozo})
+                if partes:
+                    chat_sessions.registrar(chat_id, user_message, "".join(partes))
+            except Exception as e:
+                print("Chat stream: IA no disponible:", e)
+                if enviado:
+                    yield _sse({"token": "\n\n(Respuesta interrumpida, inténtalo de nuevo.)"})
+        if not enviado:
+            yield _sse({"token": respaldo})
+        yield _sse({"ticket_required": ticket_required}, evento="done")
+
+    return Response(stream_with_context(eventos()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/api/crear-ticket', methods=['POST'])
 def api_crear_ticket():
     try:
         data = request.get_json(silent=True) or {}
@@ -167,6 +372,8 @@ def api_crear_ticket():
             return jsonify({'success': False, 'message': 'Faltan campos obligatorios.'}), 400
 
         usuario_id = session.get('user_id')  # puede ser None
+        firma = dedup.firma(descripcion) if dedup else None
+        dup = dedup.buscar(firma=firma) if firma else None
         tid = ticket_model.crear_ticket(
             usuario_id=usuario_id,
             titulo=titulo,
@@ -177,23 +384,188 @@ def api_crear_ticket():
             telefono=telefono,
             domicilio=domicilio,
             prioridad='media',
-            estado='abierto'
+            estado='abierto',
+            duplicado_de=dup['id'] if dup else None
         )
-
-        return jsonify({'success': True, 'ticket_id': tid,
-                        'message': 'Ticket enviado correctamente.'}), 201
+        if firma:
+            dedup.agregar(tid, firma)
+
+        mensaje = 'Ticket enviado correctamente.'
+        if dup:
+            mensaje += f" Parece el mismo problema que el ticket #{dup['id']}, que ya estamos atendiendo."
+        return jsonify({'success': True, 'ticket_id': tid, 'message': mensaje,
+                        'duplicado_de': dup['id'] if dup else None}), 201
     except Exception as e:
         import traceback; traceback.print_exc()
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/tickets')
+@bp.route('/api/tickets')
 @login_required
 @admin_required
 def api_tickets():
-    tickets = ticket_model.obtener_tickets(admin=True)
-    return jsonify({'success': True, 'tickets': tickets})
+    """
+    Listado paginado por cursor.
+    Query: estado, prioridad, categoria, tipo (admiten "a,b"), usuario_id,
+           desde/hasta (YYYY-MM-DD), limit, cursor (next_cursor de la página anterior).
+    Lleva ETag: con If-None-Match de la versión vigente responde 304.
+    """
+    marca = ticket_model.marca_datos()
+    etag = etag_vista(marca, 'api_tickets', sorted(request.args.items(multi=True)))
+    resp = no_modificado(etag)
+    if resp:
+        return resp
+    try:
+        pagina = ticket_model.obtener_tickets(admin=True, filtros=request.args,
+                                              cursor=request.args.get('cursor'),
+                                              limit=request.args.get('limit', type=int))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return con_validadores(jsonify({'success': True, 'tickets': pagina['tickets'],
+                                    'next_cursor': pagina['next_cursor']}), etag)
+
+@bp.route('/api/tickets/feed')
+@login_required
+@admin_required
+def api_tickets_feed():
+    """
+    Altas y cambios de tickets desde `cursor` (el de la página o el de la
+    respuesta anterior). Con Accept: text/event-stream es un stream SSE
+    (eventos `cambios` con id = cursor, y `reset` si hay que recargar); si no,
+    long-poll: espera hasta `espera` seg. (máx. 30) y responde JSON
+    {"tickets", "stats", "cursor", "reset"}.
+    """
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('cursor')
+    if 'text/event-stream' not in request.headers.get('Accept', ''):
+        espera = max(0.0, min(request.args.get('espera', 25, type=float), 30.0))
+        return jsonify({'success': True, **feed.esperar(cursor, timeout=espera)})
+
+    duracion = float(os.getenv("FEED_SSE_SEG", "300"))
+
+    def eventos():
+        # Cada conexión ocupa un hilo: se corta a los FEED_SSE_SEG y el
+        # navegador reconecta solo (retry) enviando Last-Event-ID
+        yield "retry: 2000\n\n"
+        fin = time.monotonic() + duracion
+        actual = cursor
+        while time.monotonic() < fin:
+            res = feed.esperar(actual, timeout=min(15.0, max(0.0, fin - time.monotonic())))
+            if res['reset']:
+                yield _sse({}, evento='reset')
+                return
+            if not (res['tickets'] or res['stats']):
+                yield ": ping\n\n"
+                continue
+            actual = res['cursor']
+            yield _sse({'tickets': res['tickets'], 'stats': res['stats']}, evento='cambios', id=actual)
+
+    return Response(stream_with_context(eventos()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/api/tickets/search')
+@login_required
+@admin_required
+def api_tickets_search():
+    """
+    Búsqueda de texto en titulo/descripcion/notas_admin, más relevantes primero.
+    Query: q, los mismos filtros que /api/tickets, limit, offset (next_offset de la página anterior).
+    Cada ticket trae `snippet` y `titulo_html` (HTML escapado con <mark>).
+    """
+    q = (request.args.get('q') or '').strip()
+    if len(q) < 2:
+        return jsonify({'success': False, 'message': 'Escribe al menos 2 caracteres.'}), 400
+    try:
+        res = ticket_search.buscar(q, filtros=request.args,
+                                   limit=request.args.get('limit', type=int),
+                                   offset=request.args.get('offset', 0, type=int))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except BusquedaNoDisponible as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
+    return jsonify({'success': True, **res})
+
+@bp.route('/api/tickets/export')
+@login_required
+@admin_required
+def api_tickets_export():
+    """
+    Descarga de todos los tickets que cumplen los filtros de /api/tickets.
+    Query: format=csv|ndjson y los filtros. Se envía en streaming (memoria constante).
+    """
+    formato = request.args.get('format', 'csv')
+    if formato not in export.FORMATOS:
+        return jsonify({'success': False, 'message': 'format debe ser csv o ndjson.'}), 400
+    try:
+        filas = ticket_model.exportar_tickets(filtros=request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    nombre = f"tickets-{datetime.now():%Y%m%d-%H%M}.{formato}"
+    return Response(stream_with_context(export.serializar(formato, filas)),
+                    mimetype=export.FORMATOS[formato],
+                    headers={'Content-Disposition': f'attachment; filename="{nombre}"',
+                             'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/api/tickets/bulk', methods=['POST'])
+@admin_or_token_required
+def api_tickets_bulk():
+    """
+    Alta masiva: arreglo JSON (o {"tickets": [...]}) o NDJSON (un ticket por línea,
+    Content-Type application/x-ndjson). Responde un resultado por fila.
+    """
+    max_filas = int(os.getenv("BULK_MAX_ROWS", "10000"))
+    filas, errores_parseo = [], set()
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        for linea in request.get_data(as_text=True).splitlines():
+            if not linea.strip():
+                continue
+            try:
+                filas.append(json.loads(linea))
+            except ValueError:
+                errores_parseo.add(len(filas))
+                filas.append(None)
+    else:
+        data = request.get_json(silent=True)
+        filas = data.get('tickets') if isinstance(data, dict) else data
+    if not isinstance(filas, list) or not filas:
+        return jsonify({'success': False, 'message': 'Se espera un arreglo de tickets.'}), 400
+    if len(filas) > max_filas:
+        return jsonify({'success': False, 'message': f'Máximo {max_filas} tickets por petición.'}), 413
+
+    # Duplicados: contra los abiertos antes del alta y entre filas del lote después
+    firmas = {}
+    if dedup:
+        for i, fila in enumerate(filas):
+            if isinstance(fila, dict) and fila.get('duplicado_de') is None:
+                firmas[i] = dedup.firma(fila.get('descripcion') or fila.get('problema'))
+                dup = dedup.buscar(firma=firmas[i]) if firmas[i] else None
+                if dup:
+                    filas[i] = {**fila, 'duplicado_de': dup['id']}
 
-@app.route('/api/tickets/<int:ticket_id>', methods=['PATCH'])
+    try:
+        resultados = ticket_model.crear_tickets_bulk(filas)
+        altas = [r for r in resultados if 'ticket_id' in r]
+        for r in altas:
+            if filas[r['index']].get('duplicado_de'):
+                r['duplicado_de'] = filas[r['index']]['duplicado_de']
+        if firmas:
+            enlaces = dict(dedup.enlazar_lote([
+                (r['ticket_id'], firmas.get(r['index']), r.get('duplicado_de')) for r in altas]))
+            if enlaces:
+                ticket_model.actualizar_tickets([(tid, {'duplicado_de': d}) for tid, d in enlaces.items()])
+                for r in altas:
+                    if r['ticket_id'] in enlaces:
+                        r['duplicado_de'] = enlaces[r['ticket_id']]
+    except Exception as e:
+        import traceback; traceback.print_exc()
+        return jsonify({'success': False, 'message': str(e)}), 500
+    for r in resultados:
+        if r['index'] in errores_parseo:
+            r['error'] = 'JSON inválido en la línea'
+    creados = sum(1 for r in resultados if 'ticket_id' in r)
+    return jsonify({'success': creados > 0, 'creados': creados,
+                    'errores': len(resultados) - creados, 'resultados': resultados}), \
+        (200 if creados else 400)
+
+@bp.route('/api/tickets/<int:ticket_id>', methods=['PATCH'])
 @login_required
 @admin_required
 def api_update_ticket(ticket_id):
@@ -212,9 +584,50 @@ def api_update_ticket(ticket_id):
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@bp.route('/api/tickets', methods=['PATCH'])
+@login_required
+@admin_required
+def api_update_tickets():
+    """
+    Edición en lote desde el panel, en una sola transacción:
+    {"updates": [{"id": 1, "changes": {"estado": "cerrado"}}, ...]}
+    """
+    data = request.get_json(silent=True)
+    items = data.get('updates') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'message': 'Se espera una lista "updates".'}), 400
+    if len(items) > int(os.getenv("BATCH_MAX_UPDATES", "1000")):
+        return jsonify({'success': False, 'message': 'Demasiados cambios en un lote.'}), 413
+
+    # Mismos campos que el PATCH individual, validados contra sus ENUM
+    validos = TicketModel.FILTROS_ENUM
+    cambios = []
+    for it in items:
+        try:
+            tid = int(it['id'])
+            changes = it.get('changes') or {}
+            if not isinstance(changes, dict):
+                raise TypeError(changes)
+        except (TypeError, KeyError, ValueError, AttributeError):
+            return jsonify({'success': False, 'message': f'Entrada inválida: {it}'}), 400
+        for k, v in changes.items():
+            if k not in validos or v not in validos[k]:
+                return jsonify({'success': False,
+                                'message': f'Ticket {tid}: valor inválido para {k}.'}), 400
+        if changes:
+            cambios.append((tid, changes))
+    if not cambios:
+        return jsonify({'success': False, 'message': 'No hay campos válidos para actualizar.'}), 400
+
+    try:
+        res = ticket_model.actualizar_tickets(cambios)
+        return jsonify({'success': True, **res})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
 
 # ===== Diagnóstico =====
-@app.route('/health/db')
+@bp.route('/health/db')
 def health_db():
     try:
         cnx = db.connect()
@@ -226,7 +639,104 @@ def health_db():
     except Exception as e:
         return f"DB FAIL: {e}", 500
 
-@app.route("/dbg_check")
+@bp.route('/health/pool')
+def health_pool():
+    return jsonify(db.pool_stats()), 200
+
+@bp.route('/health/cache')
+def health_cache():
+    return jsonify(ticket_model.cache.stats()), 200
+
+@bp.route('/health/ai-cache')
+def health_ai_cache():
+    return jsonify(ai_cache.stats()), 200
+
+@bp.route('/health/retrieval')
+def health_retrieval():
+    if not retrieval:
+        return jsonify({'enabled': False}), 200
+    return jsonify({'enabled': True, **retrieval.stats()}), 200
+
+@bp.route('/health/dedup')
+def health_dedup():
+    if not dedup:
+        return jsonify({'enabled': False}), 200
+    return jsonify({'enabled': True, **dedup.stats()}), 200
+
+@bp.route('/health/feed')
+def health_feed():
+    return jsonify(feed.stats()), 200
+
+@bp.route('/health/chat')
+@login_required
+@admin_required
+def health_chat():
+    return jsonify(chat_sessions.stats()), 200
+
+@bp.route('/health/ia')
+def health_ia():
+    # Circuito, llamadas en curso, reintentos y rechazos de llm_client.py
+    return jsonify(ai_agent.llm.stats()), 200
+
+@bp.route('/health/triage')
+def health_triage():
+    if not triage:
+        return jsonify({'enabled': False}), 200
+    return jsonify({'enabled': True, **triage.stats()}), 200
+
+@bp.route('/health/sql')
+def health_sql():
+    """Sentencias que más tiempo acumulan en este proceso (ver metrics.py)."""
+    return jsonify({'slow_ms': metrics.SLOW_MS,
+                    'sentencias': metrics.resumen_sql(request.args.get('limit', 20, type=int))}), 200
+
+@metrics.REGISTRO.recolector
+def _metricas_servicios():
+    # Lo que ya cuentan el pool y las cachés, leído en cada /metrics
+    pool = db.pool_stats()
+    for estado, valor in (('en_uso', pool['in_use']), ('ociosa', pool['idle']), ('abierta', pool['open'])):
+        yield ('db_pool_conexiones', 'gauge', 'Conexiones del pool MySQL', {'estado': estado}, valor)
+    yield ('db_pool_esperas_total', 'counter', 'Peticiones que esperaron una conexión', {}, pool['waits'])
+    yield ('db_pool_espera_segundos_total', 'counter', 'Tiempo total esperando conexión', {}, pool['wait_time'])
+    yield ('db_pool_timeouts_total', 'counter', 'Esperas que agotaron DB_POOL_TIMEOUT', {}, pool['timeouts'])
+    ia = ai_agent.llm.stats()
+    yield ('ia_llamadas_en_curso', 'gauge', 'Llamadas al modelo en curso', {}, ia['en_curso'])
+    yield ('ia_circuito_abierto', 'gauge', 'Procesos con el circuito de la IA abierto', {},
+           1 if ia['circuito']['estado'] == 'abierto' else 0)
+    for cache, st in (('consultas', ticket_model.cache.stats()), ('ia', ai_cache.stats())):
+        for clave in ('hits', 'hits_shared', 'hits_mem', 'hits_db', 'misses'):
+            if clave in st:
+                yield ('cache_accesos_total', 'counter', 'Accesos a caché por resultado',
+                       {'cache': cache, 'resultado': clave}, st[clave])
+
+@bp.route('/admin/profiles')
+@login_required
+@admin_required
+def admin_profiles():
+    """Perfiles guardados (más reciente primero) y estado del perfilador."""
+    return jsonify({'perfilador': perfilador.stats(), 'perfiles': perfilador.listar()}), 200
+
+@bp.route('/admin/profiles/<nombre>')
+@login_required
+@admin_required
+def admin_profile(nombre):
+    """Resumen de pstats (?orden=cumulative|tottime|ncalls) o el .prof con ?descargar=1."""
+    if request.args.get('descargar') == '1':
+        ruta = perfilador.ruta_archivo(nombre)
+        if not ruta:
+            return jsonify({'error': 'perfil no encontrado'}), 404
+        return send_file(ruta, mimetype='application/octet-stream', as_attachment=True)
+    texto = perfilador.resumen(nombre, request.args.get('orden', 'cumulative'),
+                               request.args.get('limit', 40, type=int))
+    if texto is None:
+        return jsonify({'error': 'perfil no encontrado'}), 404
+    return Response(texto, mimetype='text/plain; charset=utf-8')
+
+@bp.route('/metrics')
+def metricas():
+    return Response(metrics.REGISTRO.exponer(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@bp.route("/dbg_check")
 def dbg_check():
     try:
         u = ticket_model.obtener_usuario_por_username_o_email("admin")
@@ -242,7 +752,7 @@ def dbg_check():
     prefix = (u.get("password_hash") or "")[:20]
     return f"prefix={prefix} ok={ok} role={u['role']}", 200
 
-@app.route("/setup-admin")
+@bp.route("/setup-admin")
 def setup_admin():
     from werkzeug.security import generate_password_hash
     pwd = generate_password_hash("admin123", method="pbkdf2:sha256")
@@ -254,7 +764,7 @@ def setup_admin():
             ticket_model.crear_usuario("admin", pwd, "Administrador", "admin@soporte.com", role="admin")
     return "Admin listo: admin / admin123", 200
 
-@app.route("/dev-login")
+@bp.route("/dev-login")
 def dev_login():
     try:
         u = ticket_model.obtener_usuario_por_username_o_email("admin")
@@ -265,10 +775,12 @@ def dev_login():
     session['user_id'] = u['id']
     session['username'] = u['username']
     session['role']     = u['role']
-    return redirect(url_for('admin'))
+    return redirect(url_for('.admin'))
 
 
 if __name__ == '__main__':
-    print("== DB cfg ==", db.host, db.user, db.port, db.database)
+    # Con el reloader el módulo se ejecuta dos veces: el bootstrap sólo en el proceso padre
+    if os.getenv("DB_AUTO_MIGRATE", "1") == "1" and not os.getenv("WERKZEUG_RUN_MAIN"):
+        bootstrap.bootstrap()
     print("== templates dir =>", TEMPLATES_DIR)
-    app.run(host="127.0.0.1", port=int(os.getenv("PORT", "5000")), debug=True, use_reloader=True)
+    create_app().run(host="127.0.0.1", port=int(os.getenv("PORT", "5000")), debug=True, use_reloader=True)
@@ -0,0 +1,145 @@
+# backend/search.py
+"""
+Búsqueda de texto de tickets para el panel (/api/tickets/search).
+
+- fulltext: MATCH ... AGAINST sobre el índice FULLTEXT de la migración 7
+  (TicketModel.buscar_texto). Usa el índice, no recorre la tabla.
+- local: índice invertido BM25 en proceso (retrieval.RetrievalIndex sobre
+  todos los tickets) para BDs sin FULLTEXT. Con SEARCH_BACKEND=auto se pasa a
+  este modo la primera vez que MySQL contesta que no hay índice FULLTEXT, y
+  desde el principio con DB_BACKEND=sqlite.
+
+Cada resultado lleva `snippet` y `titulo_html`: texto escapado con los
+términos buscados en <mark>, listo para insertar como HTML.
+"""
+import os
+import re
+import threading
+from html import escape
+from typing import Any, Dict, List, Optional, Set
+
+import mysql.connector
+from mysql.connector import errorcode
+
+from retrieval import RetrievalIndex, tokens
+
+SEARCH_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "search.idx")
+MAX_OFFSET = 1000
+LOTE_IDS = 1000     # ids por consulta IN al filtrar candidatos del índice local
+
+_PALABRA = re.compile(r"\w+")
+
+
+class BusquedaNoDisponible(Exception):
+    pass
+
+
+def resaltar(texto: Optional[str], terminos: Set[str], ancho: int = 180) -> str:
+    """Fragmento de `texto` alrededor de la primera coincidencia, escapado y con <mark>."""
+    texto = texto or ""
+    marcas = [(m.start(), m.end()) for m in _PALABRA.finditer(texto)
+              if (tokens(m.group()) or [None])[0] in terminos]
+    ini = max(0, marcas[0][0] - ancho // 3) if marcas else 0
+    if ini:
+        espacio = texto.find(" ", ini)
+        ini = espacio + 1 if 0 <= espacio < marcas[0][0] else ini
+    fin = min(len(texto), ini + ancho)
+    partes, pos = [], ini
+    for a, b in marcas:
+        if a < ini or b > fin:
+            continue
+        partes.append(escape(texto[pos:a]))
+        partes.append(f"<mark>{escape(texto[a:b])}</mark>")
+        pos = b
+    partes.append(escape(texto[pos:fin]))
+    return ("…" if ini else "") + "".join(partes) + ("…" if fin < len(texto) else "")
+
+
+class TicketSearch:
+    def __init__(self, model, backend: str = "auto", local_path: str = SEARCH_PATH):
+        self.model = model
+        self.backend = backend
+        self.local_path = local_path
+        self.local: Optional[RetrievalIndex] = None
+        self._lock = threading.Lock()
+        if backend == "local" or (backend == "auto" and getattr(model.db, "dialecto", "mysql") == "sqlite"):
+            self._crear_local()
+
+    @classmethod
+    def from_env(cls, model) -> "TicketSearch":
+        """SEARCH_BACKEND (auto | fulltext | local), SEARCH_INDEX_PATH."""
+        return cls(model, backend=os.getenv("SEARCH_BACKEND", "auto"),
+                   local_path=os.getenv("SEARCH_INDEX_PATH") or SEARCH_PATH)
+
+    def _crear_local(self):
+        """Crea el índice local una sola vez aunque varias peticiones caigan a la vez aquí."""
+        if self.local:
+            return
+        with self._lock:
+            if self.local:
+                return
+            local = RetrievalIndex(self.model.db, path=self.local_path, estados=None,
+                                   campos=('titulo', 'descripcion', 'notas_admin'),
+                                   requiere_solucion=False)
+            self.model.suscribir(local.on_ticket)
+            self.local = local
+            self.backend = "local"
+
+    def iniciar(self):
+        if self.local:
+            self.local.iniciar()
+
+    def buscar(self, q: str, filtros=None, limit: Optional[int] = None,
+               offset: int = 0) -> Dict[str, Any]:
+        """{"tickets": [...], "next_offset": int|None, "motor": "fulltext"|"local"}."""
+        offset = max(0, min(int(offset or 0), MAX_OFFSET))
+        if self.backend != "local":
+            try:
+                res = self.model.buscar_texto(q, filtros, limit, offset)
+                res["motor"] = "fulltext"
+            except mysql.connector.Error as e:
+                if e.errno != errorcode.ER_FT_MATCHING_KEY_NOT_FOUND or self.backend == "fulltext":
+                    raise
+                print("Búsqueda: la BD no tiene índice FULLTEXT, se usa el índice local")
+                self._crear_local()
+        if self.backend == "local":
+            res = self._buscar_local(q, filtros, limit, offset)
+        terminos = set(tokens(q))
+        for t in res["tickets"]:
+            t["titulo_html"] = resaltar(t.get("titulo"), terminos, ancho=200)
+            t["snippet"] = resaltar(self._campo_snippet(t, terminos), terminos)
+        return res
+
+    def _buscar_local(self, q, filtros, limit, offset) -> Dict[str, Any]:
+        self.local.iniciar()
+        if not self.local.stats()["listo"]:
+            raise BusquedaNoDisponible("El índice de búsqueda se está construyendo; reintenta en unos segundos.")
+        limit = max(1, min(int(limit or 50), 500))
+        # Los filtros se aplican en la BD sobre los candidatos, en orden de
+        # relevancia: si no llenan la página se piden más (k x 4) hasta que la
+        # llenen o se acabe el índice. Sólo se consultan los candidatos nuevos.
+        quiero = offset + limit + 1
+        filas: List[Dict[str, Any]] = []
+        vistos, k = 0, quiero * 3
+        while True:
+            candidatos = [h["id"] for h in self.local.buscar(q, k=k)]
+            for i in range(vistos, len(candidatos), LOTE_IDS):
+                filas.extend(self.model.obtener_por_ids(candidatos[i:i + LOTE_IDS], filtros))
+                if len(filas) >= quiero:
+                    break
+            vistos = len(candidatos)
+            if len(filas) >= quiero or vistos < k:
+                break
+            k *= 4
+        filas = filas[offset:quiero]
+        next_offset = offset + limit if len(filas) > limit else None
+        return {"tickets": filas[:limit], "next_offset": next_offset, "motor": "local"}
+
+    @staticmethod
+    def _campo_snippet(ticket: Dict[str, Any], terminos: Set[str]) -> str:
+        """El primer campo de texto donde aparece algún término (si no, la descripción)."""
+        for campo in ("descripcion", "notas_admin"):
+            texto = ticket.get(campo) or ""
+            if any((tokens(p) or [None])[0] in terminos for p in _PALABRA.findall(texto)):
+                return texto
+        return ticket.get("descripcion") or ""
@@ -0,0 +1,57 @@
+# backend/tests/conftest.py
+import pytest
+
+import migrations
+from cache import QueryCache
+from db_sqlite import SQLiteDatabase
+from models import TicketModel
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Base SQLite nueva con todas las migraciones (el mismo esquema que MySQL)."""
+    base = SQLiteDatabase(str(tmp_path / "soporte.sqlite3"))
+    migrations.migrate(base, verbose=False)
+    yield base
+    base.end_request()
+    base.close()
+
+
+@pytest.fixture
+def model(db):
+    # Caché sólo en memoria: no depende de CACHE_SHARED_PATH del entorno
+    return TicketModel(db, cache=QueryCache())
+
+
+@pytest.fixture(scope="session")
+def routers_app(tmp_path_factory):
+    """
+    routers importado contra una base SQLite propia (compartida por la sesión),
+    sin IA ni retrieval/dedup/triage. Devuelve (routers, app).
+    """
+    carpeta = tmp_path_factory.mktemp("app")
+    with pytest.MonkeyPatch.context() as mp:
+        for clave, valor in {"DB_BACKEND": "sqlite", "DB_SQLITE_PATH": str(carpeta / "app.sqlite3"),
+                             "SEARCH_INDEX_PATH": str(carpeta / "search.idx"),
+                             "RETRIEVAL_ENABLED": "0", "DEDUP_ENABLED": "0", "TRIAGE_ENABLED": "0",
+                             "CACHE_SHARED_PATH": "", "CHAT_SHARED_PATH": "", "METRICS_DIR": ""}.items():
+            mp.setenv(clave, valor)
+        import routers
+        migrations.migrate(routers.db, verbose=False)
+        routers.db.end_request()
+        app = routers.create_app()
+    app.config["TESTING"] = True
+    return routers, app
+
+
+@pytest.fixture
+def cliente(routers_app):
+    return routers_app[1].test_client()
+
+
+@pytest.fixture
+def admin(cliente):
+    """Cliente con sesión de administrador."""
+    with cliente.session_transaction() as s:
+        s["user_id"], s["username"], s["role"] = 1, "admin", "admin"
+    return cliente
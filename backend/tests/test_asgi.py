@@ -0,0 +1,62 @@
+"""Modo asíncrono (asgi.py): rutas nativas del chat y el resto por WSGI."""
+import pytest
+
+pytest.importorskip("starlette")
+pytest.importorskip("a2wsgi")
+pytest.importorskip("httpx")
+
+
+@pytest.fixture
+def asgi_cliente(routers_app):
+    from starlette.testclient import TestClient
+    import asgi
+    with TestClient(asgi.app) as c:
+        yield c
+
+
+class _IAAsync:
+    aclient = object()
+
+    def __init__(self, trozos, falla=False):
+        self.trozos, self.falla = trozos, falla
+
+    async def agenerar_respuesta_chat_stream(self, mensaje, historial, resumen):
+        for t in self.trozos:
+            yield t
+        if self.falla:
+            raise TimeoutError("IA caída")
+
+
+def test_chat_nativo_con_respuesta_predefinida_y_cors(routers_app, asgi_cliente):
+    routers, _ = routers_app
+    r = asgi_cliente.post("/chat", json={"message": "mi pc está lentísima"},
+                          headers={"Origin": "http://otro.example"})
+    assert r.status_code == 200
+    assert r.json()["answer"] == routers.respuesta_predefinida("mi pc está lentísima")[0]
+    assert r.headers["access-control-allow-origin"] == "*"
+
+
+def test_chat_stream_nativo_corta_con_aviso(routers_app, asgi_cliente, monkeypatch):
+    routers, _ = routers_app
+    monkeypatch.setattr(routers, "ai_agent", _IAAsync(["Primero"], falla=True))
+    r = asgi_cliente.post("/chat/stream", json={"message": "no imprime"})
+    assert '{"token": "Primero"}' in r.text and "interrumpida" in r.text
+
+
+def test_chat_stream_nativo_y_sesion_compartida_con_flask(routers_app, asgi_cliente, monkeypatch):
+    routers, _ = routers_app
+    monkeypatch.setattr(routers, "ai_agent", _IAAsync(["Hola ", "mundo"]))
+    r = asgi_cliente.post("/chat/stream", json={"message": "no tengo internet"})
+    assert r.headers["content-type"].startswith("text/event-stream")
+    assert '{"token": "Hola "}' in r.text and "event: done" in r.text
+    # La cookie la firma asgi.SesionFlask con la clave y el formato de Flask
+    import asgi
+    firma = asgi.flask_app.session_interface.get_signing_serializer(asgi.flask_app)
+    assert len(firma.loads(r.cookies["session"])["chat_id"]) == 32
+    assert asgi_cliente.post("/chat/reset").json() == {"success": True}
+
+
+def test_rutas_flask_montadas_por_wsgi(asgi_cliente):
+    r = asgi_cliente.get("/health/pool")
+    assert r.status_code == 200 and "in_use" in r.json()
+    assert asgi_cliente.get("/health/async").json()["chats_en_vuelo"] == 0
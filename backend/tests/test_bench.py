@@ -0,0 +1,48 @@
+"""Suite de benchmark: datos reproducibles, percentiles y comparación."""
+import random
+
+import pytest
+
+pytest.importorskip("httpx")
+import bench  # noqa: E402
+from models import normalizar_ticket  # noqa: E402
+
+
+def test_tickets_reproducibles_y_validos():
+    a = [bench.ticket_aleatorio(random.Random(42), n) for n in range(50)]
+    b = [bench.ticket_aleatorio(random.Random(42), n) for n in range(50)]
+    assert a == b
+    for t in a:
+        normalizar_ticket(t)
+
+
+def test_percentiles_por_rango_mas_cercano():
+    assert bench.percentiles([]) == {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    st = bench.percentiles([i / 1000 for i in range(1, 101)])
+    assert st == {"p50_ms": 50.0, "p95_ms": 95.0, "p99_ms": 99.0, "max_ms": 100.0}
+
+
+def test_comparar_con_tolerancia(capsys):
+    base = {"escenarios": {"listar": {"req_s": 100, "p50_ms": 10, "p95_ms": 20, "p99_ms": 30}}}
+    igual = {"escenarios": {"listar": {"req_s": 95, "p50_ms": 10, "p95_ms": 21, "p99_ms": 40},
+                            "chat": {"req_s": 5}}}
+    peor = {"escenarios": {"listar": {"req_s": 100, "p50_ms": 10, "p95_ms": 30, "p99_ms": 30}}}
+    assert bench.comparar(base, igual, tolerancia=0.1)
+    assert "(nuevo)" in capsys.readouterr().out
+    assert not bench.comparar(base, peor, tolerancia=0.1)
+    assert bench.comparar(base, peor, tolerancia=None)
+
+
+def test_sembrar_en_sqlite(tmp_path, monkeypatch):
+    from db_sqlite import SQLiteDatabase
+    from models import TicketModel
+    import migrations
+    ruta = str(tmp_path / "bench.sqlite3")
+    monkeypatch.setenv("DB_BACKEND", "sqlite")
+    monkeypatch.setenv("DB_SQLITE_PATH", ruta)
+    db = SQLiteDatabase(ruta)
+    migrations.migrate(db, verbose=False)
+    bench.sembrar(120, lote=50)
+    with db.connection():
+        assert TicketModel(db)._stats_resumen_db()["total"] == 120
+    db.close()
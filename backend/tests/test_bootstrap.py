@@ -0,0 +1,63 @@
+"""Bootstrap una vez por despliegue: migraciones + admin, idempotente."""
+import os
+import runpy
+
+import pytest
+
+import bootstrap
+import migrations
+from db_sqlite import SQLiteDatabase
+
+AQUI = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def sqlite_env(tmp_path, monkeypatch):
+    ruta = str(tmp_path / "deploy.sqlite3")
+    monkeypatch.setenv("DB_BACKEND", "sqlite")
+    monkeypatch.setenv("DB_SQLITE_PATH", ruta)
+    return ruta
+
+
+def _admin_y_version(ruta):
+    db = SQLiteDatabase(ruta)
+    with db.connection():
+        cur = db.cursor()
+        cur.execute("SELECT role, password_hash FROM usuarios WHERE username='admin'")
+        admin = cur.fetchone()
+        cur.execute("SELECT MAX(version) AS v FROM schema_version")
+        version = cur.fetchone()["v"]
+        cur.close()
+    db.close()
+    return admin, version
+
+
+def test_bootstrap_es_idempotente(sqlite_env, capsys):
+    bootstrap.bootstrap(verbose=False)
+    admin, version = _admin_y_version(sqlite_env)
+    assert admin["role"] == "admin"
+    assert version == max(v for v, _, _ in migrations.MIGRATIONS_SQLITE)
+
+    bootstrap.bootstrap()
+    assert "(0 migraciones aplicadas)" in capsys.readouterr().out
+    # El hash no se recalcula: una contraseña cambiada se respeta
+    assert _admin_y_version(sqlite_env) == (admin, version)
+
+
+def test_gunicorn_on_starting_hace_el_bootstrap(sqlite_env, monkeypatch):
+    conf = runpy.run_path(os.path.join(AQUI, "gunicorn.conf.py"))
+    assert conf["wsgi_app"] == "wsgi:app" and conf["preload_app"] is False
+    conf["on_starting"](None)
+    assert _admin_y_version(sqlite_env)[0]["role"] == "admin"
+
+    monkeypatch.setenv("DB_AUTO_MIGRATE", "0")
+    monkeypatch.setenv("DB_SQLITE_PATH", sqlite_env + ".otra")
+    conf["on_starting"](None)
+    assert not os.path.exists(sqlite_env + ".otra")
+
+
+def test_create_app_no_toca_la_bd(routers_app):
+    routers, _ = routers_app
+    antes = routers.db.pool_stats()["created"]
+    routers.create_app()
+    assert routers.db.pool_stats()["created"] == antes
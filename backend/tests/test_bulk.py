@@ -0,0 +1,50 @@
+"""Alta masiva: ids reales, referencias validadas y reintento fila a fila."""
+
+
+def _ids_en_bd(db):
+    cur = db.cursor()
+    cur.execute("SELECT id, descripcion FROM tickets ORDER BY id")
+    filas = {f["id"]: f["descripcion"] for f in cur.fetchall()}
+    cur.close()
+    return filas
+
+
+def test_ids_devueltos_son_los_de_cada_fila(db, model):
+    with db.connection():
+        res = model.crear_tickets_bulk([{"descripcion": f"fila {i}"} for i in range(7)], chunk_size=3)
+        en_bd = _ids_en_bd(db)
+    assert [r["index"] for r in res] == list(range(7))
+    assert [en_bd[r["ticket_id"]] for r in res] == [f"fila {i}" for i in range(7)]
+
+
+def test_referencias_inexistentes_se_rechazan_por_fila(db, model):
+    with db.connection():
+        base = model.crear_ticket(None, "t", "existente", "otros", "correctivo")
+        res = model.crear_tickets_bulk([
+            {"descripcion": "ok", "duplicado_de": base},
+            {"descripcion": "usuario malo", "usuario_id": 424242},
+            {"descripcion": "enlace malo", "duplicado_de": 999999},
+            {"descripcion": "ok también"},
+        ])
+        en_bd = _ids_en_bd(db)
+    assert res[1]["error"] == "usuario_id inexistente: 424242"
+    assert res[2]["error"] == "duplicado_de inexistente: 999999"
+    assert en_bd[res[0]["ticket_id"]] == "ok" and en_bd[res[3]["ticket_id"]] == "ok también"
+    assert len(en_bd) == 3
+
+
+def test_chunk_rechazado_se_reintenta_fila_a_fila(db, model):
+    with db.connection():
+        # Una fila que pasa la validación pero la BD rechaza: tumba el INSERT de su chunk
+        db.connect()._cnx.execute("""
+            CREATE TRIGGER rechazar_mala BEFORE INSERT ON tickets
+            WHEN NEW.descripcion = 'mala' BEGIN SELECT RAISE(ABORT, 'fila rechazada'); END""")
+        v = model.marca_datos()["version"]
+        res = model.crear_tickets_bulk(
+            [{"descripcion": d} for d in ("a", "mala", "b", "c", "d")], chunk_size=3)
+        en_bd = _ids_en_bd(db)
+        assert model.stats_resumen()["total"] == 4
+        assert model.marca_datos()["version"] > v
+    assert "fila rechazada" in res[1]["error"]
+    assert [en_bd[res[i]["ticket_id"]] for i in (0, 2, 3, 4)] == ["a", "b", "c", "d"]
+    assert len(en_bd) == 4
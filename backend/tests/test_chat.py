@@ -0,0 +1,85 @@
+"""Rutas del chat en el modo síncrono (Flask)."""
+import json
+
+
+class _IAFalsa:
+    client = object()
+
+    def __init__(self):
+        self.llamadas = 0
+
+    def generar_respuesta_chat(self, mensaje, historial, resumen, fallback=True):
+        self.llamadas += 1
+        return "respuesta de la IA"
+
+
+def test_chat_no_espera_a_la_ia_salvo_chat_ia_sincrono(routers_app, cliente, monkeypatch):
+    routers, _ = routers_app
+    ia = _IAFalsa()
+    monkeypatch.setattr(routers, "ai_agent", ia)
+    r = cliente.post("/chat", json={"message": "mi pc está muy lenta"})
+    assert r.status_code == 200 and ia.llamadas == 0
+    assert r.get_json()["answer"] == routers.respuesta_predefinida("mi pc está muy lenta")[0]
+
+    monkeypatch.setattr(routers, "CHAT_IA_SINCRONO", True)
+    r = cliente.post("/chat", json={"message": "mi pc está muy lenta"})
+    assert ia.llamadas == 1 and r.get_json()["answer"] == "respuesta de la IA"
+
+
+def test_health_chat_solo_administradores(cliente):
+    assert cliente.get("/health/chat").status_code == 302
+    with cliente.session_transaction() as s:
+        s["user_id"], s["role"] = 2, "cliente"
+    assert cliente.get("/health/chat").status_code == 403
+    with cliente.session_transaction() as s:
+        s["role"] = "admin"
+    r = cliente.get("/health/chat")
+    assert r.status_code == 200 and isinstance(r.get_json(), dict)
+
+
+def _eventos(resp):
+    """[(evento, data)] de una respuesta SSE (sin los comentarios)."""
+    res = []
+    for bloque in resp.get_data(as_text=True).split("\n\n"):
+        lineas = [l for l in bloque.splitlines() if l and not l.startswith(":")]
+        if lineas:
+            campos = dict(l.split(": ", 1) for l in lineas)
+            res.append((campos.get("event"), json.loads(campos["data"])))
+    return res
+
+
+class _IAStream:
+    def __init__(self, trozos, falla_tras=None):
+        self.trozos, self.falla_tras = trozos, falla_tras
+
+    def generar_respuesta_chat_stream(self, mensaje, historial, resumen):
+        for n, t in enumerate(self.trozos):
+            if n == self.falla_tras:
+                raise TimeoutError("IA caída")
+            yield t
+
+
+def test_chat_stream_envia_los_trozos_y_done(routers_app, cliente, monkeypatch):
+    routers, _ = routers_app
+    monkeypatch.setattr(routers, "ai_agent", _IAStream(["Reinicia ", "el router."]))
+    r = cliente.post("/chat/stream", json={"message": "no tengo internet"})
+    assert r.mimetype == "text/event-stream" and r.headers["X-Accel-Buffering"] == "no"
+    ev = _eventos(r)
+    assert ev[:2] == [(None, {"token": "Reinicia "}), (None, {"token": "el router."})]
+    assert ev[-1][0] == "done" and "ticket_required" in ev[-1][1]
+
+
+def test_chat_stream_sin_ia_usa_la_respuesta_predefinida(routers_app, cliente, monkeypatch):
+    routers, _ = routers_app
+    monkeypatch.setattr(routers, "ai_agent", _IAStream(["x"], falla_tras=0))
+    ev = _eventos(cliente.post("/chat/stream", json={"message": "mi pc está lentísima"}))
+    assert ev[0] == (None, {"token": routers.respuesta_predefinida("mi pc está lentísima")[0]})
+    assert ev[-1][0] == "done"
+
+
+def test_chat_stream_cortado_avisa_sin_mezclar_el_respaldo(routers_app, cliente, monkeypatch):
+    routers, _ = routers_app
+    monkeypatch.setattr(routers, "ai_agent", _IAStream(["Primero ", "luego"], falla_tras=1))
+    ev = _eventos(cliente.post("/chat/stream", json={"message": "no imprime"}))
+    tokens = [d["token"] for e, d in ev if e is None]
+    assert tokens[0] == "Primero " and "interrumpida" in tokens[1] and len(tokens) == 2
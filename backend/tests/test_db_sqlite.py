@@ -0,0 +1,210 @@
+# backend/tests/test_db_sqlite.py
+"""
+Traducción MySQL -> SQLite (db_sqlite.traducir) y las sentencias de
+TicketModel / AICache que dependen de ella, contra un archivo SQLite temporal.
+"""
+from datetime import datetime, timedelta
+
+import mysql.connector
+import pytest
+from mysql.connector import errorcode
+
+from ai_cache import AICache
+from db_sqlite import traducir
+
+
+# ---------- traducir ----------
+def test_parametros_y_porcentajes():
+    s, escribe = traducir("SELECT * FROM t WHERE a=%s AND b LIKE 'x%%'")
+    assert s == "SELECT * FROM t WHERE a=? AND b LIKE 'x%'"
+    assert not escribe
+
+
+def test_now_e_interval():
+    s, _ = traducir("SELECT 1 FROM t WHERE f < NOW() - INTERVAL %s MINUTE AND g > NOW()")
+    assert "datetime('now', 'localtime', '-' || ? || ' minutes')" in s
+    assert s.endswith("g > datetime('now', 'localtime')")
+    s, _ = traducir("SELECT NOW() + INTERVAL 30 SECOND")
+    assert s == "SELECT datetime('now', 'localtime', '+' || 30 || ' seconds')"
+
+
+def test_now_con_alias_devuelve_datetime():
+    s, _ = traducir("SELECT NOW() AS ahora")
+    assert s == """SELECT datetime('now', 'localtime') AS "ahora [timestamp]\""""
+
+
+def test_unix_timestamp_con_parentesis_anidados():
+    s, _ = traducir("SELECT UNIX_TIMESTAMP(MAX(f)) AS u FROM t")
+    assert s == "SELECT CAST(strftime('%s', MAX(f), 'utc') AS INTEGER) AS u FROM t"
+
+
+def test_on_duplicate_key_update():
+    s, escribe = traducir("INSERT INTO t (k, v) VALUES (%s,%s) "
+                          "ON DUPLICATE KEY UPDATE v = v + VALUES(v), w=VALUES(w)")
+    assert s == ("INSERT INTO t (k, v) VALUES (?,?) "
+                 "ON CONFLICT DO UPDATE SET v = v + excluded.v, w=excluded.w")
+    assert escribe
+
+
+def test_for_update_es_escritura():
+    s, escribe = traducir("SELECT id FROM t WHERE id IN (?) ORDER BY id FOR UPDATE")
+    assert s == "SELECT id FROM t WHERE id IN (?) ORDER BY id"
+    assert escribe
+
+
+def test_delete_limit():
+    s, escribe = traducir("DELETE FROM t WHERE x <= NOW() LIMIT 5000")
+    assert s == ("DELETE FROM t WHERE rowid IN (SELECT rowid FROM t "
+                 "WHERE x <= datetime('now', 'localtime') LIMIT 5000)")
+    s, _ = traducir("DELETE FROM t ORDER BY expira LIMIT %s")
+    assert s == "DELETE FROM t WHERE rowid IN (SELECT rowid FROM t ORDER BY expira LIMIT ?)"
+    assert escribe
+
+
+def test_set_session_se_ignora():
+    assert traducir("SET SESSION innodb_lock_wait_timeout = 5") == (None, False)
+
+
+def test_misma_sentencia_mismo_objeto():
+    # La caché de sentencias preparadas de sqlite3 depende de ello
+    sql = "SELECT id FROM t WHERE a=%s"
+    assert traducir(sql)[0] is traducir(sql)[0]
+
+
+# ---------- cursor ----------
+def test_executemany_lastrowid_es_la_primera_fila(db):
+    with db.connection():
+        cur = db.cursor()
+        cur.execute("CREATE TABLE t (id INTEGER PRIMARY KEY AUTOINCREMENT, v TEXT)")
+        cur.execute("INSERT INTO t (v) VALUES (%s)", ("a",))
+        db.commit()
+        cur.executemany("INSERT INTO t (v) VALUES (%s)", [("b",), ("c",), ("d",)])
+        db.commit()
+        assert cur.lastrowid == 2
+        assert cur.rowcount == 3
+        cur.close()
+
+
+def test_errores_como_mysql(db, model):
+    with db.connection():
+        model.crear_usuario("ana", "x", "Ana", "ana@example.com")
+        with pytest.raises(mysql.connector.IntegrityError) as e:
+            model.crear_usuario("ana", "x", "Ana", "otra@example.com")
+        assert e.value.errno == errorcode.ER_DUP_ENTRY
+        cur = db.cursor()
+        with pytest.raises(mysql.connector.ProgrammingError) as e:
+            cur.execute("SELECT * FROM no_existe")
+        assert e.value.errno == errorcode.ER_NO_SUCH_TABLE
+        cur.close()
+
+
+# ---------- TicketModel / AICache ----------
+def _ticket(**extra):
+    return {"descripcion": "La impresora no imprime", "categoria": "hardware", **extra}
+
+
+def test_alta_masiva_ids_consecutivos(db, model):
+    with db.connection():
+        previo = model.crear_ticket(None, "t", "d", "software", "preventivo")
+        res = model.crear_tickets_bulk([_ticket(), {"descripcion": ""}, _ticket(), _ticket()],
+                                       chunk_size=2)
+        assert [r.get("ticket_id") for r in res] == [previo + 1, None, previo + 2, previo + 3]
+        assert "descripcion" in res[1]["error"]
+        cur = db.cursor()
+        cur.execute("SELECT id, descripcion FROM tickets WHERE id > %s ORDER BY id", (previo,))
+        assert [r["id"] for r in cur.fetchall()] == [previo + 1, previo + 2, previo + 3]
+        cur.close()
+
+
+def test_stats_deltas(db, model):
+    with db.connection():
+        a = model.crear_ticket(None, "t", "d", "hardware", "correctivo")
+        model.crear_tickets_bulk([_ticket(tipo="preventivo"), _ticket(categoria="redes")])
+        model.actualizar_ticket(a, estado="resuelto", categoria="software")
+        stats = model.stats_resumen()
+        assert stats["total"] == 3
+        assert stats["estados"] == {"abierto": 2, "resuelto": 1}
+        assert stats["tipos"] == {"correctivo": 2, "preventivo": 1}
+        assert stats["categorias"] == {"hardware": 1, "redes": 1, "software": 1}
+        # Los contadores incrementales coinciden con un recálculo completo
+        model.reconstruir_stats()
+        model.cache.clear()
+        assert model.stats_resumen() == stats
+        version = model.marca_datos()["version"]
+        model.actualizar_ticket(a, prioridad="alta")
+        assert model.marca_datos()["version"] == version + 1
+
+
+def test_ai_cache_upsert(db):
+    cache = AICache(db, ttl=60)
+    cache.set("k", "chat", "primera")
+    cache.set("k", "chat", "segunda")
+    with db.connection():
+        cur = db.cursor()
+        cur.execute("SELECT respuesta, expira FROM ai_respuestas")
+        filas = cur.fetchall()
+        cur.close()
+    assert len(filas) == 1
+    assert filas[0]["respuesta"] == '"segunda"'
+    assert timedelta(seconds=50) < filas[0]["expira"] - datetime.now() <= timedelta(seconds=60)
+    # Desde la tabla (sin la memoria del proceso)
+    assert AICache(db, ttl=60).get("k") == "segunda"
+    assert cache.stats()["errores_db"] == 0
+
+
+def test_ai_cache_poda(db):
+    cache = AICache(db, ttl=60, max_filas=2)
+    for i in range(4):
+        cache.set(f"k{i}", "chat", i)
+    with db.connection():
+        cur = db.cursor()
+        cur.execute("UPDATE ai_respuestas SET expira = NOW() - INTERVAL 1 SECOND WHERE clave='k0'")
+        cur.execute("UPDATE ai_respuestas SET expira = NOW() + INTERVAL 1 HOUR WHERE clave IN ('k2', 'k3')")
+        db.commit()
+        cache._podar()
+        cur.execute("SELECT clave FROM ai_respuestas ORDER BY clave")
+        assert [r["clave"] for r in cur.fetchall()] == ["k2", "k3"]
+        cur.close()
+
+
+def test_liberar_triage_vencidos(db, model):
+    with db.connection():
+        viejo = model.crear_ticket(None, "t", "d", "hardware", "correctivo")
+        nuevo = model.crear_ticket(None, "t", "d", "hardware", "correctivo")
+        assert model.reclamar_triage(viejo)["triage_intentos"] == 1
+        assert model.reclamar_triage(nuevo)
+        assert model.reclamar_triage(nuevo) is None
+        cur = db.cursor()
+        cur.execute("UPDATE tickets SET fecha_actualizacion = NOW() - INTERVAL 11 MINUTE WHERE id=%s",
+                    (viejo,))
+        db.commit()
+        assert model.liberar_triage_vencidos(minutos=10) == 1
+        assert model.tickets_pendientes_triage() == [viejo]
+        # devolver_triage deshace el reclamo sin gastar el intento
+        assert model.devolver_triage(nuevo)
+        cur.execute("SELECT triage_estado, triage_intentos FROM tickets WHERE id=%s", (nuevo,))
+        assert cur.fetchone() == {"triage_estado": "pendiente", "triage_intentos": 0}
+        cur.close()
+
+
+def test_posponer_triage_respeta_la_espera(db, model):
+    with db.connection():
+        tid = model.crear_ticket(None, "t", "d", "hardware", "correctivo")
+        model.reclamar_triage(tid)
+        model.posponer_triage(tid, 60)
+        # 'pendiente', pero ningún catch_up lo ve hasta que pase la espera
+        assert model.tickets_pendientes_triage() == []
+        assert model.reclamar_triage(tid)["triage_intentos"] == 2
+        model.posponer_triage(tid, 0)
+        assert model.tickets_pendientes_triage() == [tid]
+
+
+def test_server_connect_y_crear_base(db):
+    import migrations
+    cnx = db.server_connect()
+    cur = cnx.cursor(dictionary=True)
+    cur.execute("SELECT COUNT(*) AS n FROM tickets")
+    assert cur.fetchone() == {"n": 0}
+    cur.close()
+    cnx.close()
+    migrations.crear_base(db)   # no-op: nada que crear en SQLite
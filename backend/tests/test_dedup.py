@@ -0,0 +1,41 @@
+"""Índice de duplicados: sincronización en segundo plano y búsqueda sin BD."""
+from dedup import DedupIndex
+
+TEXTO = "La impresora de recepción no imprime y marca papel atascado"
+
+
+def _indice(db):
+    dedup = DedupIndex(db)
+    dedup._reconstruir()
+    return dedup
+
+
+def test_buscar_no_consulta_la_bd(db, model, monkeypatch):
+    with db.connection():
+        tid = model.crear_ticket(None, "t", TEXTO, "hardware", "correctivo")
+    dedup = _indice(db)
+
+    def sin_bd():
+        raise AssertionError("buscar() no debe tocar la BD")
+    monkeypatch.setattr(db, "connection", sin_bd)
+    assert dedup.buscar(TEXTO + ".")["id"] == tid
+
+
+def test_sincronizar_incorpora_nuevos_cerrados_y_reabiertos(db, model):
+    dedup = _indice(db)
+    assert dedup.buscar(TEXTO) is None
+    with db.connection():
+        tid = model.crear_ticket(None, "t", TEXTO, "hardware", "correctivo")
+    dedup._sincronizar()
+    assert dedup.buscar(TEXTO)["id"] == tid
+
+    # Cerrado y reabierto por otro worker (sin pasar por on_ticket)
+    with db.connection():
+        model.actualizar_ticket(tid, estado="cerrado")
+    dedup._sincronizar()
+    assert dedup.buscar(TEXTO) is None
+    with db.connection():
+        model.actualizar_ticket(tid, estado="abierto")
+    dedup._sincronizar()
+    assert dedup.buscar(TEXTO)["id"] == tid
+    assert dedup.stats()["sincronizados"] >= 3
@@ -0,0 +1,56 @@
+"""Exportación de tickets en CSV/NDJSON en streaming."""
+import csv
+import io
+import json
+
+import pytest
+
+import export
+
+
+@pytest.fixture
+def tickets(db, model):
+    with db.connection():
+        res = model.crear_tickets_bulk([
+            {"descripcion": f'Línea {i}, con "comillas"\ny salto', "estado": "cerrado" if i % 2 else "abierto"}
+            for i in range(9)])
+    return [r["ticket_id"] for r in res]
+
+
+def test_exporta_todo_lo_filtrado_en_orden_y_trozos(db, model, tickets, monkeypatch):
+    monkeypatch.setattr(export, "TROZO", 200)
+    trozos = list(export.serializar("csv", model.exportar_tickets({"estado": "cerrado"})))
+    assert len(trozos) > 1
+    texto = "".join(trozos)
+    assert texto.startswith("\ufeff")
+    filas = list(csv.DictReader(io.StringIO(texto[1:])))
+    assert [int(f["id"]) for f in filas] == sorted(tickets[1::2], reverse=True)
+    assert filas[0]["descripcion"].endswith('"comillas"\ny salto')
+
+    lineas = "".join(export.serializar("ndjson", model.exportar_tickets())).splitlines()
+    assert [json.loads(l)["id"] for l in lineas] == sorted(tickets, reverse=True)
+    assert list(json.loads(lineas[0])) == list(export.COLUMNAS)
+
+
+def test_filtros_invalidos_fallan_al_llamar(model):
+    with pytest.raises(ValueError):
+        model.exportar_tickets({"estado": "inventado"})
+    with pytest.raises(ValueError):
+        export.serializar("xml", [])
+
+
+def test_exportacion_cortada_no_devuelve_la_conexion_al_pool(db, model, tickets):
+    filas = model.exportar_tickets(lote=2)
+    next(filas)
+    assert db.pool_stats()["in_use"] == 1
+    filas.close()               # cliente desconectado a medias
+    st = db.pool_stats()
+    assert st["in_use"] == 0 and st["idle"] == st["open"]
+
+
+def test_api_export(admin):
+    r = admin.get("/api/tickets/export?format=ndjson&estado=abierto")
+    assert r.status_code == 200 and r.mimetype == "application/x-ndjson"
+    assert r.headers["Content-Disposition"].startswith("attachment;")
+    assert admin.get("/api/tickets/export?format=xml").status_code == 400
+    assert admin.get("/api/tickets/export?estado=inventado").status_code == 400
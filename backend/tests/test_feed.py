@@ -0,0 +1,64 @@
+"""Cambios en vivo del panel: cursores, reanudación y reset."""
+import pytest
+
+from feed import ChangeFeed
+
+
+@pytest.fixture
+def feed(db, model):
+    f = ChangeFeed(model)
+    f.iniciar = lambda: None     # sin hilo: las consultas se hacen a mano con _consultar()
+    return f
+
+
+def _ids(res):
+    return sorted(t["id"] for t in res["tickets"])
+
+
+def test_cursor_de_la_pagina_y_reanudacion(db, model, feed):
+    with db.connection():
+        a = model.crear_ticket(None, "a", "uno", "otros", "correctivo")
+        c0 = ChangeFeed.cursor_inicial(model.marca_datos())
+        feed._consultar()
+        model.actualizar_ticket(a, estado="en_proceso")
+        b = model.crear_ticket(None, "b", "dos", "otros", "correctivo")
+        feed._consultar()
+
+    r1 = feed.esperar(c0, timeout=0)
+    assert not r1["reset"] and _ids(r1) == [a, b]
+    assert r1["stats"]["total"] == 2
+    assert [t["estado"] for t in r1["tickets"] if t["id"] == a] == ["en_proceso"]
+
+    with db.connection():
+        model.actualizar_ticket(b, prioridad="alta")
+        feed._consultar()
+    r2 = feed.esperar(r1["cursor"], timeout=0)
+    assert _ids(r2) == [b] and r2["tickets"][0]["prioridad"] == "alta"
+    # Reconexión con el mismo Last-Event-ID: se reenvía lo mismo, nada más
+    assert _ids(feed.esperar(r1["cursor"], timeout=0)) == [b]
+    assert feed.esperar(r2["cursor"], timeout=0)["tickets"] == []
+
+
+def test_cursor_que_el_bufer_no_cubre_pide_reset(db, model, feed):
+    with db.connection():
+        model.crear_ticket(None, "a", "uno", "otros", "correctivo")
+        feed._consultar()
+    assert feed.esperar("otraepoca.7.1", timeout=0)["reset"] is True
+
+
+def test_sse_reanuda_desde_last_event_id(db, model, feed, routers_app, admin, monkeypatch):
+    routers, _ = routers_app
+    monkeypatch.setattr(routers, "feed", feed)
+    monkeypatch.setenv("FEED_SSE_SEG", "0.2")
+    with db.connection():
+        a = model.crear_ticket(None, "a", "uno", "otros", "correctivo")
+        c0 = ChangeFeed.cursor_inicial(model.marca_datos())
+        feed._consultar()
+        cursor = feed.esperar(c0, timeout=0)["cursor"]
+        model.actualizar_ticket(a, estado="resuelto")
+        feed._consultar()
+    r = admin.get("/api/tickets/feed", headers={"Accept": "text/event-stream", "Last-Event-ID": cursor})
+    cuerpo = r.get_data(as_text=True)
+    assert cuerpo.startswith("retry: 2000")
+    assert "event: cambios" in cuerpo and '"estado": "resuelto"' in cuerpo
+    assert f"id: {feed.esperar(cursor, timeout=0)['cursor']}" in cuerpo
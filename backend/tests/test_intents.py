@@ -0,0 +1,55 @@
+# backend/tests/test_intents.py
+"""IntentEngine con el intents.json que usa /chat."""
+import pytest
+
+from intents import IntentEngine, plegar
+
+
+@pytest.fixture(scope="module")
+def motor():
+    return IntentEngine.from_file()
+
+
+def test_plegar():
+    assert plegar("Mi PC va LEEENTÍSIMA!!") == "mi pc va lentisima"
+
+
+@pytest.mark.parametrize("texto", [
+    "mi pc va lenta",
+    "los equipos estan lentos",
+    "mi pc está lentísima",
+    "la laptop va leeentaaa",
+])
+def test_equipo_lento_con_plurales_y_sufijos(motor, texto):
+    answer, ticket_required, nombre = motor.responder(texto)
+    assert nombre == "equipo_lento"
+    assert ticket_required
+    assert answer.startswith("Entiendo, tu equipo está lento")
+
+
+@pytest.mark.parametrize("texto", ["quiero abrir tickets", "necesito un técnico",
+                                   "hay que reparar la impresora", "mis SSDs fallan"])
+def test_piden_ticket(motor, texto):
+    _, ticket_required, _ = motor.responder(texto)
+    assert ticket_required
+
+
+def test_palabra_completa_sin_prefijo(motor):
+    # "disco" no lleva *: no casa dentro de otra palabra
+    assert motor.detectar("entro a discord") == []
+    assert [it["nombre"] for it in motor.detectar("dos discos duros")] == ["almacenamiento"]
+
+
+def test_prioridad_y_respuesta_por_defecto(motor):
+    nombres = [it["nombre"] for it in motor.detectar("pantalla azul y además va lento")]
+    assert nombres[0] == "equipo_lento"     # prioridad 10
+    assert "pantalla_azul" in nombres
+    answer, ticket_required, nombre = motor.responder("hola, buenas tardes")
+    assert (ticket_required, nombre) == (False, None)
+    assert answer == motor.respuesta_defecto
+
+
+def test_prefijo_en_configuracion_propia():
+    motor = IntentEngine({"intents": [{"nombre": "x", "answer": "ok", "frases": ["configur*"]}]})
+    assert motor.responder("no sé configurarlo")[2] == "x"
+    assert motor.responder("reconfigurar")[2] is None
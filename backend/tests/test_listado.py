@@ -0,0 +1,41 @@
+"""Listado de tickets paginado por cursor con filtros en el servidor."""
+from datetime import datetime
+
+import pytest
+
+from models import decode_cursor, encode_cursor
+
+
+def test_cursor_recorre_todo_sin_repetir_ni_saltar(db, model):
+    with db.connection():
+        res = model.crear_tickets_bulk([
+            {"descripcion": f"caso {i}", "categoria": "redes" if i % 3 else "hardware"}
+            for i in range(23)])
+        esperados = sorted((r["ticket_id"] for i, r in enumerate(res) if i % 3), reverse=True)
+        vistos, cursor, paginas = [], None, 0
+        while True:
+            pagina = model.obtener_tickets(admin=True, filtros={"categoria": "redes"},
+                                           cursor=cursor, limit=5)
+            assert all(t["categoria"] == "redes" for t in pagina["tickets"])
+            vistos += [t["id"] for t in pagina["tickets"]]
+            paginas += 1
+            cursor = pagina["next_cursor"]
+            if not cursor:
+                break
+    # Misma fecha_creacion (mismo segundo): el id desempata
+    assert vistos == esperados
+    assert len(vistos) == 15 and paginas == 3   # la última página no trae next_cursor
+
+
+def test_cursor_es_opaco_y_se_valida(db, model):
+    c = encode_cursor(datetime(2024, 5, 1, 12, 30), 42)
+    assert decode_cursor(c)[1] == 42
+    with db.connection(), pytest.raises(ValueError):
+        model.obtener_tickets(admin=True, cursor="no-es-un-cursor")
+
+
+def test_api_tickets_pagina_y_rechaza_cursor_malo(admin):
+    r = admin.get("/api/tickets?limit=1")
+    assert r.status_code == 200 and "next_cursor" in r.get_json()
+    assert admin.get("/api/tickets?cursor=xyz").status_code == 400
+    assert admin.get("/api/tickets?estado=inventado").status_code == 400
@@ -0,0 +1,143 @@
+# backend/tests/test_llm_client.py
+"""Circuito y CubetaTokens con un reloj falso (sin dormir ni red)."""
+import pytest
+
+import llm_client
+from llm_client import Circuito, CubetaTokens
+
+
+class Reloj:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    r = Reloj()
+    monkeypatch.setattr(llm_client.time, "monotonic", r)
+    return r
+
+
+# ---------- Circuito ----------
+def test_circuito_abre_tras_fallos_seguidos(reloj):
+    c = Circuito(fallos=3, enfriamiento=30)
+    for _ in range(2):
+        assert c.permitir()
+        c.registrar(False)
+    assert c.estado == "cerrado"
+    assert c.permitir()
+    c.registrar(False)
+    assert c.estado == "abierto"
+    assert not c.disponible()
+    assert not c.permitir()
+    assert c.stats()["aperturas"] == 1
+
+
+def test_circuito_exito_reinicia_la_cuenta(reloj):
+    c = Circuito(fallos=2, enfriamiento=30)
+    c.registrar(False)
+    c.registrar(True)
+    c.registrar(False)
+    assert c.estado == "cerrado"
+
+
+def test_circuito_errores_propios_no_cuentan(reloj):
+    c = Circuito(fallos=1, enfriamiento=30)
+    c.registrar(None)
+    assert c.estado == "cerrado"
+
+
+def test_circuito_semiabierto_una_sola_prueba(reloj):
+    c = Circuito(fallos=1, enfriamiento=30)
+    c.registrar(False)
+    reloj.t += 30
+    assert c.estado == "semiabierto"
+    assert c.disponible()
+    assert c.permitir()
+    # Con la prueba en curso no sale ninguna otra
+    assert not c.disponible()
+    assert not c.permitir()
+
+
+def test_circuito_prueba_buena_cierra(reloj):
+    c = Circuito(fallos=1, enfriamiento=30)
+    c.registrar(False)
+    reloj.t += 31
+    assert c.permitir()
+    c.registrar(True)
+    assert c.estado == "cerrado"
+    assert c.permitir() and c.permitir()
+
+
+def test_circuito_prueba_mala_vuelve_a_abrir(reloj):
+    c = Circuito(fallos=5, enfriamiento=30)
+    for _ in range(5):
+        c.registrar(False)
+    reloj.t += 31
+    assert c.permitir()
+    c.registrar(False)      # un solo fallo en semiabierto basta
+    assert c.estado == "abierto"
+    assert c.stats()["aperturas"] == 1   # sigue siendo la misma apertura
+    reloj.t += 29
+    assert not c.permitir()
+    reloj.t += 1
+    assert c.permitir()
+
+
+def test_circuito_prueba_con_error_propio_libera_el_hueco(reloj):
+    c = Circuito(fallos=1, enfriamiento=30)
+    c.registrar(False)
+    reloj.t += 30
+    assert c.permitir()
+    c.registrar(None)
+    assert c.estado == "semiabierto"
+    assert c.permitir()
+
+
+# ---------- CubetaTokens ----------
+def test_cubeta_sin_tasa_no_limita(reloj):
+    b = CubetaTokens(0, 0)
+    assert b.reservar(10 ** 9, espera_max=0) == 0.0
+
+
+def test_cubeta_empieza_llena_y_luego_hace_esperar(reloj):
+    b = CubetaTokens(tasa=1.0, capacidad=5)
+    for _ in range(5):
+        assert b.reservar(1, espera_max=0) == 0.0
+    assert b.reservar(1, espera_max=10) == pytest.approx(1.0)
+    # El saldo quedó en negativo: el siguiente espera detrás
+    assert b.reservar(1, espera_max=10) == pytest.approx(2.0)
+
+
+def test_cubeta_rechaza_sin_tomar_nada(reloj):
+    b = CubetaTokens(tasa=1.0, capacidad=2)
+    b.reservar(2, espera_max=0)
+    assert b.reservar(1, espera_max=0.5) is None
+    reloj.t += 1
+    assert b.reservar(1, espera_max=0) == 0.0
+
+
+def test_cubeta_se_recarga_hasta_la_capacidad(reloj):
+    b = CubetaTokens(tasa=2.0, capacidad=4)
+    b.reservar(4, espera_max=0)
+    reloj.t += 1
+    assert b.reservar(2, espera_max=0) == 0.0
+    reloj.t += 100
+    assert b.reservar(4, espera_max=0) == 0.0
+    assert b.reservar(1, espera_max=0) is None
+
+
+def test_cubeta_pedido_mayor_que_la_capacidad(reloj):
+    # Se recorta a la capacidad: si no, no saldría nunca
+    b = CubetaTokens(tasa=1.0, capacidad=3)
+    assert b.reservar(100, espera_max=0) == 0.0
+
+
+def test_cubeta_devolver(reloj):
+    b = CubetaTokens(tasa=1.0, capacidad=3)
+    b.reservar(3, espera_max=0)
+    b.devolver(3)
+    assert b.reservar(3, espera_max=0) == 0.0
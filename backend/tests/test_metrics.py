@@ -0,0 +1,104 @@
+# backend/tests/test_metrics.py
+"""Suma de métricas entre procesos (METRICS_DIR) e instrumentación HTTP."""
+import json
+import os
+import re
+import time
+
+import pytest
+from flask import Flask
+
+import metrics
+
+
+def _valor(texto, linea):
+    m = re.search(rf"^{re.escape(linea)} (\S+)$", texto, re.M)
+    return float(m.group(1)) if m else None
+
+
+@pytest.fixture
+def registro(monkeypatch, tmp_path):
+    r = metrics.Registro()
+    c = r.contador("peticiones_total", "Peticiones", ("ruta",))
+    g = r.medidor("en_curso", "En curso", ("ruta",))
+    h = r.histograma("latencia_segundos", "Latencia", (), (0.1, 1))
+    r.recolector(lambda: [("pool_abiertas", "gauge", "Conexiones", {}, 2),
+                          ("pool_esperas_total", "counter", "Esperas", {}, 3)])
+    monkeypatch.setattr(metrics, "DIRECTORIO", str(tmp_path))
+    monkeypatch.setattr(metrics, "REGISTRO", r)
+    c.inc("/a", n=5)
+    g.inc("/a")
+    h.observar(0.05)
+    return r
+
+
+def _volcado_de_otro(registro, ruta):
+    inst = registro.instantanea()
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(inst, f)
+
+
+def _pid_muerto():
+    pid = 4_000_000
+    while metrics._vivo(pid):
+        pid += 1
+    return pid
+
+
+def test_sin_directorio_solo_el_proceso(registro, monkeypatch):
+    monkeypatch.setattr(metrics, "DIRECTORIO", None)
+    texto = registro.exponer()
+    assert _valor(texto, 'peticiones_total{ruta="/a"}') == 5
+    assert _valor(texto, "pool_abiertas") == 2
+
+
+def test_suma_procesos_vivos_y_muertos(registro, tmp_path):
+    _volcado_de_otro(registro, tmp_path / f"{os.getppid()}.json")   # vivo
+    _volcado_de_otro(registro, tmp_path / f"{_pid_muerto()}.json")
+    texto = registro.exponer()
+    assert _valor(texto, 'peticiones_total{ruta="/a"}') == 15
+    assert _valor(texto, 'latencia_segundos_bucket{le="0.1"}') == 3
+    assert _valor(texto, "latencia_segundos_count") == 3
+    assert _valor(texto, "pool_esperas_total") == 9
+    # Los medidores de un proceso que ya no existe no cuentan
+    assert _valor(texto, 'en_curso{ruta="/a"}') == 2
+    assert _valor(texto, "pool_abiertas") == 4
+    # El propio proceso también dejó su volcado
+    assert (tmp_path / f"{os.getpid()}.json").exists()
+
+
+def test_proceso_terminado_conserva_contadores(registro, tmp_path):
+    for _ in range(2):
+        pid = _pid_muerto()
+        _volcado_de_otro(registro, tmp_path / f"{pid}.json")
+        metrics.proceso_terminado(pid)
+        assert not (tmp_path / f"{pid}.json").exists()
+    muertos = json.loads((tmp_path / "muertos.json").read_text())
+    assert "en_curso" not in muertos["metricas"]
+    texto = registro.exponer()
+    assert _valor(texto, 'peticiones_total{ruta="/a"}') == 15
+    assert _valor(texto, "latencia_segundos_count") == 3
+    assert _valor(texto, "pool_esperas_total") == 9
+    assert _valor(texto, 'en_curso{ruta="/a"}') == 1
+    assert _valor(texto, "pool_abiertas") == 2
+
+
+def test_excepcion_sin_manejar_registra_su_duracion(monkeypatch):
+    h = metrics.Histograma("http_prueba_segundos", "", ("ruta", "metodo", "codigo"), (0.01, 1))
+    monkeypatch.setattr(metrics, "http_segundos", h)
+    app = Flask(__name__)
+    # La excepción sale de Flask sin respuesta 500: after_request no corre
+    app.config["PROPAGATE_EXCEPTIONS"] = True
+    metrics.instrumentar(app)
+
+    @app.route("/falla")
+    def falla():
+        time.sleep(0.05)
+        raise RuntimeError("x")
+
+    with pytest.raises(RuntimeError):
+        app.test_client().get("/falla")
+    [(vals, s)] = h.series()
+    assert vals == ["/falla", "GET", 500]
+    assert s[-1] == 1
+    assert s[-2] >= 0.05
@@ -0,0 +1,54 @@
+"""PATCH /api/tickets: edición en lote del panel en una sola transacción."""
+import pytest
+
+
+@pytest.fixture
+def tickets(routers_app):
+    routers, _ = routers_app
+    with routers.db.connection():
+        res = routers.ticket_model.crear_tickets_bulk(
+            [{"descripcion": f"lote {i}", "categoria": "software"} for i in range(3)])
+    return [r["ticket_id"] for r in res]
+
+
+def _estados(routers, ids):
+    with routers.db.connection():
+        cur = routers.db.cursor()
+        cur.execute(f"SELECT id, estado, categoria FROM tickets WHERE id IN ({', '.join(['%s'] * len(ids))})",
+                    ids)
+        filas = {f["id"]: (f["estado"], f["categoria"]) for f in cur.fetchall()}
+        cur.close()
+    return filas
+
+
+def test_aplica_los_cambios_y_reporta_no_encontrados(routers_app, admin, tickets):
+    a, b, c = tickets
+    r = admin.patch("/api/tickets", json={"updates": [
+        {"id": a, "changes": {"estado": "cerrado"}},
+        {"id": b, "changes": {"estado": "cerrado", "categoria": "redes"}},
+        {"id": 999999, "changes": {"estado": "cerrado"}}]})
+    assert r.status_code == 200
+    assert r.get_json()["actualizados"] == [a, b]
+    assert r.get_json()["no_encontrados"] == [999999]
+    assert _estados(routers_app[0], tickets) == {
+        a: ("cerrado", "software"), b: ("cerrado", "redes"), c: ("abierto", "software")}
+
+
+@pytest.mark.parametrize("cambio", [
+    {"estado": "archivado"},          # fuera del ENUM
+    {"notas_admin": "x"},             # campo no editable en lote
+    {"prioridad": None},
+])
+def test_valida_contra_filtros_enum_y_no_toca_nada(routers_app, admin, tickets, cambio):
+    a, b, _ = tickets
+    r = admin.patch("/api/tickets", json={"updates": [
+        {"id": a, "changes": {"estado": "resuelto"}}, {"id": b, "changes": cambio}]})
+    assert r.status_code == 400
+    assert _estados(routers_app[0], [a])[a][0] == "abierto"
+
+
+def test_entradas_mal_formadas(admin, tickets):
+    assert admin.patch("/api/tickets", json={"updates": []}).status_code == 400
+    assert admin.patch("/api/tickets", json={"updates": [{"changes": {}}]}).status_code == 400
+    assert admin.patch("/api/tickets", json={"updates": [{"id": tickets[0], "changes": ["estado"]}]}
+                       ).status_code == 400
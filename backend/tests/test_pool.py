@@ -0,0 +1,95 @@
+"""Pool de models.Database con conexiones falsas (sin servidor MySQL)."""
+import threading
+import time
+
+import mysql.connector
+import pytest
+
+from models import Database, PoolTimeout
+
+
+class ConexionFalsa:
+    def __init__(self):
+        self.viva = True
+        self.cerrada = False
+        self.in_transaction = False
+
+    def ping(self, reconnect=False):
+        if not self.viva:
+            raise mysql.connector.errors.InterfaceError("conexión caída")
+
+    def rollback(self):
+        self.in_transaction = False
+
+    def close(self):
+        self.cerrada = True
+
+
+class PoolFalso(Database):
+    def __init__(self):
+        self._iniciar_pool()
+        self.creadas = []
+
+    def _new_connection(self):
+        cnx = ConexionFalsa()
+        cnx._pool_born = cnx._pool_used = time.monotonic()
+        self.creadas.append(cnx)
+        return cnx
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "2")
+    monkeypatch.setenv("DB_POOL_TIMEOUT", "0.05")
+    monkeypatch.setenv("DB_POOL_RECYCLE", "1800")
+    monkeypatch.setenv("DB_POOL_PING_IDLE", "0")
+    return PoolFalso()
+
+
+def test_cada_hilo_reutiliza_su_conexion(pool):
+    with pool.connection() as cnx:
+        assert pool.connect() is cnx
+        with pool.connection() as otra:    # reentrante: no suelta la del hilo
+            assert otra is cnx
+        assert pool.connect() is cnx
+        de_otro_hilo = []
+        t = threading.Thread(target=lambda: de_otro_hilo.append(pool.acquire()))
+        t.start()
+        t.join()
+        assert de_otro_hilo[0] is not cnx
+        pool.release(de_otro_hilo[0])
+    assert pool.pool_stats()["in_use"] == 0
+
+
+def test_end_request_devuelve_la_conexion_al_pool(pool):
+    cnx = pool.connect()
+    cnx.in_transaction = True
+    pool.end_request()
+    st = pool.pool_stats()
+    assert (st["in_use"], st["idle"], st["open"]) == (0, 1, 1)
+    assert not cnx.in_transaction          # la transacción abierta se deshizo
+    assert pool.connect() is cnx           # la siguiente petición la reutiliza
+    assert len(pool.creadas) == 1
+    pool.end_request()
+
+
+def test_conexion_caida_se_reemplaza(pool):
+    vieja = pool.connect()
+    pool.end_request()
+    vieja.viva = False
+    nueva = pool.connect()
+    assert nueva is not vieja and vieja.cerrada
+    st = pool.pool_stats()
+    assert (st["reconnects"], st["open"], st["in_use"]) == (1, 1, 1)
+    pool.end_request()
+
+
+def test_pool_agotado_da_pool_timeout(pool):
+    a, b = pool.acquire(), pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert pool.pool_stats()["timeouts"] == 1
+    pool.release(a)
+    pool.release(b, discard=True)
+    st = pool.pool_stats()
+    assert (st["open"], st["idle"], st["in_use"]) == (1, 1, 0)
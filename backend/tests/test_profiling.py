@@ -0,0 +1,61 @@
+"""Perfilado de peticiones bajo demanda."""
+import time
+
+import pytest
+from flask import Flask
+
+from profiling import Perfilador
+
+
+def trabajo_lento():
+    time.sleep(0.01)
+    return "ok"
+
+
+@pytest.fixture
+def perfilador(tmp_path):
+    return Perfilador(directorio=str(tmp_path / "profiles"), maximo=2, activo=True)
+
+
+@pytest.fixture
+def app(perfilador):
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.add_url_rule("/lenta", "lenta", trabajo_lento)
+    app.add_url_rule("/falla", "falla", lambda: 1 / 0)
+    perfilador.instrumentar(app)
+    return app
+
+
+def _como(cliente, rol):
+    with cliente.session_transaction() as s:
+        s["role"] = rol
+    return cliente
+
+
+def test_solo_perfila_lo_que_pide_un_admin(app, perfilador):
+    c = app.test_client()
+    assert "X-Profile-Id" not in _como(c, "usuario").get("/lenta", headers={"X-Profile": "1"}).headers
+    assert "X-Profile-Id" not in _como(c, "admin").get("/lenta").headers
+    nombre = _como(c, "admin").get("/lenta?_profile=1").headers["X-Profile-Id"]
+    assert [p["nombre"] for p in perfilador.listar()] == [nombre]
+    assert perfilador.listar()[0]["ruta"] == "lenta"
+    assert "trabajo_lento" in perfilador.resumen(nombre, orden="tottime")
+
+
+def test_conserva_los_mas_recientes_y_libera_tras_un_error(app, perfilador):
+    c = _como(app.test_client(), "admin")
+    app.config["PROPAGATE_EXCEPTIONS"] = False
+    assert c.get("/falla", headers={"X-Profile": "1"}).status_code == 500
+    assert perfilador.stats()["en_curso"] is False
+    nombres = [c.get("/lenta", headers={"X-Profile": "1"}).headers["X-Profile-Id"] for _ in range(3)]
+    assert [p["nombre"] for p in perfilador.listar()] == sorted(nombres[1:], reverse=True)
+
+
+def test_apagado_y_nombres_ajenos(app, perfilador):
+    assert perfilador.ruta_archivo("../routers.py") is None
+    assert perfilador.resumen("no-existe.prof") is None
+    perfilador.activo = False
+    c = _como(app.test_client(), "admin")
+    assert "X-Profile-Id" not in c.get("/lenta", headers={"X-Profile": "1"}).headers
+    assert perfilador.listar() == []
@@ -0,0 +1,60 @@
+"""Respuestas del chat sacadas de tickets resueltos (índice BM25 local)."""
+from retrieval import RetrievalIndex
+
+PREGUNTA = "la impresora de la oficina no imprime y parpadea la luz naranja"
+
+
+def _resolver(model, descripcion, solucion, **extra):
+    tid = model.crear_ticket(None, "Impresora", descripcion, "hardware", "correctivo")
+    model.actualizar_ticket(tid, estado="resuelto", solucion_ia=solucion, **extra)
+    return tid
+
+
+def test_responde_con_la_solucion_de_un_resuelto_parecido(db, model, tmp_path):
+    with db.connection():
+        _resolver(model, "La impresora de la oficina no imprime, parpadea la luz naranja",
+                  "Saca el tóner, limpia los contactos y vuelve a colocarlo.", notas_admin="interno")
+        model.crear_ticket(None, "Red", "No hay internet en la sala de juntas", "redes", "correctivo")
+    idx = RetrievalIndex(db, path=str(tmp_path / "r.idx"))
+    idx._cargar()
+    hit = idx.mejor_respuesta(PREGUNTA)
+    assert hit["solucion"].startswith("Saca el tóner")
+    assert idx.mejor_respuesta("el teclado escribe letras raras") is None
+
+    # El archivo se reabre con mmap sin reconstruir
+    otro = RetrievalIndex(db, path=str(tmp_path / "r.idx"))
+    otro._cargar()
+    assert otro.stats()["docs_base"] == 1
+    assert otro.mejor_respuesta(PREGUNTA)["id"] == hit["id"]
+    otro._base.cerrar()
+    idx._base.cerrar()
+
+
+def test_sincroniza_los_resueltos_nuevos_y_olvida_los_reabiertos(db, model, tmp_path):
+    idx = RetrievalIndex(db, path=str(tmp_path / "r.idx"))
+    idx._cargar()
+    assert idx.mejor_respuesta(PREGUNTA) is None
+    with db.connection():
+        tid = _resolver(model, "La impresora de la oficina no imprime, parpadea la luz naranja",
+                        "Cambia el cartucho.")
+    idx._sincronizar()
+    assert idx.mejor_respuesta(PREGUNTA)["id"] == tid
+    with db.connection():
+        model.actualizar_ticket(tid, estado="abierto")
+    idx._sincronizar()
+    assert idx.mejor_respuesta(PREGUNTA) is None
+    idx._base.cerrar()
+
+
+def test_chat_no_muestra_id_ni_notas(routers_app, cliente, monkeypatch):
+    routers, _ = routers_app
+
+    class Indice:
+        def iniciar(self):
+            pass
+
+        def mejor_respuesta(self, texto):
+            return {"id": 77, "titulo": "t", "score": 9.0, "solucion": "Reinicia el equipo."}
+    monkeypatch.setattr(routers, "retrieval", Indice())
+    answer = cliente.post("/chat", json={"message": PREGUNTA}).get_json()["answer"]
+    assert "Reinicia el equipo." in answer and "77" not in answer
@@ -0,0 +1,62 @@
+# backend/tests/test_search.py
+"""Búsqueda con el índice local (modo de DB_BACKEND=sqlite)."""
+import time
+
+import pytest
+
+from search import TicketSearch
+
+
+@pytest.fixture
+def busqueda(db, model, tmp_path):
+    with db.connection():
+        model.crear_tickets_bulk([
+            {"descripcion": f"La impresora {i} no imprime",
+             "categoria": "redes" if i % 10 == 0 else "hardware"}
+            for i in range(60)
+        ])
+    ts = TicketSearch(model, local_path=str(tmp_path / "search.idx"))
+    assert ts.backend == "local"
+    ts.iniciar()
+    for _ in range(100):
+        if ts.local.stats()["listo"]:
+            break
+        time.sleep(0.05)
+    return ts
+
+
+def test_filtros_no_dejan_paginas_incompletas(db, busqueda):
+    # 6 de 60 coinciden con el filtro: quedan fuera de los primeros candidatos
+    with db.connection():
+        res = busqueda.buscar("impresora", {"categoria": "redes"}, limit=5)
+        assert len(res["tickets"]) == 5
+        assert res["next_offset"] == 5
+        assert {t["categoria"] for t in res["tickets"]} == {"redes"}
+        res2 = busqueda.buscar("impresora", {"categoria": "redes"}, limit=5, offset=5)
+    assert len(res2["tickets"]) == 1
+    assert res2["next_offset"] is None
+    ids = [t["id"] for t in res["tickets"] + res2["tickets"]]
+    assert len(set(ids)) == 6
+
+
+def test_sin_resultados(db, busqueda):
+    with db.connection():
+        res = busqueda.buscar("impresora", {"categoria": "software"}, limit=5)
+    assert res == {"tickets": [], "next_offset": None, "motor": "local"}
+
+
+def test_crear_local_una_sola_vez_entre_hilos(model, tmp_path):
+    import threading
+    ts = TicketSearch(model, backend="fulltext", local_path=str(tmp_path / "search.idx"))
+    barrera = threading.Barrier(8)
+
+    def caer_a_local():
+        barrera.wait()
+        ts._crear_local()
+    hilos = [threading.Thread(target=caer_a_local) for _ in range(8)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    assert ts.backend == "local"
+    assert model._oyentes == [ts.local.on_ticket]
@@ -0,0 +1,51 @@
+"""ticket_stats: contadores y marca de versión al día tras cada escritura."""
+from models import TicketModel
+
+
+def _contado(db):
+    """Lo que deberían decir los contadores, contado directamente en tickets."""
+    cur = db.cursor()
+    cur.execute("SELECT COUNT(*) AS n FROM tickets")
+    res = {"total": cur.fetchone()["n"], "estados": {}, "tipos": {}, "categorias": {}}
+    for dim, destino in (("estado", "estados"), ("tipo", "tipos"), ("categoria", "categorias")):
+        cur.execute(f"SELECT {dim} AS v, COUNT(*) AS n FROM tickets GROUP BY {dim}")
+        res[destino] = {f["v"]: f["n"] for f in cur.fetchall()}
+    cur.close()
+    return res
+
+
+def _comprobar(db, model: TicketModel, version_previa: int) -> int:
+    assert model._stats_resumen_db() == _contado(db)
+    version = model.marca_datos()["version"]
+    assert version > version_previa
+    return version
+
+
+def test_contadores_y_version_tras_cada_escritura(db, model):
+    with db.connection():
+        v = model.marca_datos()["version"]
+        a = model.crear_ticket(None, "a", "no arranca", "hardware", "correctivo")
+        v = _comprobar(db, model, v)
+
+        res = model.crear_tickets_bulk([
+            {"descripcion": f"caso {i}", "categoria": ("redes", "software")[i % 2],
+             "tipo": "preventivo"} for i in range(5)])
+        ids = [r["ticket_id"] for r in res]
+        v = _comprobar(db, model, v)
+
+        model.actualizar_ticket(a, estado="en_proceso", categoria="redes")
+        v = _comprobar(db, model, v)
+
+        # Lote con cambios distintos, uno repetido y un id inexistente
+        model.actualizar_tickets([(ids[0], {"estado": "resuelto"}), (ids[1], {"estado": "resuelto"}),
+                                  (ids[2], {"tipo": "correctivo", "estado": "cerrado"}),
+                                  (ids[2], {"estado": "cerrado"}), (999999, {"estado": "cerrado"})])
+        v = _comprobar(db, model, v)
+
+        # Cambios que no tocan dimensiones: los contadores no se mueven, la versión sí
+        model.actualizar_ticket(ids[3], notas_admin="revisado")
+        v = _comprobar(db, model, v)
+
+        # Reconciliación: mismos totales y la versión sigue subiendo
+        model.reconstruir_stats()
+        _comprobar(db, model, v)
@@ -0,0 +1,97 @@
+# backend/tests/test_triage.py
+"""TriageWorker._procesar con un modelo en memoria (sin hilos ni BD)."""
+from contextlib import contextmanager
+
+import pytest
+
+from llm_client import CircuitoAbierto, IASaturada
+from triage import TriageWorker
+
+
+class BD:
+    @contextmanager
+    def connection(self):
+        yield
+
+
+class Modelo:
+    def __init__(self):
+        self.db = BD()
+        self.tickets = {1: {"estado": "pendiente", "intentos": 0}}
+
+    def reclamar_triage(self, tid):
+        t = self.tickets[tid]
+        if t["estado"] != "pendiente":
+            return None
+        t["estado"], t["intentos"] = "procesando", t["intentos"] + 1
+        return {"id": tid, "descripcion": "no enciende", "categoria": "hardware",
+                "triage_intentos": t["intentos"]}
+
+    def devolver_triage(self, tid):
+        t = self.tickets[tid]
+        t["estado"], t["intentos"] = "pendiente", t["intentos"] - 1
+        return True
+
+    def posponer_triage(self, tid, segundos):
+        self.tickets[tid]["estado"], self.tickets[tid]["espera"] = "pendiente", segundos
+
+    def actualizar_ticket(self, tid, **campos):
+        self.tickets[tid]["estado"] = campos.get("triage_estado")
+
+
+class LLM:
+    def disponible(self):
+        return True
+
+
+class Agente:
+    def __init__(self, error=None, respuesta=None):
+        self.llm = LLM()
+        self.error = error
+        self.respuesta = respuesta
+
+    def analizar_problema(self, descripcion, categoria, fallback=True):
+        if self.error:
+            raise self.error
+        return self.respuesta
+
+
+@pytest.mark.parametrize("error", [CircuitoAbierto("abierto"), IASaturada("sin cupo")])
+def test_ia_no_disponible_no_gasta_intentos(error):
+    modelo = Modelo()
+    w = TriageWorker(modelo, Agente(error), reintentos=1)
+    for _ in range(5):
+        assert w._procesar(1) is False
+    assert modelo.tickets[1] == {"estado": "pendiente", "intentos": 0}
+    assert w.stats()["pospuestos"] == 5
+    assert w.stats()["errores"] == 0
+
+
+def test_fallo_del_proveedor_gasta_intentos():
+    modelo = Modelo()
+    w = TriageWorker(modelo, Agente(RuntimeError("500")), reintentos=1)
+    assert w._procesar(1) is False
+    assert modelo.tickets[1] == {"estado": "error", "intentos": 1}
+    assert w.stats()["errores"] == 1
+
+
+@pytest.mark.parametrize("respuesta", [["paso"], "texto", {"solucion": "x", "pasos": "uno"}])
+def test_respuesta_con_otra_forma_es_un_fallo(respuesta):
+    modelo = Modelo()
+    w = TriageWorker(modelo, Agente(respuesta=respuesta), reintentos=2, espera_base=1000)
+    # Primer intento: se pospone (la espera queda en la BD) y sigue vivo esperando el Timer
+    assert w._procesar(1) is True
+    assert modelo.tickets[1]["estado"] == "pendiente"
+    assert modelo.tickets[1]["espera"] == 1000
+    # Segundo: agotado -> 'error', no se queda 'procesando'
+    assert w._procesar(1) is False
+    assert modelo.tickets[1]["estado"] == "error"
+
+
+def test_respuesta_valida():
+    modelo = Modelo()
+    w = TriageWorker(modelo, Agente(respuesta={"solucion": "Reiniciar", "pasos": ["a", "b"],
+                                               "requiere_admin": False}))
+    assert w._procesar(1) is False
+    assert modelo.tickets[1]["estado"] == "hecho"
+    assert w._texto_solucion({"solucion": " Reiniciar ", "pasos": ["a", "b"]}) == "Reiniciar\n1) a\n2) b"
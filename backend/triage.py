@@ -0,0 +1,213 @@
+# backend/triage.py
+"""
+Triage IA en segundo plano.
+
+Al crearse, cada ticket nace con triage_estado='pendiente' (marca durable en la
+BD) y su id se encola aquí; el alta sólo paga el INSERT. Un pool acotado de
+hilos llama a AIAgent.analizar_problema y guarda solucion_ia / asignado_admin
+con TicketModel.actualizar_ticket.
+
+- Reintentos con espera exponencial; agotados -> triage_estado='error'. La
+  espera se guarda en triage_reintentar_en (migración 9), así ningún otro
+  proceso lo recoge antes. Una respuesta con otra forma que la pedida
+  (lista, texto...) cuenta como fallo.
+- Con el circuito de la IA abierto (llm_client.py) no se reclaman tickets:
+  siguen 'pendiente', sin gastar intentos, hasta la siguiente pasada. Si se
+  abre o se acaba el cupo con el ticket ya reclamado (IANoDisponible), vuelve
+  a 'pendiente' y se le devuelve el intento.
+- Si la cola está llena el ticket queda 'pendiente' y lo recoge la pasada de
+  recuperación, que también corre al arrancar (tickets que quedaron sin
+  triage tras un reinicio) y cada TRIAGE_CATCHUP_SEG segundos. No repite
+  los que ya están en la cola, en proceso o esperando su reintento.
+- reclamar_triage() hace el paso pendiente -> procesando de forma atómica, así
+  varios procesos pueden compartir la misma BD sin triagear dos veces.
+"""
+import math
+import os
+import queue
+import threading
+from typing import Optional, Set
+
+from llm_client import IANoDisponible
+
+
+class TriageWorker:
+    def __init__(self, model, agent, workers: int = 2, max_cola: int = 1000,
+                 reintentos: int = 3, espera_base: float = 2.0, intervalo_catchup: float = 60.0):
+        self.model = model
+        self.agent = agent
+        self.workers = workers
+        self.reintentos = reintentos
+        self.espera_base = espera_base
+        self.intervalo_catchup = intervalo_catchup
+        self._cola: "queue.Queue[int]" = queue.Queue(maxsize=max_cola)
+        self._parar = threading.Event()
+        self._hilos = []
+        self._lock = threading.Lock()
+        # Ids en la cola, en proceso o esperando su reintento: catch_up no los repite
+        self._vivos: Set[int] = set()
+        self._stats = {"encolados": 0, "descartados": 0, "repetidos": 0, "hechos": 0,
+                       "reintentos": 0, "errores": 0, "pospuestos": 0}
+
+    @classmethod
+    def from_env(cls, model, agent) -> "TriageWorker":
+        return cls(model, agent,
+                   workers=int(os.getenv("TRIAGE_WORKERS", "2")),
+                   max_cola=int(os.getenv("TRIAGE_MAX_COLA", "1000")),
+                   reintentos=int(os.getenv("TRIAGE_REINTENTOS", "3")),
+                   intervalo_catchup=float(os.getenv("TRIAGE_CATCHUP_SEG", "60")))
+
+    # ---------- ciclo de vida ----------
+    def iniciar(self):
+        """Arranca los hilos (idempotente). Llamarlo después del fork de los workers."""
+        with self._lock:
+            if self._hilos:
+                return
+            for n in range(self.workers):
+                t = threading.Thread(target=self._loop, name=f"triage-{n}", daemon=True)
+                t.start()
+                self._hilos.append(t)
+            t = threading.Thread(target=self._loop_catchup, name="triage-catchup", daemon=True)
+            t.start()
+            self._hilos.append(t)
+
+    def detener(self):
+        self._parar.set()
+
+    # ---------- entrada ----------
+    def on_ticket(self, evento, ticket_ids, campos):
+        """Oyente de TicketModel.suscribir: encola cada alta."""
+        if evento == 'alta':
+            for tid in ticket_ids:
+                self.encolar(tid)
+
+    def encolar(self, ticket_id: int, reintento: bool = False) -> bool:
+        """
+        No bloquea: si la cola está llena el ticket sigue 'pendiente' en la BD.
+        Un id que ya está vivo (en cola, en proceso o esperando reintento) no
+        se vuelve a encolar; reintento=True es el Timer de ese mismo id.
+        """
+        with self._lock:
+            if ticket_id in self._vivos and not reintento:
+                self._stats["repetidos"] += 1
+                return False
+            self._vivos.add(ticket_id)
+        try:
+            self._cola.put_nowait(ticket_id)
+        except queue.Full:
+            self._soltar(ticket_id)
+            self._contar("descartados")
+            return False
+        self._contar("encolados")
+        return True
+
+    def _soltar(self, ticket_id: int):
+        with self._lock:
+            self._vivos.discard(ticket_id)
+
+    def catch_up(self) -> int:
+        """Encola los 'pendiente' de la BD (y rescata 'procesando' abandonados)."""
+        with self.model.db.connection():
+            self.model.liberar_triage_vencidos()
+            ids = self.model.tickets_pendientes_triage(limit=self._cola.maxsize)
+        return sum(1 for tid in ids if self.encolar(tid))
+
+    def stats(self):
+        with self._lock:
+            st = dict(self._stats)
+            st["vivos"] = len(self._vivos)
+        st["en_cola"] = self._cola.qsize()
+        return st
+
+    # ---------- hilos ----------
+    def _contar(self, clave: str):
+        with self._lock:
+            self._stats[clave] += 1
+
+    def _loop_catchup(self):
+        while not self._parar.is_set():
+            try:
+                self.catch_up()
+            except Exception as e:
+                print("Error en catch-up de triage:", e)
+            self._parar.wait(self.intervalo_catchup)
+
+    def _loop(self):
+        while not self._parar.is_set():
+            try:
+                tid = self._cola.get(timeout=1)
+            except queue.Empty:
+                continue
+            sigue = False
+            try:
+                sigue = self._procesar(tid)
+            except Exception as e:
+                print(f"Error de triage en ticket {tid}:", e)
+            finally:
+                if not sigue:
+                    self._soltar(tid)
+                self._cola.task_done()
+
+    def _procesar(self, ticket_id: int) -> bool:
+        """True si el ticket queda esperando un reintento (sigue vivo)."""
+        if not self.agent.llm.disponible():
+            self._contar("pospuestos")
+            return False  # lo vuelve a encolar catch_up()
+        with self.model.db.connection():
+            ticket = self.model.reclamar_triage(ticket_id)
+        if not ticket:
+            return False  # ya lo tomó otro worker/proceso
+
+        # La llamada a la IA (lenta) se hace sin conexión de BD prestada
+        try:
+            res = self.agent.analizar_problema(ticket['descripcion'], ticket['categoria'],
+                                               fallback=False)
+            # JSON válido pero con otra forma (lista, texto...): cuenta como fallo
+            if not isinstance(res, dict):
+                raise ValueError(f"respuesta de la IA inesperada ({type(res).__name__})")
+            solucion = self._texto_solucion(res)
+            asignado = bool(res.get('requiere_admin') or res.get('es_complejo'))
+        except IANoDisponible:
+            # Circuito abierto o sin cupo: no es un fallo del ticket, no gasta intento
+            with self.model.db.connection():
+                self.model.devolver_triage(ticket_id)
+            self._contar("pospuestos")
+            return False  # lo vuelve a encolar catch_up()
+        except Exception as e:
+            return self._fallo(ticket, e)
+
+        with self.model.db.connection():
+            self.model.actualizar_ticket(ticket_id, solucion_ia=solucion,
+                                         asignado_admin=asignado, triage_estado='hecho')
+        self._contar("hechos")
+        return False
+
+    def _fallo(self, ticket, error: Exception) -> bool:
+        intentos = int(ticket.get('triage_intentos') or 1)
+        with self.model.db.connection():
+            if intentos >= self.reintentos:
+                self.model.actualizar_ticket(ticket['id'], triage_estado='error')
+                self._contar("errores")
+                print(f"Triage del ticket {ticket['id']} abandonado tras {intentos} intentos:", error)
+                return False
+            # triage_reintentar_en: el catch_up de otro proceso tampoco lo toma antes
+            espera = self.espera_base * (2 ** (intentos - 1))
+            self.model.posponer_triage(ticket['id'], math.ceil(espera))
+        self._contar("reintentos")
+        timer = threading.Timer(espera, self.encolar, args=(ticket['id'], True))
+        timer.daemon = True
+        timer.start()
+        return True
+
+    @staticmethod
+    def _texto_solucion(res) -> Optional[str]:
+        """Lanza ValueError si solucion/pasos no tienen la forma pedida en el prompt."""
+        texto = res.get('solucion') or ''
+        pasos = res.get('pasos') or []
+        if not isinstance(texto, str) or not isinstance(pasos, list):
+            raise ValueError("respuesta de la IA inesperada (solucion/pasos)")
+        texto = texto.strip()
+        if pasos:
+            texto += "\n" + "\n".join(f"{i}) {p}" for i, p in enumerate(pasos, 1))
+        return texto or None
+
@@ -0,0 +1,5 @@
+# backend/wsgi.py
+"""Punto de entrada WSGI de producción: gunicorn -c gunicorn.conf.py (usa wsgi:app)."""
+from routers import create_app
+
+app = create_app()
@@ -1,38 +1,37 @@
+-- Generado con: python backend/migrations.py sql
+-- Referencia únicamente: el esquema lo aplica backend/migrations.py (tabla schema_version).
 CREATE DATABASE IF NOT EXISTS soporte_ia CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
 USE soporte_ia;
 
-CREATE TABLE IF NOT EXISTS usuarios (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    nombre VARCHAR(100) NOT NULL,
-    email VARCHAR(100) UNIQUE NOT NULL,
-    tipo ENUM('usuario', 'admin') DEFAULT 'usuario',
-    fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
-
-CREATE TABLE IF NOT EXISTS tickets (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    usuario_id INT,
-    nombre VARCHAR(100),
-    telefono VARCHAR(30),
-    domicilio VARCHAR(200),
-    titulo VARCHAR(200),
-    descripcion TEXT NOT NULL,
-    categoria ENUM('hardware', 'software', 'redes', 'otros') NOT NULL,
-    tipo ENUM('preventivo', 'correctivo') NOT NULL,
-    prioridad ENUM('baja', 'media', 'alta', 'critica') DEFAULT 'media',
-    estado ENUM('abierto', 'en_proceso', 'resuelto', 'cerrado') DEFAULT 'abierto',
-    asignado_admin BOOLEAN DEFAULT FALSE,
-    solucion_ia TEXT,
-    notas_admin TEXT,
-    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-    FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
-);
-
-INSERT IGNORE INTO usuarios (nombre, email, tipo) VALUES 
-('Administrador', 'admin@soporte.com', 'admin');
-
-ALTER TABLE usuarios
-ADD COLUMN username VARCHAR(50) UNIQUE AFTER id,
-ADD COLUMN password_hash VARCHAR(255) NOT NULL AFTER email,
-CHANGE COLUMN tipo role ENUM('usuario', 'admin') DEFAULT 'usuario';
\ No newline at end of file
+-- 1: tablas base usuarios y tickets
+CREATE TABLE IF NOT EXISTS usuarios ( id INT AUTO_INCREMENT PRIMARY KEY, username VARCHAR(50) UNIQUE, password_hash VARCHAR(512), nombre VARCHAR(100) NOT NULL, email VARCHAR(100) UNIQUE NOT NULL, role ENUM('usuario','admin') DEFAULT 'usuario', fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP ) ENGINE=InnoDB;
+CREATE TABLE IF NOT EXISTS tickets ( id INT AUTO_INCREMENT PRIMARY KEY, usuario_id INT NULL, nombre VARCHAR(100), telefono VARCHAR(30), domicilio VARCHAR(200), titulo VARCHAR(200), descripcion TEXT NOT NULL, categoria ENUM('hardware','software','redes','otros') NOT NULL, tipo ENUM('preventivo','correctivo') NOT NULL, prioridad ENUM('baja','media','alta','critica') DEFAULT 'media', estado ENUM('abierto','en_proceso','resuelto','cerrado') DEFAULT 'abierto', asignado_admin BOOLEAN DEFAULT FALSE, solucion_ia TEXT, notas_admin TEXT, fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP, fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP, CONSTRAINT fk_tickets_usuario FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE SET NULL ON UPDATE CASCADE ) ENGINE=InnoDB;
+-- 2: índices secundarios de tickets
+CREATE INDEX idx_tickets_fecha ON tickets (fecha_creacion, id);
+CREATE INDEX idx_tickets_estado ON tickets (estado, fecha_creacion);
+CREATE INDEX idx_tickets_usuario_fecha ON tickets (usuario_id, fecha_creacion);
+CREATE INDEX idx_tickets_categoria ON tickets (categoria, fecha_creacion);
+CREATE INDEX idx_tickets_tipo ON tickets (tipo, fecha_creacion);
+-- 3: tabla ticket_stats con contadores por estado/tipo/categoria
+CREATE TABLE IF NOT EXISTS ticket_stats ( dimension VARCHAR(20) NOT NULL, valor VARCHAR(50) NOT NULL, total INT NOT NULL DEFAULT 0, PRIMARY KEY (dimension, valor) ) ENGINE=InnoDB;
+DELETE FROM ticket_stats;
+INSERT INTO ticket_stats (dimension, valor, total) SELECT 'total', '', COUNT(*) FROM tickets;
+INSERT INTO ticket_stats (dimension, valor, total) SELECT 'estado', estado, COUNT(*) FROM tickets WHERE estado IS NOT NULL GROUP BY estado;
+INSERT INTO ticket_stats (dimension, valor, total) SELECT 'tipo', tipo, COUNT(*) FROM tickets WHERE tipo IS NOT NULL GROUP BY tipo;
+INSERT INTO ticket_stats (dimension, valor, total) SELECT 'categoria', categoria, COUNT(*) FROM tickets WHERE categoria IS NOT NULL GROUP BY categoria;
+-- 4: columnas triage_estado / triage_intentos
+ALTER TABLE tickets ADD COLUMN triage_estado ENUM('pendiente','procesando','hecho','error') NULL DEFAULT NULL, ADD COLUMN triage_intentos TINYINT UNSIGNED NOT NULL DEFAULT 0;
+ALTER TABLE tickets ALTER COLUMN triage_estado SET DEFAULT 'pendiente';
+CREATE INDEX idx_tickets_triage ON tickets (triage_estado, id);
+-- 5: tabla ai_respuestas
+CREATE TABLE IF NOT EXISTS ai_respuestas ( clave CHAR(64) PRIMARY KEY, tipo VARCHAR(20) NOT NULL, respuesta MEDIUMTEXT NOT NULL, creada TIMESTAMP DEFAULT CURRENT_TIMESTAMP, expira TIMESTAMP NOT NULL, INDEX idx_ai_respuestas_expira (expira) ) ENGINE=InnoDB;
+-- 6: índice por fecha_actualizacion
+CREATE INDEX idx_tickets_actualizacion ON tickets (fecha_actualizacion, id);
+-- 7: índice FULLTEXT de titulo/descripcion/notas_admin
+CREATE FULLTEXT INDEX idx_tickets_texto ON tickets (titulo, descripcion, notas_admin);
+-- 8: columna duplicado_de
+ALTER TABLE tickets ADD COLUMN duplicado_de INT NULL DEFAULT NULL, ADD CONSTRAINT fk_tickets_duplicado FOREIGN KEY (duplicado_de) REFERENCES tickets(id) ON DELETE SET NULL;
+-- 9: columna triage_reintentar_en
+ALTER TABLE tickets ADD COLUMN triage_reintentar_en TIMESTAMP NULL DEFAULT NULL;
+-- 10: columna lote_alta
+ALTER TABLE tickets ADD COLUMN lote_alta CHAR(32) NULL DEFAULT NULL, ADD INDEX idx_tickets_lote_alta (lote_alta);